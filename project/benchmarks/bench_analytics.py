@@ -0,0 +1,54 @@
+# Compares answering the department reports by re-scanning theses.json and
+# requests.json every time with the materialized aggregates in src.analytics,
+# and times the full rebuild with and without NumPy. Run from the project
+# directory on a generated dataset:
+#     python -m benchmarks.datagen --scale 100k --out /tmp/tms-100k
+#     TMS_DATA_DIR=/tmp/tms-100k python -m benchmarks.bench_analytics
+import argparse
+
+from benchmarks.run_benchmarks import timed
+from src import analytics
+from src.database import iter_records
+
+def naive_reports():
+    # What a report costs without the aggregates: every one is a full scan.
+    approvals = {}
+    funnel = {}
+    approved = {}
+    for request in iter_records('requests.json'):
+        key = (request['type'], request['status'])
+        funnel[key] = funnel.get(key, 0) + 1
+        if key == (analytics.RequestType.COURSE, analytics.RequestStatus.APPROVED):
+            approvals[request['student_id']] = request.get('approval_date')
+            approved[request['professor_id']] = approved.get(request['professor_id'], 0) + 1
+    aggregates = analytics.rebuild_python(iter_records('theses.json'), approvals)
+    return analytics.grade_distribution(aggregates), analytics.lead_times(aggregates), funnel, approved
+
+def materialized_reports():
+    return [report() for report in analytics.REPORTS.values()]
+
+def main():
+    parser = argparse.ArgumentParser(description="Analytics aggregates vs naive scan benchmark")
+    parser.add_argument('--repeat', type=int, default=5, help="runs per measurement")
+    args = parser.parse_args()
+
+    theses = list(iter_records('theses.json'))
+    approvals = analytics._approval_dates()
+    print(f"{len(theses)} theses")
+    # The first call loads the files into the cache and builds the aggregates.
+    first = timed(materialized_reports, 1)
+    rows = [
+        ("naive scan, all reports", timed(naive_reports, args.repeat)),
+        ("materialized, all reports", timed(materialized_reports, args.repeat)),
+        ("materialized, first call", first),
+        ("rebuild (python)", timed(lambda: analytics.rebuild_python(theses, approvals), args.repeat)),
+    ]
+    if analytics.numpy is not None:
+        rows.append(("rebuild (numpy)", timed(lambda: analytics.rebuild_numpy(theses, approvals), args.repeat)))
+    else:
+        print("numpy is not installed; skipping the vectorized rebuild")
+    for name, seconds in rows:
+        print(f"{name:<28}{seconds * 1000:>10.1f} ms")
+
+if __name__ == "__main__":
+    main()
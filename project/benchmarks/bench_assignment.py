@@ -0,0 +1,53 @@
+# Times the examiner assignment planner on synthetic in-memory data, without
+# touching storage. Run from the project directory:
+#     python -m benchmarks.bench_assignment --requests 10000 --professors 500
+import argparse
+import random
+import time
+
+from benchmarks.datagen import KEYWORDS
+from src.assignment import plan_assignment, summarize
+
+def synthesize(requests, professors, history, seed):
+    rng = random.Random(seed)
+    professor_ids = [f"prof{i:05d}" for i in range(professors)]
+    # Enough capacity overall for two examiners per request, unevenly spread.
+    per_professor = 2 * requests // professors + 1
+    professor_records = [{'user_id': p, 'examiner_capacity': rng.randint(per_professor, 2 * per_professor)}
+                         for p in professor_ids]
+    # Every professor leans towards a few areas, so affinity has a signal.
+    areas = {p: rng.sample(KEYWORDS, 3) for p in professor_ids}
+    theses = []
+    for i in range(history):
+        supervisor, *examiners = rng.sample(professor_ids, 3)
+        keywords = rng.sample(areas[supervisor], 2) + [rng.choice(KEYWORDS)]
+        theses.append({'thesis_id': f"th-{i}", 'supervisor_id': supervisor, 'examiners': examiners,
+                       'keywords': ', '.join(keywords)})
+    pending = []
+    for i in range(requests):
+        pending.append({
+            'request_id': f"req-{i:08d}-d", 'student_id': f"s{i}", 'professor_id': rng.choice(professor_ids),
+            'submission_date': f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            'details': {'title': f"Thesis {i}", 'keywords': ', '.join(rng.sample(KEYWORDS, 3))},
+        })
+    return pending, professor_records, theses
+
+def main():
+    parser = argparse.ArgumentParser(description="Examiner assignment benchmark")
+    parser.add_argument('--requests', type=int, default=10000)
+    parser.add_argument('--professors', type=int, default=500)
+    parser.add_argument('--history', type=int, default=50000, help="past theses used for keyword affinity")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    pending, professors, theses = synthesize(args.requests, args.professors, args.history, args.seed)
+    start = time.perf_counter()
+    plan = plan_assignment(pending, professors, theses)
+    elapsed = time.perf_counter() - start
+    summary = summarize(plan)
+    print(f"{args.requests} requests x {args.professors} professors planned in {elapsed:.2f}s")
+    for key, value in summary.items():
+        print(f"  {key}: {value}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# Ingests a batch of synthetic thesis files (a PDF and a first-page image per
+# thesis, some PDFs resubmitted) into an empty attachment store, once with a
+# single thread and once with one per core, and reports throughput and how
+# busy the cores were. Run from the project directory:
+#     python -m benchmarks.bench_attachments --theses 1000 --pdf-kb 2048
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+def write_files(directory, theses, pdf_kb, image_kb, duplicates, seed):
+    rng = random.Random(seed)
+    paths = []
+    originals = []
+    for i in range(theses):
+        pdf_path = os.path.join(directory, f"thesis-{i:05d}.pdf")
+        if originals and rng.random() < duplicates:
+            shutil.copyfile(rng.choice(originals), pdf_path)
+        else:
+            with open(pdf_path, 'wb') as f:
+                f.write(b'%PDF-1.7\n' + rng.randbytes(pdf_kb * 1024))
+            originals.append(pdf_path)
+        image_path = os.path.join(directory, f"thesis-{i:05d}.png")
+        with open(image_path, 'wb') as f:
+            f.write(b'\x89PNG\r\n\x1a\n' + rng.randbytes(image_kb * 1024))
+        paths += [pdf_path, image_path]
+    return paths
+
+def main():
+    parser = argparse.ArgumentParser(description="Attachment store ingestion benchmark")
+    parser.add_argument('--theses', type=int, default=1000)
+    parser.add_argument('--pdf-kb', type=int, default=2048)
+    parser.add_argument('--image-kb', type=int, default=256)
+    parser.add_argument('--duplicates', type=float, default=0.2, help="share of PDFs that are resubmissions")
+    parser.add_argument('--workers', type=int, help="threads for the parallel run (default: all cores)")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='tms-attachments-')
+    os.environ['TMS_DATA_DIR'] = os.path.join(work_dir, 'data')
+    from src import attachments
+
+    try:
+        paths = write_files(work_dir, args.theses, args.pdf_kb, args.image_kb, args.duplicates, args.seed)
+        total_mb = sum(os.path.getsize(p) for p in paths) / (1024 * 1024)
+        workers = args.workers or os.cpu_count() or 1
+        print(f"{len(paths)} files, {total_mb:.0f} MB, {workers} cores")
+        print(f"{'threads':>8}{'seconds':>10}{'MB/s':>9}{'CPU busy':>10}{'blobs':>8}")
+        for threads in sorted({1, workers}):
+            shutil.rmtree(attachments.STORE_DIR, ignore_errors=True)
+            wall, cpu = time.perf_counter(), time.process_time()
+            results = attachments.ingest_many(paths, workers=threads)
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            errors = [error for _, error in results if error]
+            if errors:
+                raise SystemExit(errors[0])
+            blobs = len({digest for digest, _ in results})
+            # CPU busy: share of the cores' time this process spent on the CPU.
+            print(f"{threads:>8}{wall:>10.2f}{total_mb / wall:>9.0f}{cpu / (wall * threads):>10.0%}{blobs:>8}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
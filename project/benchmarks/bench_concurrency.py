@@ -0,0 +1,102 @@
+# Runs N processes that each submit and approve thesis requests against the
+# same data directory, then checks that no update was lost. Run from the
+# project directory:
+#     python -m benchmarks.bench_concurrency [--workers 8] [--requests 50] [--backend json|sqlite]
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+def setup(data_dir, total):
+    professors = [{"user_id": "prof01", "name": "bench", "password_hash": "",
+                   "supervision_capacity": total, "examiner_capacity": 10}]
+    courses = [{"course_id": "C001", "title": "Bench", "professor_id": "prof01",
+                "year": 1404, "semester": "اول", "capacity": total, "unit": 6}]
+    for filename, data in (('professors.json', professors), ('courses.json', courses),
+                           ('students.json', []), ('requests.json', []), ('theses.json', [])):
+        with open(os.path.join(data_dir, filename), 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+
+def worker(data_dir, backend, worker_id, count, start_event, results):
+    os.environ['TMS_DATA_DIR'] = data_dir
+    os.environ['TMS_STORAGE'] = backend
+    from src import services
+    from src.database import find_records
+    from src.transactions import transaction_stats
+    start_event.wait()
+    failures = 0
+    for i in range(count):
+        student_id = f"st{worker_id:03d}-{i:05d}"
+        success, _ = services.submit_thesis_request(student_id, 'C001')
+        request = find_records('requests.json', student_id=student_id)
+        if not success or not request:
+            failures += 1
+            continue
+        success, _ = services.process_supervision_request('prof01', request[0]['request_id'], 'approve')
+        failures += 0 if success else 1
+    results.put((worker_id, failures, dict(transaction_stats)))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=50, help="requests per worker")
+    parser.add_argument('--backend', choices=('json', 'sqlite'), default='json')
+    args = parser.parse_args()
+
+    total = args.workers * args.requests
+    data_dir = tempfile.mkdtemp(prefix='tms-bench-')
+    try:
+        setup(data_dir, total)
+        if args.backend == 'sqlite':
+            os.environ['TMS_DATA_DIR'] = data_dir
+            from src import database
+            from src.sqlite_backend import SqliteBackend, migrate
+            target = SqliteBackend(os.path.join(data_dir, database.SQLITE_FILE))
+            migrate(database.JsonBackend(), target)
+            target.close()
+
+        context = multiprocessing.get_context('spawn')
+        start_event = context.Event()
+        results = context.Queue()
+        processes = [context.Process(target=worker, args=(data_dir, args.backend, w, args.requests, start_event, results))
+                     for w in range(args.workers)]
+        for p in processes:
+            p.start()
+        time.sleep(1.0)
+        started = time.perf_counter()
+        start_event.set()
+        outcomes = [results.get() for _ in processes]
+        elapsed = time.perf_counter() - started
+        for p in processes:
+            p.join()
+
+        os.environ['TMS_DATA_DIR'] = data_dir
+        from src.database import find_record, find_records, set_backend
+        set_backend(args.backend)
+        approved = find_records('requests.json', status="Approved")
+        professor = find_record('professors.json', 'prof01')
+        course = find_record('courses.json', 'C001')
+        failures = sum(o[1] for o in outcomes)
+        conflicts = sum(o[2]['conflicts'] for o in outcomes)
+        commits = sum(o[2]['commits'] for o in outcomes)
+
+        print(f"backend={args.backend} workers={args.workers} requests/worker={args.requests}")
+        print(f"elapsed {elapsed:.2f}s, {commits / elapsed:.1f} commits/s, {conflicts} conflicts retried, {failures} failed")
+        lost = {
+            'approved requests': (len(approved), total),
+            'professor capacity used': (total - professor['supervision_capacity'], len(approved)),
+            'course capacity used': (total - course['capacity'], len(approved)),
+        }
+        ok = failures == 0
+        for name, (actual, wanted) in lost.items():
+            ok = ok and actual == wanted
+            print(f"  {name}: {actual} (expected {wanted})")
+        print("zero lost updates" if ok else "LOST UPDATES DETECTED")
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
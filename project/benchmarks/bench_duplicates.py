@@ -0,0 +1,88 @@
+# Near-duplicate lookup with the MinHash/LSH index in src.duplicates against
+# comparing a submission with every thesis in turn. Builds an in-memory index
+# over synthetic theses, then queries it with edited copies of indexed theses
+# (which should be found) and with fresh texts (which should not). Run from the
+# project directory:
+#     python -m benchmarks.bench_duplicates --theses 500000
+import argparse
+import random
+import statistics
+import time
+
+from benchmarks.datagen import _thesis_text
+from src import duplicates
+
+def edit(rng, text, share):
+    # Replaces a share of the words with others from the same text.
+    words = text.split()
+    for _ in range(max(1, int(len(words) * share))):
+        words[rng.randrange(len(words))] = rng.choice(words)
+    return ' '.join(words)
+
+def naive_similar(corpus, title, abstract, threshold):
+    query = duplicates.shingles(title, abstract)
+    matches = []
+    for i, (other_title, other_abstract) in enumerate(corpus):
+        other = duplicates.shingles(other_title, other_abstract)
+        score = len(query & other) / len(query | other)
+        if score >= threshold:
+            matches.append((i, score))
+    return matches
+
+def main():
+    parser = argparse.ArgumentParser(description="Near-duplicate detection benchmark")
+    parser.add_argument('--theses', type=int, default=500_000)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--edit', type=float, default=0.05, help="share of words changed in a near-duplicate")
+    parser.add_argument('--naive-sample', type=int, default=5000, help="theses the naive scan is timed on")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = [_thesis_text(rng)[:2] for _ in range(args.theses)]
+    print(f"{args.theses} theses, NumPy {'on' if duplicates.numpy is not None else 'off'}")
+
+    start = time.perf_counter()
+    index = duplicates.SignatureIndex()
+    doc_ids = [f"t:{i}" for i in range(len(corpus))]
+    sigs = duplicates.signatures(corpus)
+    index.add_many(doc_ids, sigs)
+    print(f"index built in {time.perf_counter() - start:.1f}s")
+
+    planted = rng.sample(range(len(corpus)), args.queries // 2)
+    queries = [((edit(rng, corpus[i][0], args.edit), edit(rng, corpus[i][1], args.edit)), f"t:{i}") for i in planted]
+    queries += [(_thesis_text(rng)[:2], None) for _ in range(args.queries - len(planted))]
+    latencies = []
+    found = expected_found = should_find = false_flags = 0
+    for (title, abstract), expected in queries:
+        start = time.perf_counter()
+        sig = duplicates.signature(title, abstract)
+        matches = index.similar(sig)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if expected is not None:
+            hit = any(doc_id == expected for doc_id, _ in matches)
+            found += hit
+            # Whether the edit left the copy above the threshold at all.
+            original = duplicates.shingles(*corpus[int(expected[2:])])
+            copy = duplicates.shingles(title, abstract)
+            if len(original & copy) / len(original | copy) >= duplicates.SIMILARITY_THRESHOLD:
+                should_find += 1
+                expected_found += hit
+        else:
+            false_flags += bool(matches)
+    latencies.sort()
+    print(f"LSH query: median {statistics.median(latencies):.2f} ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1]:.2f} ms")
+    print(f"edited copies found: {found}/{len(planted)}; of those truly above the threshold "
+          f"({duplicates.SIMILARITY_THRESHOLD}): {expected_found}/{should_find}; fresh texts flagged: "
+          f"{false_flags}/{len(queries) - len(planted)}")
+
+    sample = corpus[:args.naive_sample]
+    (title, abstract), _ = queries[0]
+    start = time.perf_counter()
+    naive_similar(sample, title, abstract, duplicates.SIMILARITY_THRESHOLD)
+    per_query = (time.perf_counter() - start) * len(corpus) / len(sample)
+    print(f"pairwise scan: {per_query * 1000:.0f} ms per query (timed on {len(sample)} theses)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# Compares the indexed lookups used by services.py against the linear scans
+# they replaced. Run from the project directory:
+#     python -m benchmarks.bench_indexes [max_requests]
+import random
+import sys
+import time
+
+from benchmarks.run_benchmarks import timed
+from src.indexes import CollectionIndex
+
+STATUSES = ["Pending Professor Approval", "Approved", "Rejected",
+            "Pending Defense Approval", "Finalized"]
+
+def make_requests(count, professors=500, seed=42):
+    rng = random.Random(seed)
+    professor_ids = [f"prof{i:04d}" for i in range(professors)]
+    records = []
+    for i in range(count):
+        records.append({
+            "request_id": f"req-{i:08d}",
+            "type": rng.choice(("course_request", "defense_request")),
+            "student_id": f"st{i // 2:08d}",
+            "professor_id": rng.choice(professor_ids),
+            "status": rng.choice(STATUSES),
+        })
+    return records
+
+def run(count):
+    records = make_requests(count)
+    start = time.perf_counter()
+    index = CollectionIndex.for_collection('requests.json', records)
+    build = time.perf_counter() - start
+
+    rng = random.Random(7)
+    probe = rng.choice(records)
+    queries = {
+        'by request_id': (
+            lambda: next((r for r in records if r['request_id'] == probe['request_id']), None),
+            lambda: index.get(probe['request_id'])),
+        'by student_id': (
+            lambda: [r for r in records if r['student_id'] == probe['student_id']],
+            lambda: index.find(student_id=probe['student_id'])),
+        'professor pending': (
+            lambda: [r for r in records if r['professor_id'] == probe['professor_id']
+                     and r['type'] == 'course_request' and r['status'] == STATUSES[0]],
+            lambda: index.find(professor_id=probe['professor_id'], type='course_request', status=STATUSES[0])),
+    }
+    print(f"\n{count:,} requests (index build {build:.2f}s)")
+    print(f"{'query':<20}{'scan ms':>12}{'index ms':>12}{'speedup':>10}")
+    for name, (scan, lookup) in queries.items():
+        scan_time = timed(scan, 3)
+        index_time = timed(lookup, 1000)
+        print(f"{name:<20}{scan_time * 1000:>12.3f}{index_time * 1000:>12.4f}{scan_time / index_time:>10.0f}x")
+
+    start = time.perf_counter()
+    for i in range(1000):
+        record = dict(records[i])
+        record['status'] = STATUSES[1]
+        index.add(record)
+    print(f"{'update (re-index)':<20}{'':>12}{(time.perf_counter() - start):>12.4f}{'':>10}")
+
+def main():
+    limit = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    for count in (10_000, 100_000, 1_000_000):
+        if count <= limit:
+            run(count)
+
+if __name__ == "__main__":
+    main()
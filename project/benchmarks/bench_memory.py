@@ -0,0 +1,87 @@
+# Memory held by a working set of requests kept as plain dicts versus typed
+# records (src.models). Each representation is loaded in a fresh interpreter
+# that reports how much its RSS and traced allocations grew. Run from the
+# project directory on a generated dataset (the 1m scale has ~1.6M requests):
+#     python -m benchmarks.datagen --scale 1m --out /tmp/tms-1m
+#     python -m benchmarks.bench_memory --data /tmp/tms-1m --limit 1000000
+import argparse
+import gc
+import itertools
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+MODES = ('dict', 'typed')
+
+def current_rss_mb():
+    # Current (not peak) resident set size; None off Linux.
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return round(pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024), 1)
+
+def load(mode, path, limit, trace):
+    from src.database import _iter_json_array
+    from src.models import decode
+
+    gc.collect()
+    rss_before = current_rss_mb()
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    with open(path, encoding='utf-8') as f:
+        records = itertools.islice(_iter_json_array(f), limit)
+        if mode == 'typed':
+            working_set = [decode('requests.json', r) for r in records]
+        else:
+            working_set = list(records)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    result = {'records': len(working_set), 'load_s': round(elapsed, 2)}
+    if trace:
+        result['traced_mb'] = round(tracemalloc.get_traced_memory()[0] / (1024 * 1024), 1)
+        tracemalloc.stop()
+    rss_after = current_rss_mb()
+    if rss_before is not None:
+        result['rss_mb'] = round(rss_after - rss_before, 1)
+    return result
+
+def run_mode(mode, path, limit, trace):
+    command = [sys.executable, '-m', 'benchmarks.bench_memory', '--worker', mode, '--data', path]
+    if limit:
+        command += ['--limit', str(limit)]
+    if trace:
+        command.append('--trace')
+    output = subprocess.run(command, check=True, stdout=subprocess.PIPE)
+    return json.loads(output.stdout.decode('utf-8').splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Dict vs typed record memory benchmark")
+    parser.add_argument('--data', required=True, help="data directory (e.g. from benchmarks.datagen)")
+    parser.add_argument('--limit', type=int, help="number of requests to load (default: all)")
+    parser.add_argument('--trace', action='store_true',
+                        help="also count allocations with tracemalloc (slower)")
+    parser.add_argument('--worker', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    path = args.data if args.data.endswith('.json') else os.path.join(args.data, 'requests.json')
+    if args.worker:
+        print(json.dumps(load(args.worker, path, args.limit, args.trace)))
+        return
+
+    report = {mode: run_mode(mode, path, args.limit, args.trace) for mode in MODES}
+    print(f"{'mode':<8}{'records':>10}{'load s':>9}{'RSS MB':>9}{'traced MB':>11}")
+    for mode, row in report.items():
+        print(f"{mode:<8}{row['records']:>10}{row['load_s']:>9}{row.get('rss_mb', '-'):>9}"
+              f"{row.get('traced_mb', '-'):>11}")
+    for key in ('rss_mb', 'traced_mb'):
+        if report['typed'].get(key):
+            print(f"{key}: dicts use {report['dict'][key] / report['typed'][key]:.2f}x the memory of typed records")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# What a student's menu costs to learn about a decision: polling the request
+# status list against reading the unread counter of the notification outbox,
+# each in a fresh interpreter (the first call includes loading what it
+# touches, the warm time is the best of five calls after it). Then how fast
+# the outbox drains into an mbox file and a local webhook stand-in for a few
+# batch sizes. The data is copied and given one notification per decided
+# course request. Run from the project directory on a generated dataset:
+#     python -m benchmarks.datagen --scale 100k --out /tmp/tms-100k
+#     python -m benchmarks.bench_notifications --data /tmp/tms-100k
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.run_benchmarks import first_and_warm, run_fresh
+from src import notifications, services
+
+# name -> function of the student id
+OPERATIONS = {
+    'poll request status': lambda student: services.get_student_request_status(student).page(),
+    'unread counter': lambda student: services.get_unread_count(student),
+}
+
+def add_notifications(directory, limit=None):
+    # One pending notification per approved or rejected course request.
+    with open(os.path.join(directory, 'requests.json'), encoding='utf-8') as f:
+        requests = json.load(f)
+    now = '2026-01-01T00:00:00'
+    notifications = []
+    for request in requests:
+        if request.get('type') == 'course_request' and request['status'] in ('Approved', 'Rejected'):
+            event = 'course_request_approved' if request['status'] == 'Approved' else 'course_request_rejected'
+            notifications.append({
+                'notification_id': str(uuid.uuid4()), 'user_id': request['student_id'], 'event': event,
+                'subject_id': request['request_id'], 'message': f"Your thesis course request was {request['status'].lower()}.",
+                'created_at': now, 'status': 'pending', 'attempts': 0, 'next_attempt': now, 'lease_until': None,
+                'delivered': [], 'last_error': None, 'sent_at': None, 'read': False,
+            })
+            if limit and len(notifications) == limit:
+                break
+    with open(os.path.join(directory, 'notifications.json'), 'w', encoding='utf-8') as f:
+        json.dump(notifications, f, ensure_ascii=False)
+    return notifications[0]['user_id'], len(notifications)
+
+class Webhook(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+def run_operation(name, student):
+    first, warm, _ = first_and_warm(lambda: OPERATIONS[name](student))
+    return {'first_ms': round(first, 1), 'warm_ms': round(warm, 3)}
+
+def run_drain(sinks, batch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Webhook)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    sinks = sinks.replace('WEBHOOK', f"http://127.0.0.1:{server.server_port}/hook")
+    start = time.perf_counter()
+    sent = notifications.deliver_all(notifications.parse_sinks(sinks), batch)
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+    return {'sent': sent, 'seconds': round(elapsed, 2)}
+
+def fresh(args, work, *extra):
+    return run_fresh('benchmarks.bench_notifications', ['--data', args.data, *extra], dict(os.environ, TMS_DATA_DIR=work))
+
+def main():
+    parser = argparse.ArgumentParser(description="Notification outbox benchmark")
+    parser.add_argument('--data', required=True, help="data directory (e.g. from benchmarks.datagen)")
+    parser.add_argument('--drain', type=int, default=5000, help="notifications to deliver per drain run")
+    parser.add_argument('--batches', default='1,20,100,500')
+    parser.add_argument('--operation', help=argparse.SUPPRESS)
+    parser.add_argument('--student', help=argparse.SUPPRESS)
+    parser.add_argument('--sinks', help=argparse.SUPPRESS)
+    parser.add_argument('--batch', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.operation:
+        print(json.dumps(run_operation(args.operation, args.student)))
+        return
+    if args.sinks:
+        print(json.dumps(run_drain(args.sinks, args.batch)))
+        return
+
+    work = tempfile.mkdtemp(prefix='tms-bench-notifications-')
+    try:
+        for name in ('requests.json', 'theses.json', 'students.json', 'courses.json', 'professors.json'):
+            if os.path.exists(os.path.join(args.data, name)):
+                shutil.copy(os.path.join(args.data, name), work)
+        student, count = add_notifications(work)
+        print(f"{count} notifications in the outbox")
+        print(f"{'student menu':<24}{'first':>14}{'warm':>14}")
+        for name in OPERATIONS:
+            timings = fresh(args, work, '--operation', name, '--student', student)
+            print(f"{name:<24}{timings['first_ms']:>11.1f} ms{timings['warm_ms']:>11.3f} ms")
+
+        print(f"\n{'drain ' + str(args.drain):<24}" + ''.join(f"{'batch ' + b:>14}" for b in args.batches.split(',')))
+        for label, sinks in (('mbox', 'mbox'), ('webhook', 'WEBHOOK'), ('mbox + webhook', 'mbox,WEBHOOK')):
+            row = []
+            for batch in args.batches.split(','):
+                add_notifications(work, args.drain)
+                for leftover in ('notifications.json.log', 'notifications.mbox'):
+                    if os.path.exists(os.path.join(work, leftover)):
+                        os.remove(os.path.join(work, leftover))
+                result = fresh(args, work, '--sinks', sinks, '--batch', batch)
+                row.append(result['sent'] / result['seconds'])
+            print(f"{label:<24}" + ''.join(f"{rate:>10.0f} /s " for rate in row))
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
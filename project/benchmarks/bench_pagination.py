@@ -0,0 +1,42 @@
+# First-page latency of a cursor (heap selection of one page) against sorting
+# and rendering the whole result list, as the list views did, for growing
+# result sizes. Uses synthetic theses in memory, so only the selection and
+# rendering are measured. Run from the project directory:
+#     python -m benchmarks.bench_pagination --sizes 1000,10000,100000,1000000
+import argparse
+import random
+
+from benchmarks.run_benchmarks import best_of
+from src.models import Thesis
+from src.pagination import PAGE_SIZE, Cursor
+from src.services import THESIS_SORTS
+
+def render(thesis):
+    return f"Title: {thesis.title}, Author: {thesis.student_id}, Date: {thesis.defense_date}"
+
+def make_theses(rng, count):
+    return [Thesis(thesis_id=f"th-{i:08d}", student_id=f"{rng.randrange(10**8):08d}", title=f"Thesis {rng.random():.12f}",
+                   defense_date=f"{rng.randint(2015, 2026)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                   scores={'p1': rng.randint(0, 100)}) for i in range(count)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Cursor pagination benchmark")
+    parser.add_argument('--sizes', default='1000,10000,100000,1000000')
+    parser.add_argument('--sort', choices=tuple(THESIS_SORTS), default='date')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    key, descending = THESIS_SORTS[args.sort]
+    print(f"{'results':>10}{'full list ms':>15}{'first page ms':>16}{'next page ms':>15}")
+    for size in map(int, args.sizes.split(',')):
+        theses = make_theses(rng, size)
+        cursor = Cursor(lambda: theses, THESIS_SORTS, args.sort, 'thesis_id', ('bench',))
+        full = best_of(lambda: [render(t) for t in sorted(theses, key=key, reverse=descending)])
+        first = best_of(lambda: [render(t) for t in cursor.page().items])
+        token = cursor.page().next_token
+        following = best_of(lambda: [render(t) for t in cursor.page(PAGE_SIZE, token).items])
+        print(f"{size:>10}{full:>15.1f}{first:>16.1f}{following:>15.1f}")
+
+if __name__ == "__main__":
+    main()
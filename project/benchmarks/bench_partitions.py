@@ -0,0 +1,111 @@
+# Active-term queries on one collection file against the same data split
+# into term partitions. The data is copied twice; in both copies every term
+# before --current is closed (pending requests rejected, awaiting defenses
+# graded), as after a few real years, and in the second copy those terms are
+# then frozen with "manage.py archive freeze --before". Each query runs in a
+# fresh interpreter: the first call includes loading what it touches, the
+# warm time is the best of five calls after it. Run from the project
+# directory on a generated dataset:
+#     python -m benchmarks.datagen --scale 100k --out /tmp/tms-100k
+#     python -m benchmarks.bench_partitions --data /tmp/tms-100k
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.run_benchmarks import first_and_warm, run_fresh
+from src import analytics, database, services
+from src.partitions import OPEN_REQUEST_STATUSES, OPEN_THESIS_STATUSES, assign_terms, term_year
+
+COLLECTIONS = ('requests.json', 'theses.json', 'students.json', 'courses.json', 'professors.json')
+# name -> function of (professor id, student id)
+OPERATIONS = {
+    'get_supervision_requests': lambda professor, student: services.get_supervision_requests(professor).page(),
+    'get_defense_requests': lambda professor, student: services.get_defense_requests(professor).page(),
+    'get_student_request_status': lambda professor, student: services.get_student_request_status(student).page(),
+    'get_assigned_defenses': lambda professor, student: services.get_assigned_defenses(professor).page(),
+    'report funnel': lambda professor, student: analytics.request_funnel(),
+    'search_theses[supervisor]': lambda professor, student: services.search_theses(professor, 'supervisor').page(),
+    'find_record[new id]': lambda professor, student: database.find_record('requests.json', 'no-such-request'),
+}
+
+def close_terms(directory, current):
+    # Rejects what is pending and grades what awaits a defense in every term
+    # before the current year.
+    paths = {name: os.path.join(directory, name) for name in ('requests.json', 'theses.json', 'courses.json')}
+    data = {}
+    for name, path in paths.items():
+        with open(path, encoding='utf-8') as f:
+            data[name] = json.load(f)
+    terms = assign_terms(data['requests.json'], data['theses.json'], data['courses.json'])
+    for request in data['requests.json']:
+        term = terms['requests.json'].get(request['request_id'])
+        if term and term_year(term) < current and request['status'] in OPEN_REQUEST_STATUSES:
+            request['status'] = 'Rejected'
+    for thesis in data['theses.json']:
+        term = terms['theses.json'].get(thesis['thesis_id'])
+        if term and term_year(term) < current and thesis['status'] in OPEN_THESIS_STATUSES:
+            thesis.update(status='Defended', scores={examiner: 85 for examiner in thesis['examiners']}, grade='B')
+    for name in ('requests.json', 'theses.json'):
+        with open(paths[name], 'w', encoding='utf-8') as f:
+            json.dump(data[name], f, ensure_ascii=False)
+
+def run_operation(name, professor, student):
+    first, warm, _ = first_and_warm(lambda: OPERATIONS[name](professor, student))
+    return {'first_ms': round(first, 1), 'warm_ms': round(warm, 2)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Term partition benchmark")
+    parser.add_argument('--data', required=True, help="data directory (e.g. from benchmarks.datagen)")
+    parser.add_argument('--current', type=int, default=1404, help="first year whose terms stay open")
+    parser.add_argument('--operation', help=argparse.SUPPRESS)
+    parser.add_argument('--professor', help=argparse.SUPPRESS)
+    parser.add_argument('--student', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.operation:
+        print(json.dumps(run_operation(args.operation, args.professor, args.student)))
+        return
+
+    work = tempfile.mkdtemp(prefix='tms-bench-partitions-')
+    try:
+        dirs = {'single file': os.path.join(work, 'single'), 'partitioned': os.path.join(work, 'partitioned')}
+        os.makedirs(dirs['single file'])
+        for name in COLLECTIONS:
+            if os.path.exists(os.path.join(args.data, name)):
+                shutil.copy(os.path.join(args.data, name), dirs['single file'])
+        close_terms(dirs['single file'], args.current)
+        shutil.copytree(dirs['single file'], dirs['partitioned'])
+        start = time.perf_counter()
+        subprocess.run([sys.executable, 'manage.py', 'archive', 'freeze', '--before', str(args.current)], check=True,
+                       env=dict(os.environ, TMS_DATA_DIR=dirs['partitioned']))
+        print(f"froze the terms before {args.current} in {time.perf_counter() - start:.1f}s")
+        hot_mb = sum(os.path.getsize(os.path.join(dirs['partitioned'], name)) for name in ('requests.json', 'theses.json'))
+        all_mb = sum(os.path.getsize(os.path.join(dirs['single file'], name)) for name in ('requests.json', 'theses.json'))
+        print(f"requests and theses: {all_mb / 2**20:.0f} MB in one file each, {hot_mb / 2**20:.0f} MB left hot")
+
+        # A professor and a student with work in the current terms.
+        with open(os.path.join(dirs['partitioned'], 'requests.json'), encoding='utf-8') as f:
+            hot = json.load(f)
+        professor = next(r['professor_id'] for r in hot if r['status'] in OPEN_REQUEST_STATUSES)
+        student = next(r['student_id'] for r in hot if r['status'] in OPEN_REQUEST_STATUSES)
+        del hot
+
+        print(f"{'operation':<30}" + ''.join(f"{label + ' ' + kind:>26}" for label in dirs for kind in ('first', 'warm')))
+        for name in OPERATIONS:
+            row = []
+            for path in dirs.values():
+                timings = run_fresh('benchmarks.bench_partitions',
+                                    ['--data', args.data, '--operation', name, '--professor', professor,
+                                     '--student', student], dict(os.environ, TMS_DATA_DIR=path))
+                row += [timings['first_ms'], timings['warm_ms']]
+            print(f"{name:<30}" + ''.join(f"{value:>23.2f} ms" for value in row))
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
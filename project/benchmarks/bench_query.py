@@ -0,0 +1,74 @@
+# Compound archive queries through the query engine's indexes against a scan
+# that checks every thesis, for growing archives. Uses synthetic defended
+# theses in memory, so the index build and the query execution are measured
+# without storage I/O. Run from the project directory:
+#     python -m benchmarks.bench_query --sizes 10000,100000,1000000
+import argparse
+import random
+import time
+
+from benchmarks.run_benchmarks import best_of
+from src.models import Thesis, ThesisStatus
+from src.query import ArchiveIndex, execute, jalali_year, parse
+
+KEYWORDS = ('ML', 'Machine Learning', 'NLP', 'Graphs', 'Testing', 'Databases', 'Security', 'Compilers',
+            'Networks', 'Computer Vision', 'Robotics', 'Cryptography', 'Blockchain', 'Cloud', 'IoT',
+            'Distributed Systems', 'Optimization', 'Bioinformatics', 'Data Mining', 'HCI')
+GRADES = ('A', 'B', 'C', 'D')
+PROFESSORS = 400
+
+# (query, the same conditions checked one thesis at a time)
+QUERIES = (
+    ('supervisor = prof0001 AND keyword contains "ML" AND grade in {A, B} AND year between 1400 and 1404',
+     lambda t: t.supervisor_id == 'prof0001' and 'ml' in t.keywords.lower().replace(',', ' ').split()
+     and t.grade in ('A', 'B') and 1400 <= jalali_year(t.defense_date) <= 1404),
+    ('examiner = prof0042 AND date >= 2024-01-01',
+     lambda t: 'prof0042' in t.examiners and t.defense_date >= '2024-01-01'),
+    ('keyword = "Computer Vision" AND score >= 95 AND year = 1403',
+     lambda t: 'computer vision' in [k.strip().lower() for k in t.keywords.split(',')]
+     and sum(t.scores.values()) / len(t.scores) >= 95 and jalali_year(t.defense_date) == 1403),
+    ('grade = A AND year between 1401 and 1402',
+     lambda t: t.grade == 'A' and 1401 <= jalali_year(t.defense_date) <= 1402),
+)
+
+def make_theses(rng, count):
+    theses = []
+    for i in range(count):
+        scores = {f"prof{rng.randrange(PROFESSORS):04d}": rng.randint(50, 100) for _ in range(2)}
+        theses.append(Thesis(
+            thesis_id=f"th-{i:08d}", student_id=f"{rng.randrange(10**8):08d}",
+            supervisor_id=f"prof{rng.randrange(PROFESSORS):04d}", examiners=list(scores), scores=scores,
+            grade=rng.choice(GRADES), keywords=', '.join(rng.sample(KEYWORDS, 3)), status=ThesisStatus.DEFENDED,
+            defense_date=f"{rng.randint(2018, 2027)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"))
+    return theses
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive query benchmark")
+    parser.add_argument('--sizes', default='10000,100000,1000000')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--explain', action='store_true', help="print the plan of each query at the largest size")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    sizes = list(map(int, args.sizes.split(',')))
+    for size in sizes:
+        theses = make_theses(rng, size)
+        start = time.perf_counter()
+        index = ArchiveIndex.build(theses)
+        print(f"\n{size:,} theses: index built in {time.perf_counter() - start:.1f}s")
+        print(f"{'query':<100}{'rows':>8}{'scan ms':>11}{'index ms':>11}")
+        for text, check in QUERIES:
+            predicates = parse(text)
+            ids, plan = execute(index, predicates, None)
+            expected = [t.thesis_id for t in theses if check(t)]
+            assert ids == expected, text
+            scan = best_of(lambda: [t for t in theses if check(t)], runs=1 if size > 100000 else 3)
+            indexed = best_of(lambda: execute(index, predicates, None))
+            print(f"{text:<100}{len(ids):>8}{scan:>11.1f}{indexed:>11.2f}")
+            if args.explain and size == sizes[-1]:
+                print(plan.format())
+        # Released before the next size is built.
+        theses = index = None
+
+if __name__ == "__main__":
+    main()
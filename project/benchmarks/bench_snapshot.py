@@ -0,0 +1,91 @@
+# Compares the JSON files with binary snapshots (src/snapshot.py) on a copy
+# of a data directory: file sizes, cold start (a fresh interpreter up to its
+# first record lookup), full loads of each collection, and streamed reads
+# that only need some columns. Every measurement runs in a fresh interpreter.
+# Run from the project directory on a generated dataset, e.g. with about 1M
+# requests:
+#     python -m benchmarks.datagen --scale 625000 --out /tmp/tms-1m
+#     python -m benchmarks.bench_snapshot --data /tmp/tms-1m
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.run_benchmarks import first_and_warm, run_fresh
+from src import database
+
+COLLECTIONS = ('requests.json', 'theses.json', 'students.json', 'courses.json', 'professors.json')
+# name -> function of the id of the last request
+OPERATIONS = {
+    'cold start + find_record': lambda target: database.find_record('requests.json', target),
+    'load requests.json': lambda target: database.load_data('requests.json'),
+    'load theses.json': lambda target: database.load_data('theses.json'),
+    'load students.json': lambda target: database.load_data('students.json'),
+    'streamed count_by(status)': lambda target: database.count_by('requests.json', 'status'),
+    'streamed find_record': lambda target: database.find_record('requests.json', target),
+}
+STREAMED = {'streamed count_by(status)', 'streamed find_record'}
+
+def run_operation(name, target):
+    # since_start_ms counts from before the interpreter started, so the cold
+    # start includes imports.
+    elapsed, _, _ = first_and_warm(lambda: OPERATIONS[name](target), runs=0)
+    return {'ms': round(elapsed, 1),
+            'since_start_ms': round((time.time() - float(os.environ['BENCH_STARTED'])) * 1000, 1)}
+
+def _size_mb(directory, names):
+    return sum(os.path.getsize(os.path.join(directory, n)) for n in names if os.path.exists(os.path.join(directory, n))) / 2**20
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON vs binary snapshot benchmark")
+    parser.add_argument('--data', required=True, help="data directory (e.g. from benchmarks.datagen)")
+    parser.add_argument('--operation', help=argparse.SUPPRESS)
+    parser.add_argument('--target', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.operation:
+        print(json.dumps(run_operation(args.operation, args.target)))
+        return
+
+    work = tempfile.mkdtemp(prefix='tms-bench-snapshot-')
+    try:
+        dirs = {'json': os.path.join(work, 'json'), 'binary': os.path.join(work, 'binary')}
+        for path in dirs.values():
+            os.makedirs(path)
+            for name in COLLECTIONS:
+                if os.path.exists(os.path.join(args.data, name)):
+                    shutil.copy(os.path.join(args.data, name), path)
+        start = time.perf_counter()
+        subprocess.run([sys.executable, 'manage.py', 'snapshot', 'binary'], check=True, stdout=subprocess.DEVNULL,
+                       env=dict(os.environ, TMS_DATA_DIR=dirs['binary']))
+        print(f"converted to binary in {time.perf_counter() - start:.1f}s")
+        with open(os.path.join(args.data, 'requests.json'), encoding='utf-8') as f:
+            requests = json.load(f)
+        # The last record, so streamed lookups cannot stop early.
+        target, count = requests[-1]['request_id'], len(requests)
+        del requests
+        binary_names = [os.path.splitext(n)[0] + '.tms' for n in COLLECTIONS]
+        print(f"{count:,} requests; files: JSON {_size_mb(dirs['json'], COLLECTIONS):.0f} MB, "
+              f"binary {_size_mb(dirs['binary'], binary_names):.0f} MB")
+
+        print(f"{'operation':<30}{'JSON ms':>12}{'binary ms':>12}{'speedup':>9}")
+        for name in OPERATIONS:
+            timings = {}
+            for fmt, path in dirs.items():
+                env = dict(os.environ, TMS_DATA_DIR=path, BENCH_STARTED=repr(time.time()))
+                if name in STREAMED:
+                    env['TMS_CACHE_BYTES'] = '1024'
+                row = run_fresh('benchmarks.bench_snapshot',
+                                ['--data', args.data, '--operation', name, '--target', target], env)
+                timings[fmt] = row['since_start_ms'] if name.startswith('cold start') else row['ms']
+            print(f"{name:<30}{timings['json']:>12.1f}{timings['binary']:>12.1f}"
+                  f"{timings['json'] / max(timings['binary'], 0.1):>8.1f}x")
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
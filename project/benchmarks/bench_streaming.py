@@ -0,0 +1,57 @@
+# Compares cached and streamed reads of a large data directory: time and peak
+# RSS of each read-only service, every one in a fresh interpreter. Run from
+# the project directory on a generated dataset:
+#     python -m benchmarks.datagen --scale 100k --out /tmp/tms-100k
+#     python -m benchmarks.bench_streaming --data /tmp/tms-100k
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks.run_benchmarks import first_and_warm, peak_rss_mb, run_fresh
+from src import database, services
+
+# name -> function of (first student id, first thesis id)
+OPERATIONS = {
+    'search_theses[title]': lambda student, thesis: list(services.search_theses('learning', 'title')),
+    'search_theses[supervisor]': lambda student, thesis: list(services.search_theses('prof00003', 'supervisor')),
+    'get_student_request_status': lambda student, thesis: list(services.get_student_request_status(student)),
+    'get_supervision_requests': lambda student, thesis: list(services.get_supervision_requests('prof00003')),
+    'get_assigned_defenses': lambda student, thesis: list(services.get_assigned_defenses('prof00003')),
+    'find_record[first]': lambda student, thesis: database.find_record('theses.json', thesis),
+}
+
+def run_operation(name):
+    first_student = next(database.iter_records('students.json'))['user_id']
+    first_thesis = next(database.iter_records('theses.json'))['thesis_id']
+    baseline = peak_rss_mb()
+    elapsed, _, result = first_and_warm(lambda: OPERATIONS[name](first_student, first_thesis), runs=0)
+    count = len(result) if isinstance(result, list) else int(result is not None)
+    return {'ms': round(elapsed, 1), 'results': count, 'startup_rss_mb': baseline, 'peak_rss_mb': peak_rss_mb()}
+
+def main():
+    parser = argparse.ArgumentParser(description="Cached vs streamed read benchmark")
+    parser.add_argument('--data', required=True, help="data directory (e.g. from benchmarks.datagen)")
+    parser.add_argument('--stream-below', type=int, default=1024 * 1024,
+                        help="cache limit in bytes used for the streaming runs")
+    parser.add_argument('--operation', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.operation:
+        print(json.dumps(run_operation(args.operation)))
+        return
+
+    # Build the search index once so both modes only measure the read path.
+    env = dict(os.environ, TMS_DATA_DIR=args.data)
+    subprocess.run([sys.executable, '-c', "from src import services; services.search_theses('x', 'title').page()"],
+                   env=env, check=True)
+    modes = {'cached': env, 'streamed': dict(env, TMS_CACHE_BYTES=str(args.stream_below))}
+    print(f"{'operation':<30}{'mode':<10}{'ms':>10}{'results':>9}{'peak RSS MB':>13}")
+    for name in OPERATIONS:
+        for mode, mode_env in modes.items():
+            row = run_fresh('benchmarks.bench_streaming', ['--data', args.data, '--operation', name], mode_env)
+            print(f"{name:<30}{mode:<10}{row['ms']:>10.1f}{row['results']:>9}{row['peak_rss_mb']!s:>13}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+# Generates a realistic synthetic data directory. Run from the project
+# directory:
+#     python -m benchmarks.datagen --scale 100k --out /tmp/tms-100k [--seed 42]
+# The scale is the number of students; every student has a course request and
+# most of them move further through the thesis process.
+import argparse
+import json
+import os
+import random
+from datetime import datetime, timedelta
+from src.auth import hash_password
+
+SCALES = {'1k': 1_000, '100k': 100_000, '1m': 1_000_000}
+
+YEARS = (1400, 1401, 1402, 1403, 1404)
+SEMESTERS = ("اول", "دوم")
+
+STATUS_PENDING = "Pending Professor Approval"
+STATUS_APPROVED = "Approved"
+STATUS_REJECTED = "Rejected"
+STATUS_DEFENSE_PENDING = "Pending Defense Approval"
+STATUS_DEFENSE_APPROVED = "Approved for Defense"
+STATUS_DEFENDED = "Defended"
+
+# (stage, weight): how far each student got through the process.
+STAGES = (('pending', 15), ('rejected', 10), ('approved', 15),
+          ('defense_pending', 10), ('defense_approved', 10), ('defended', 40))
+
+EN_TOPICS = ["deep learning", "graph neural networks", "software testing", "distributed systems",
+             "computer vision", "natural language processing", "blockchain", "cloud computing",
+             "reinforcement learning", "information retrieval", "compiler optimization",
+             "wireless sensor networks", "database indexing", "recommender systems", "cryptography"]
+EN_WORDS = ["a", "novel", "approach", "for", "efficient", "scalable", "robust", "analysis", "of",
+            "using", "based", "framework", "evaluation", "model", "method", "system", "data",
+            "performance", "improving", "detection", "large-scale", "adaptive", "secure"]
+FA_TOPICS = ["یادگیری عمیق", "شبکه‌های عصبی", "آزمون نرم‌افزار", "سیستم‌های توزیع‌شده",
+             "بینایی ماشین", "پردازش زبان طبیعی", "زنجیره بلوکی", "رایانش ابری",
+             "یادگیری تقویتی", "بازیابی اطلاعات", "پایگاه داده", "امنیت شبکه"]
+FA_WORDS = ["روشی", "جدید", "برای", "بهبود", "کارایی", "تحلیل", "مدل", "سامانه", "داده",
+            "ارزیابی", "مبتنی", "بر", "چارچوب", "تشخیص", "مقیاس‌پذیر", "بهینه‌سازی"]
+KEYWORDS = ["ML", "NLP", "AI", "Security", "Networks", "Databases", "Testing", "Cloud",
+            "Vision", "Graphs", "IR", "Compilers", "IoT", "Blockchain", "HCI"]
+
+class _ArrayWriter:
+    # Streams a JSON array one record per line, so 1M-record files never have
+    # to be held in memory.
+    def __init__(self, path):
+        self.f = open(path, 'w', encoding='utf-8')
+        self.f.write('[')
+        self.count = 0
+
+    def write(self, record):
+        self.f.write(',\n' if self.count else '\n')
+        self.f.write(json.dumps(record, ensure_ascii=False))
+        self.count += 1
+
+    def close(self):
+        self.f.write('\n]' if self.count else ']')
+        self.f.close()
+
+def _sentence(rng, words, topic, length):
+    body = [rng.choice(words) for _ in range(length)]
+    body.insert(rng.randrange(len(body) + 1), topic)
+    return ' '.join(body)
+
+def _thesis_text(rng):
+    if rng.random() < 0.5:
+        topic = rng.choice(EN_TOPICS)
+        title = _sentence(rng, EN_WORDS, topic, 5).capitalize()
+        abstract = '. '.join(_sentence(rng, EN_WORDS, rng.choice(EN_TOPICS), 12) for _ in range(3)) + '.'
+    else:
+        topic = rng.choice(FA_TOPICS)
+        title = _sentence(rng, FA_WORDS, topic, 5)
+        abstract = '. '.join(_sentence(rng, FA_WORDS, rng.choice(FA_TOPICS), 12) for _ in range(3)) + '.'
+    keywords = ', '.join(rng.sample(KEYWORDS, 3))
+    return title, abstract, keywords
+
+def _grade(score):
+    for low, grade in ((90, 'A'), (80, 'B'), (70, 'C')):
+        if score >= low:
+            return grade
+    return 'D'
+
+def generate(out_dir, students, seed=42):
+    rng = random.Random(seed)
+    # Every synthetic account shares one password, "123", so one hash will do.
+    password_hash = hash_password("123")
+    os.makedirs(out_dir, exist_ok=True)
+    now = datetime(2026, 1, 1)
+    professor_ids = [f"prof{i:05d}" for i in range(max(5, students // 100))]
+    courses = []
+    for p_index, professor_id in enumerate(professor_ids):
+        for year in YEARS:
+            for semester in SEMESTERS:
+                courses.append({
+                    "course_id": f"C{len(courses):06d}", "title": f"Thesis Course {p_index}-{year}-{semester}",
+                    "professor_id": professor_id, "year": year, "semester": semester,
+                    "capacity": rng.randint(2, 8), "unit": 6,
+                })
+    supervising = dict.fromkeys(professor_ids, 0)
+    examining = dict.fromkeys(professor_ids, 0)
+    stages, weights = zip(*STAGES)
+
+    student_writer = _ArrayWriter(os.path.join(out_dir, 'students.json'))
+    request_writer = _ArrayWriter(os.path.join(out_dir, 'requests.json'))
+    thesis_writer = _ArrayWriter(os.path.join(out_dir, 'theses.json'))
+    for i in range(students):
+        student_id = f"{rng.choice(YEARS)}{i:07d}"
+        student_writer.write({"user_id": student_id, "name": f"student {i}", "password_hash": password_hash})
+        course = rng.choice(courses)
+        professor_id = course['professor_id']
+        stage = rng.choices(stages, weights)[0]
+        request_date = now - timedelta(days=rng.randint(100, 1500))
+        course_request = {
+            "request_id": f"req-{i:08d}-c", "type": "course_request", "student_id": student_id,
+            "course_id": course['course_id'], "professor_id": professor_id,
+            "request_date": request_date.isoformat(),
+            "status": {'pending': STATUS_PENDING, 'rejected': STATUS_REJECTED}.get(stage, STATUS_APPROVED),
+        }
+        if course_request['status'] == STATUS_APPROVED:
+            course_request['approval_date'] = (request_date + timedelta(days=rng.randint(1, 20))).isoformat()
+        request_writer.write(course_request)
+        if stage in ('pending', 'rejected', 'approved'):
+            if stage == 'approved':
+                supervising[professor_id] += 1
+            continue
+
+        title, abstract, keywords = _thesis_text(rng)
+        details = {"title": title, "abstract": abstract, "keywords": keywords,
+                   "pdf_path": f"theses/{student_id}.pdf", "image_path": f"theses/{student_id}.png"}
+        defense_request = {
+            "request_id": f"req-{i:08d}-d", "type": "defense_request", "student_id": student_id,
+            "course_request_id": course_request['request_id'], "professor_id": professor_id,
+            "submission_date": (request_date + timedelta(days=rng.randint(95, 400))).isoformat(),
+            "status": STATUS_DEFENSE_PENDING if stage == 'defense_pending' else 'Finalized',
+            "details": details,
+        }
+        request_writer.write(defense_request)
+        if stage == 'defense_pending':
+            supervising[professor_id] += 1
+            continue
+
+        examiners = [p for p in rng.sample(professor_ids, 3) if p != professor_id][:2]
+        defense_date = datetime.fromisoformat(defense_request['submission_date']) + timedelta(days=rng.randint(7, 60))
+        thesis = {
+            "thesis_id": f"th-{i:08d}", "student_id": student_id, "supervisor_id": professor_id,
+            "title": title, "abstract": abstract, "keywords": keywords,
+            "pdf_path": details['pdf_path'], "image_path": details['image_path'],
+            "defense_date": defense_date.date().isoformat(), "examiners": examiners,
+            "status": STATUS_DEFENSE_APPROVED, "grade": None, "scores": {},
+        }
+        if stage == 'defended':
+            scores = {examiner: rng.randint(55, 100) for examiner in examiners}
+            thesis.update(status=STATUS_DEFENDED, scores=scores, grade=_grade(sum(scores.values()) / 2))
+        else:
+            supervising[professor_id] += 1
+            for examiner in examiners:
+                examining[examiner] += 1
+        thesis_writer.write(thesis)
+    for writer in (student_writer, request_writer, thesis_writer):
+        writer.close()
+
+    supervision_base = max(10, max(supervising.values()) + 5)
+    examiner_base = max(20, max(examining.values()) + 10)
+    professor_writer = _ArrayWriter(os.path.join(out_dir, 'professors.json'))
+    for professor_id in professor_ids:
+        professor_writer.write({
+            "user_id": professor_id, "name": f"professor {professor_id[4:]}", "password_hash": password_hash,
+            "supervision_capacity": supervision_base - supervising[professor_id],
+            "examiner_capacity": examiner_base - examining[professor_id],
+        })
+    professor_writer.close()
+    course_writer = _ArrayWriter(os.path.join(out_dir, 'courses.json'))
+    for course in courses:
+        course_writer.write(course)
+    course_writer.close()
+    return {'students': students, 'professors': len(professor_ids), 'courses': len(courses),
+            'requests': request_writer.count, 'theses': thesis_writer.count}
+
+def parse_scale(value):
+    return SCALES.get(value.lower()) or int(value)
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic Thesis Management System dataset")
+    parser.add_argument('--scale', default='1k', help="number of students, or one of: 1k, 100k, 1m")
+    parser.add_argument('--out', required=True, help="output data directory")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    counts = generate(args.out, parse_scale(args.scale), args.seed)
+    print(', '.join(f"{count:,} {name}" for name, count in counts.items()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+# Load generator for the API server. Start the server on a data directory
+# (for example one built by benchmarks.datagen), then run from the project
+# directory:
+#     TMS_DATA_DIR=/tmp/tms-100k python manage.py serve --port 8080
+#     python -m benchmarks.loadgen --port 8080 --data /tmp/tms-100k --clients 50 --duration 10
+# Every client logs in once as a random student or professor (password "123"
+# for generated data) and then sends requests over one keep-alive connection.
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from urllib.parse import quote
+
+from src.server import percentiles
+
+SEARCH_TERMS = ['learning', 'network', 'systems', 'یادگیری', 'داده', 'analysis']
+
+class Client:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+        self.token = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def request(self, method, path, body=None):
+        payload = json.dumps(body).encode('utf-8') if body is not None else b''
+        headers = [f"{method} {path} HTTP/1.1", f"Host: {self.host}", f"Content-Length: {len(payload)}"]
+        if self.token:
+            headers.append(f"Authorization: Bearer {self.token}")
+        self.writer.write(('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1') + payload)
+        await self.writer.drain()
+        head = await self.reader.readuntil(b'\r\n\r\n')
+        lines = head.decode('latin-1').split('\r\n')
+        status = int(lines[0].split(' ')[1])
+        length = 0
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            if name.strip().lower() == 'content-length':
+                length = int(value)
+        body = await self.reader.readexactly(length)
+        return status, json.loads(body) if body else None
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+def _load_ids(data_dir, filename, limit=5000):
+    try:
+        with open(os.path.join(data_dir, filename), encoding='utf-8') as f:
+            return [u['user_id'] for u in json.load(f)[:limit]]
+    except FileNotFoundError:
+        return []
+
+def _student_actions(writes):
+    actions = [('GET', '/courses', 2), ('GET', '/requests', 4), ('GET', '/search?by=title&q={term}', 2)]
+    if writes:
+        actions.append(('POST', '/course-requests', 1))
+    return actions
+
+PROFESSOR_ACTIONS = [('GET', '/supervision-requests', 3), ('GET', '/defense-requests', 2),
+                     ('GET', '/assigned-defenses', 2), ('GET', '/search?by=all&q={term}', 2)]
+
+async def run_client(args, students, professors, courses, deadline, results):
+    rng = random.Random()
+    client = Client(args.host, args.port)
+    await client.connect()
+    try:
+        if professors and rng.random() < args.professor_share:
+            user_type, user_id, actions = 'professor', rng.choice(professors), PROFESSOR_ACTIONS
+        else:
+            user_type, user_id, actions = 'student', rng.choice(students), _student_actions(args.writes)
+        start = time.perf_counter()
+        status, body = await client.request('POST', '/login', {
+            'user_type': user_type, 'user_id': user_id, 'password': args.password})
+        results.append(('POST /login', status, time.perf_counter() - start))
+        if status != 200:
+            return
+        client.token = body['token']
+        weights = [w for _, _, w in actions]
+        while time.perf_counter() < deadline:
+            method, path, _ = rng.choices(actions, weights)[0]
+            body = None
+            if method == 'POST':
+                body = {'course_id': rng.choice(courses)}
+            route = f"{method} {path.split('?')[0]}"
+            path = path.format(term=quote(rng.choice(SEARCH_TERMS)))
+            start = time.perf_counter()
+            status, _ = await client.request(method, path, body)
+            results.append((route, status, time.perf_counter() - start))
+    finally:
+        client.close()
+
+async def run(args):
+    data_dir = args.data or os.environ.get('TMS_DATA_DIR', 'data')
+    students = _load_ids(data_dir, 'students.json')
+    professors = _load_ids(data_dir, 'professors.json')
+    with open(os.path.join(data_dir, 'courses.json'), encoding='utf-8') as f:
+        courses = [c['course_id'] for c in json.load(f)]
+    results = []
+    start = time.perf_counter()
+    deadline = start + args.duration
+    await asyncio.gather(*(run_client(args, students, professors, courses, deadline, results)
+                           for _ in range(args.clients)))
+    elapsed = time.perf_counter() - start
+
+    client = Client(args.host, args.port)
+    await client.connect()
+    _, server_stats = await client.request('GET', '/stats')
+    client.close()
+    return results, elapsed, server_stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for the Thesis Management System API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--data', help="data directory to pick user and course ids from")
+    parser.add_argument('--password', default='123')
+    parser.add_argument('--clients', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds")
+    parser.add_argument('--professor-share', type=float, default=0.2)
+    parser.add_argument('--writes', action='store_true', help="students also submit course requests")
+    args = parser.parse_args()
+
+    results, elapsed, server_stats = asyncio.run(run(args))
+    by_route = {}
+    for route, status, seconds in results:
+        by_route.setdefault(route, []).append((status, seconds * 1000))
+    print(f"{len(results)} requests in {elapsed:.1f}s from {args.clients} clients: {len(results) / elapsed:,.0f} req/s\n")
+    print(f"{'route':<32}{'count':>8}{'errors':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for route, samples in sorted(by_route.items()):
+        latency = percentiles(sorted(ms for _, ms in samples))
+        errors = sum(1 for status, _ in samples if status >= 400)
+        print(f"{route:<32}{len(samples):>8}{errors:>8}{latency['p50_ms']:>10.2f}{latency['p90_ms']:>10.2f}"
+              f"{latency['p99_ms']:>10.2f}{latency['max_ms']:>10.2f}")
+    print("\nServer-side latency:")
+    print(json.dumps(server_stats['latency'], indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+# Times every public service function and auth.login against generated
+# datasets and compares the results with a saved baseline. Run from the
+# project directory:
+#     python -m benchmarks.run_benchmarks --scales 1k,100k --output results.json
+#     python -m benchmarks.run_benchmarks --scales 1k --baseline benchmarks/baseline.json
+# Each scale runs in a fresh interpreter on a private copy of the dataset, so
+# cold timings include parsing and index builds.
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.datagen import generate, parse_scale
+
+DEFAULT_TOLERANCE = 0.25
+NOISE_FLOOR_MS = 0.05
+
+def peak_rss_mb():
+    # Peak resident set size of this process; None where the resource module
+    # is unavailable (Windows).
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+# --- Helpers for the single-feature benchmarks ---
+def first_and_warm(func, runs=5):
+    # (first ms, best of runs warm ms or None, first result): the first call
+    # includes loading whatever it touches.
+    first, result = _time_call(func)
+    warm = min(_time_call(func)[0] for _ in range(runs)) if runs else None
+    return first, warm, result
+
+def best_of(func, runs=3):
+    # Milliseconds of the fastest of runs calls.
+    return min(_time_call(func)[0] for _ in range(runs))
+
+def timed(func, repeat):
+    # Mean seconds per call over repeat calls.
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+def run_fresh(module, args, env):
+    # Runs "python -m module args" in a fresh interpreter and returns the
+    # JSON object it prints last.
+    output = subprocess.run([sys.executable, '-m', module, *args], env=env, check=True, stdout=subprocess.PIPE)
+    return json.loads(output.stdout.decode('utf-8').splitlines()[-1])
+
+# --- Worker (runs inside the per-scale interpreter) ---
+def _time_call(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return (time.perf_counter() - start) * 1000, result
+
+def _first_page(list_service, *args):
+    # List services return cursors; time what a view shows first.
+    return list_service(*args).page()
+
+def _measure(results, name, calls):
+    timings = []
+    failed = 0
+    for func, args in calls:
+        elapsed, result = _time_call(func, *args)
+        timings.append(elapsed)
+        if isinstance(result, tuple) and not result[0]:
+            failed += 1
+    if not timings:
+        return
+    results[name] = {
+        'cold_ms': round(timings[0], 4),
+        'warm_ms': round(statistics.median(timings[1:] or timings), 4),
+        'runs': len(timings),
+        'failed': failed,
+    }
+
+def run_worker(repeat):
+    from src import attachments, auth, services
+    from src.database import find_records, load_data
+
+    results = {}
+    # Targets are picked before anything is timed; load_data here only reads
+    # the small collections.
+    professors = load_data('professors.json')
+    professor_ids = [p['user_id'] for p in professors]
+    students = load_data('students.json')
+    student_ids = [s['user_id'] for s in students[:repeat]]
+    busy_professor = professor_ids[len(professor_ids) // 2]
+    services_cold = [
+        ('get_available_courses', [(services.get_available_courses, ())] * repeat),
+        ('get_student_request_status', [(_first_page, (services.get_student_request_status, s)) for s in student_ids]),
+        ('get_supervision_requests', [(_first_page, (services.get_supervision_requests, p)) for p in professor_ids[:repeat]]),
+        ('get_defense_requests', [(_first_page, (services.get_defense_requests, p)) for p in professor_ids[:repeat]]),
+        ('get_assigned_defenses', [(_first_page, (services.get_assigned_defenses, p)) for p in professor_ids[:repeat]]),
+        ('search_theses[title]', [(_first_page, (services.search_theses, 'learning', 'title'))] * repeat),
+        ('search_theses[all]', [(_first_page, (services.search_theses, 'یادگیری عمیق', 'all'))] * repeat),
+        ('search_theses[supervisor]', [(_first_page, (services.search_theses, busy_professor, 'supervisor'))] * repeat),
+        ('auth.login[student]', [(auth.login, ('student', s, '123')) for s in student_ids]),
+        ('auth.login[professor]', [(auth.login, ('professor', p, '123')) for p in professor_ids[:repeat]]),
+        ('auth.login[wrong password]', [(auth.login, ('student', s, 'wrong')) for s in student_ids]),
+    ]
+    for name, calls in services_cold:
+        _measure(results, name, calls)
+
+    pending = [r for r in find_records('requests.json', type='course_request', status=services.STATUS_PENDING)]
+    approved = [r for r in find_records('requests.json', type='course_request', status=services.STATUS_APPROVED)]
+    defended_students = {r['student_id'] for r in find_records('requests.json', type='defense_request')}
+    ready = [r for r in approved if r['student_id'] not in defended_students]
+    defense_pending = find_records('requests.json', type='defense_request', status=services.STATUS_DEFENSE_PENDING)
+    awaiting_grade = [t for t in load_data('theses.json') if t['status'] == services.STATUS_DEFENSE_APPROVED]
+    courses = services.get_available_courses()
+    # Defense requests store their files, so give them real ones where
+    # submissions are taken from.
+    os.makedirs(attachments.UPLOAD_DIR, exist_ok=True)
+    pdf_path = os.path.join(attachments.UPLOAD_DIR, 'benchmark.pdf')
+    image_path = os.path.join(attachments.UPLOAD_DIR, 'benchmark.png')
+    for path, content in ((pdf_path, b'%PDF-1.7\n' + bytes(64 * 1024)), (image_path, b'\x89PNG\r\n\x1a\n')):
+        with open(path, 'wb') as f:
+            f.write(content)
+
+    def examiners_for(supervisor_id):
+        free = [p['user_id'] for p in professors if p['user_id'] != supervisor_id]
+        return free[0], free[1]
+
+    mutations = [
+        ('submit_thesis_request', [(services.submit_thesis_request, (f"bench{i:06d}", courses[i % len(courses)]['course_id']))
+                                   for i in range(repeat)]),
+        ('process_supervision_request', [(services.process_supervision_request, (r['professor_id'], r['request_id'], 'approve'))
+                                         for r in pending[:repeat]]),
+        ('submit_defense_request', [(services.submit_defense_request, (r['student_id'], 'Benchmark thesis', 'Abstract', 'ML', pdf_path, image_path))
+                                    for r in ready[:repeat]]),
+        ('process_defense_request', [(services.process_defense_request, (r['professor_id'], r['request_id'], '2026-02-01')
+                                      + examiners_for(r['professor_id'])) for r in defense_pending[:repeat]]),
+        ('submit_grade', [(services.submit_grade, (t['thesis_id'], examiner, 91))
+                          for t in awaiting_grade[:repeat] for examiner in t['examiners']]),
+        ('auth.change_password_in_db', [(auth.change_password_in_db, ('student', s, '123')) for s in student_ids]),
+    ]
+    for name, calls in mutations:
+        _measure(results, name, calls)
+    return results
+
+# --- Driver ---
+def _dataset(datasets_dir, scale, seed):
+    path = os.path.join(datasets_dir, f"{scale}-{seed}")
+    if not os.path.exists(os.path.join(path, 'courses.json')):
+        start = time.perf_counter()
+        counts = generate(path, parse_scale(scale), seed)
+        with open(os.path.join(path, 'counts.json'), 'w') as f:
+            json.dump(counts, f)
+        print(f"  generated {scale} dataset in {time.perf_counter() - start:.1f}s")
+    with open(os.path.join(path, 'counts.json')) as f:
+        return path, json.load(f)
+
+def run_scale(scale, seed, repeat, datasets_dir, backend, cache_bytes=None):
+    source, counts = _dataset(datasets_dir, scale, seed)
+    work_dir = tempfile.mkdtemp(prefix=f"tms-bench-{scale}-")
+    try:
+        for name in os.listdir(source):
+            if name.endswith('.json') and name != 'counts.json':
+                shutil.copy(os.path.join(source, name), work_dir)
+        env = dict(os.environ, TMS_DATA_DIR=work_dir, TMS_STORAGE=backend)
+        if cache_bytes is not None:
+            env['TMS_CACHE_BYTES'] = str(cache_bytes)
+        if backend == 'sqlite':
+            subprocess.run([sys.executable, 'manage.py', 'migrate'], env=env, check=True, stdout=subprocess.DEVNULL)
+        output = subprocess.run([sys.executable, '-m', 'benchmarks.run_benchmarks', '--worker', '--repeat', str(repeat)],
+                                env=env, check=True, stdout=subprocess.PIPE)
+        return {'counts': counts, **json.loads(output.stdout.decode('utf-8').splitlines()[-1])}
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def compare(current, baseline, tolerance):
+    regressions = []
+    for scale, run in current['scales'].items():
+        base_run = baseline.get('scales', {}).get(scale)
+        if not base_run:
+            continue
+        for name, timing in run['results'].items():
+            base = base_run['results'].get(name)
+            if not base:
+                continue
+            limit = base['warm_ms'] * (1 + tolerance)
+            if timing['warm_ms'] > limit and timing['warm_ms'] - base['warm_ms'] > NOISE_FLOOR_MS:
+                regressions.append((scale, name, base['warm_ms'], timing['warm_ms']))
+    return regressions
+
+def print_table(report):
+    for scale, run in report['scales'].items():
+        counts = ', '.join(f"{v:,} {k}" for k, v in run['counts'].items())
+        print(f"\n== {scale}: {counts}; peak RSS {run.get('peak_rss_mb')} MB")
+        print(f"{'function':<32}{'cold ms':>12}{'warm ms':>12}{'runs':>6}{'failed':>8}")
+        for name, timing in run['results'].items():
+            print(f"{name:<32}{timing['cold_ms']:>12.3f}{timing['warm_ms']:>12.3f}{timing['runs']:>6}{timing['failed']:>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Service-level benchmarks")
+    parser.add_argument('--scales', default='1k,100k,1m')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--backend', choices=('json', 'sqlite'), default='json')
+    parser.add_argument('--cache-bytes', type=int, help="cache limit; collections above it are streamed")
+    parser.add_argument('--datasets-dir', default=os.path.join(tempfile.gettempdir(), 'tms-bench-data'))
+    parser.add_argument('--output', help="write results as JSON")
+    parser.add_argument('--baseline', help="compare against a previous --output file")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        results = run_worker(args.repeat)
+        print(json.dumps({'results': results, 'peak_rss_mb': peak_rss_mb()}))
+        return
+
+    report = {'python': platform.python_version(), 'backend': args.backend, 'seed': args.seed,
+              'cache_bytes': args.cache_bytes,
+              'repeat': args.repeat, 'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'scales': {}}
+    for scale in args.scales.split(','):
+        print(f"running {scale} ...")
+        report['scales'][scale] = run_scale(scale, args.seed, args.repeat, args.datasets_dir,
+                                             args.backend, args.cache_bytes)
+    print_table(report)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.tolerance:.0%}:")
+            for scale, name, before, after in regressions:
+                print(f"  [{scale}] {name}: {before:.3f} ms -> {after:.3f} ms")
+            sys.exit(1)
+        print("\nNo regressions against baseline.")
+
+if __name__ == "__main__":
+    main()
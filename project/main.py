@@ -1,4 +1,12 @@
+import sys
+
+from src import notifications, profiling
 from src.cli import main_menu
 
 if __name__ == "__main__":
-    main_menu()
\ No newline at end of file
+    profiling.install_from_env('--profile' in sys.argv[1:])
+    notifications.start_worker()
+    try:
+        main_menu()
+    finally:
+        notifications.stop_worker(timeout=5)
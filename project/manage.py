@@ -0,0 +1,372 @@
+import argparse
+import csv
+import sys
+from src import database, profiling
+
+# --- Commands ---
+def migrate_command(args):
+    from src.sqlite_backend import SqliteBackend, migrate
+    source = database.JsonBackend()
+    target = SqliteBackend(database.get_file_path(database.SQLITE_FILE))
+    counts = migrate(source, target)
+    target.close()
+    for filename, count in counts.items():
+        print(f"{filename}: {count} records imported")
+    print(f"Database written to {database.get_file_path(database.SQLITE_FILE)}")
+    print("Set TMS_STORAGE=sqlite to run the system on it.")
+
+def export_command(args):
+    from src.sqlite_backend import SqliteBackend, migrate
+    source = SqliteBackend(database.get_file_path(database.SQLITE_FILE))
+    counts = migrate(source, database.JsonBackend())
+    source.close()
+    for filename, count in counts.items():
+        print(f"{filename}: {count} records exported")
+
+def compact_command(args):
+    for filename in database.PRIMARY_KEYS:
+        database.compact(filename)
+    print("Storage compacted.")
+
+def snapshot_command(args):
+    from src.snapshot import SnapshotError, SnapshotReader
+    filenames = args.collections or list(database.PRIMARY_KEYS)
+    if args.action == 'verify':
+        failed = 0
+        for filename in filenames:
+            if not database.is_binary(filename):
+                continue
+            try:
+                with SnapshotReader(database.get_binary_path(filename), filename) as reader:
+                    reader.verify()
+                print(f"{filename}: {reader.count} records, checksums OK")
+            except SnapshotError as e:
+                print(f"{filename}: {e}")
+                failed += 1
+        if failed:
+            raise SystemExit(1)
+        return
+    for filename in filenames:
+        if database.convert_snapshot(filename, args.action == 'binary'):
+            print(f"{filename}: now stored in {database.get_snapshot_path(filename)}")
+
+def archive_command(args):
+    from src.partitions import term_year
+    terms = database.list_terms()
+    if args.action == 'list':
+        print(f"{'term':<12}{'requests':>10}{'theses':>8}{'open':>6}  frozen")
+        for term in sorted(terms):
+            info = terms[term]
+            frozen = ', '.join(f"{count} {filename[:-len('.json')]}" for filename, count in info.get('frozen', {}).items())
+            print(f"{term:<12}{info['requests']:>10}{info['theses']:>8}{info['open']:>6}  {frozen or '-'}")
+        return
+    selected = list(dict.fromkeys(args.terms))
+    if args.before:
+        selected += [term for term, info in sorted(terms.items())
+                     if term_year(term) < args.before and term not in selected and 'frozen' not in info
+                     and not info['open'] and (info['requests'] or info['theses'])]
+    if not selected:
+        print("No closed terms to freeze.")
+        return
+    if args.dry_run:
+        for term in selected:
+            print(f"{term}: {terms[term]['requests']} requests and {terms[term]['theses']} theses would be frozen")
+        return
+    try:
+        moved = database.freeze_terms(selected)
+    except ValueError as e:
+        print(e)
+        raise SystemExit(1)
+    for term, counts in moved.items():
+        print(f"{term}: {counts['requests.json']} requests and {counts['theses.json']} theses frozen")
+
+def notifications_command(args):
+    from src import notifications
+    if args.action == 'retry':
+        print(f"{notifications.retry_failed()} failed notifications queued again.")
+        return
+    if args.action == 'deliver':
+        try:
+            sinks = notifications.parse_sinks(notifications.NOTIFY_SINKS if args.sinks is None else args.sinks)
+        except ValueError as e:
+            raise SystemExit(str(e))
+        claimed = notifications.deliver_all(sinks, args.batch)
+        stats = notifications.worker_stats
+        print(f"{claimed} notifications due: {stats['sent']} sent, {stats['retried']} to retry, "
+              f"{stats['failed']} failed.")
+        return
+    counts = database.count_by(notifications.OUTBOX_FILE, 'status')
+    print(', '.join(f"{counts.get(status, 0)} {status}" for status in
+                    (notifications.PENDING, notifications.SENT, notifications.FAILED)))
+    failed = database.find_records(notifications.OUTBOX_FILE, status=notifications.FAILED)
+    for notification in sorted(failed, key=lambda n: n.created_at, reverse=True)[:args.show]:
+        print(f"{notification.created_at[:16]}  {notification.user_id}  {notification.event}: {notification.last_error}")
+
+def import_command(args):
+    from src.importer import import_file
+    imported, errors = import_file(args.kind, args.path, workers=args.workers,
+                                   skip_invalid=args.skip_invalid, dry_run=args.dry_run)
+    for line_number, message in errors[:args.max_errors]:
+        print(f"{args.path}:{line_number}: {message}")
+    if len(errors) > args.max_errors:
+        print(f"... and {len(errors) - args.max_errors} more errors")
+    if errors and not args.skip_invalid and not imported:
+        print("Nothing imported. Fix the rows above or pass --skip-invalid.")
+        raise SystemExit(1)
+    if args.dry_run:
+        print(f"{imported} {args.kind} would be imported.")
+    else:
+        print(f"{imported} {args.kind} imported.")
+
+def rehash_command(args):
+    from src.auth import rehash_legacy_users
+    for filename in ('students.json', 'professors.json'):
+        updated, legacy = rehash_legacy_users(filename, workers=args.workers)
+        print(f"{filename}: {updated} of {legacy} legacy password hashes upgraded")
+
+def assign_examiners_command(args):
+    import time
+    from src import assignment, services
+    start = time.perf_counter()
+    plan = assignment.plan_pending()
+    elapsed = time.perf_counter() - start
+    summary = assignment.summarize(plan)
+    print(f"Planned {summary['assigned']} defenses in {elapsed:.2f}s; {summary['unassigned']} could not be staffed.")
+    print(f"Examiners used: {summary['examiners_used']}, capacity used per examiner: "
+          f"{summary['min_load']:.0%} to {summary['max_load']:.0%}, mean keyword affinity: {summary['mean_affinity']}")
+    if args.report:
+        assignment.write_report(plan, args.report)
+        print(f"Plan written to {args.report}")
+    if args.dry_run:
+        for a in plan['assignments'][:args.show]:
+            print(f"{a['request_id']}: supervisor {a['supervisor_id']}, examiners {', '.join(a['examiners'])}, "
+                  f"affinity {a['affinity']}")
+        for request_id, reason in plan['unassigned'][:args.show]:
+            print(f"{request_id}: {reason}")
+        return
+    _, results = services.assign_defense_examiners(
+        [(a['request_id'], args.date, *a['examiners']) for a in plan['assignments']])
+    failed = [(request_id, message) for request_id, success, message in results if not success]
+    for request_id, message in failed[:args.show]:
+        print(f"{request_id}: {message}")
+    print(f"{len(results) - len(failed)} defense sessions scheduled on {args.date}.")
+
+def schedule_defenses_command(args):
+    import time
+    from datetime import date
+    from src import schedule, services
+    first_day = date.fromisoformat(args.start) if args.start else date.today()
+    start = time.perf_counter()
+    plan = schedule.plan_schedule(first_day, args.days, reschedule=args.reschedule)
+    elapsed = time.perf_counter() - start
+    sessions = plan['sessions']
+    print(f"Placed {len(sessions)} defenses in {elapsed:.2f}s; {len(plan['unscheduled'])} could not be placed.")
+    if sessions:
+        print(f"First session {sessions[0][1]:%Y-%m-%d %H:%M}, last {sessions[-1][1]:%Y-%m-%d %H:%M}.")
+    for thesis_id, reason in plan['unscheduled'][:args.show]:
+        print(f"{thesis_id}: {reason}")
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['thesis_id', 'start', 'room_id'])
+            for thesis_id, session_start, room_id in sessions:
+                writer.writerow([thesis_id, session_start.isoformat(timespec='minutes'), room_id])
+        print(f"Timetable written to {args.report}")
+    if args.dry_run:
+        for thesis_id, session_start, room_id in sessions[:args.show]:
+            print(f"{session_start:%Y-%m-%d %H:%M}  room {room_id}  thesis {thesis_id}")
+        return
+    _, results = services.schedule_defenses(sessions)
+    failed = [(thesis_id, message) for thesis_id, success, message in results if not success]
+    for thesis_id, message in failed[:args.show]:
+        print(f"{thesis_id}: {message}")
+    print(f"{len(results) - len(failed)} defenses scheduled.")
+
+def report_command(args):
+    from src import analytics
+    rows = analytics.REPORTS[args.report]()
+    if args.output:
+        fmt = args.format or ('json' if args.output.endswith('.json') else 'csv')
+        analytics.export_report(rows, args.output, fmt)
+        print(f"{len(rows)} rows written to {args.output}")
+        return
+    if args.format == 'json':
+        import json
+        print(json.dumps(rows, ensure_ascii=False, indent=2))
+        return
+    writer = csv.writer(sys.stdout)
+    if rows:
+        writer.writerow(rows[0])
+    for row in rows:
+        writer.writerow(row.values())
+
+def query_command(args):
+    from src import query, services
+    try:
+        if args.explain:
+            print(services.explain_query(args.query).format())
+            return
+        page = services.query_theses(args.query, args.sort).page(args.limit)
+    except query.QueryError as e:
+        raise SystemExit(f"Invalid query: {e}")
+    writer = csv.writer(sys.stdout)
+    writer.writerow(('thesis_id', 'student_id', 'supervisor_id', 'grade', 'defense_date', 'title'))
+    for thesis in page.items:
+        writer.writerow((thesis['thesis_id'], thesis['student_id'], thesis['supervisor_id'], thesis['grade'],
+                         thesis['defense_date'], thesis['title']))
+
+def attachments_command(args):
+    import time
+    from src import attachments, services
+    if args.action == 'get':
+        try:
+            attachments.blob_size(args.sha256)
+        except attachments.AttachmentError as e:
+            raise SystemExit(str(e))
+        with open(args.dest, 'wb') as out:
+            size = attachments.send_blob(args.sha256, out.fileno())
+        print(f"{size} bytes written to {args.dest}")
+        return
+    records = list(attachments.unstored())
+    paths = sorted({path for *_, pdf_path, image_path in records for path in (pdf_path, image_path) if path})
+    # The paths were typed by students: only files under --root are stored,
+    # so a path naming the data directory cannot publish it.
+    real_paths = {path: attachments.upload_path(path, args.root) for path in paths}
+    readable = sorted({real for real in real_paths.values() if real})
+    start = time.perf_counter()
+    ingested = dict(zip(readable, attachments.ingest_many(readable, workers=args.workers)))
+    elapsed = time.perf_counter() - start
+    results = {path: ingested[real] if real else (None, f"Not a file under {args.root or attachments.UPLOAD_DIR}: {path}")
+               for path, real in real_paths.items()}
+    missing = [error for _, error in results.values() if error]
+    stored = len(paths) - len(missing)
+    print(f"Stored {stored} of {len(paths)} files for {len(records)} records in {elapsed:.2f}s.")
+    for error in missing[:args.show]:
+        print(error)
+    updates = []
+    for filename, record_id, pdf_path, image_path in records:
+        hashes = {f'{kind}_sha256': results[path][0] for kind, path in (('pdf', pdf_path), ('image', image_path))
+                  if path and results[path][0]}
+        if hashes:
+            updates.append((filename, record_id, hashes))
+    if args.dry_run:
+        print(f"{len(updates)} records would reference their stored files.")
+        return
+    _, recorded = services.record_attachments(updates)
+    print(f"{recorded} records now reference their stored files.")
+
+def serve_command(args):
+    from src.server import run
+    run(args.host, args.port, args.threads)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Thesis Management System maintenance commands")
+    parser.add_argument('--profile', action='store_true',
+                        help="print call counts, latencies and storage I/O at exit (also TMS_PROFILE=1)")
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    commands.add_parser('migrate', help="import data/*.json into the SQLite database").set_defaults(func=migrate_command)
+    commands.add_parser('export', help="write the SQLite database back to data/*.json").set_defaults(func=export_command)
+    commands.add_parser('compact', help="fold journals back into their snapshots").set_defaults(func=compact_command)
+
+    snapshot = commands.add_parser('snapshot', help="convert collections between JSON and the binary snapshot format")
+    snapshot.add_argument('action', choices=('binary', 'json', 'verify'),
+                          help="convert to binary snapshots, back to JSON, or check the binary checksums")
+    snapshot.add_argument('collections', nargs='*', metavar='collection', help="e.g. requests or requests.json (default: all)")
+    snapshot.set_defaults(func=snapshot_command)
+
+    archive = commands.add_parser('archive', help="list academic terms or freeze closed ones into read-only partitions")
+    archive.add_argument('action', choices=('list', 'freeze'))
+    archive.add_argument('terms', nargs='*', metavar='term', help="terms to freeze, e.g. 1401-اول")
+    archive.add_argument('--before', type=int, metavar='YEAR', help="freeze every closed term before this year")
+    archive.add_argument('--dry-run', action='store_true', help="print what would be frozen")
+    archive.set_defaults(func=archive_command)
+
+    importer = commands.add_parser('import', help="bulk import students, professors or courses from CSV/JSONL")
+    importer.add_argument('kind', choices=('students', 'professors', 'courses'))
+    importer.add_argument('path', help="a .csv file with a header line, or a .jsonl file")
+    importer.add_argument('--workers', type=int, help="password hashing processes (default: all cores)")
+    importer.add_argument('--skip-invalid', action='store_true', help="import the valid rows even if some are bad")
+    importer.add_argument('--dry-run', action='store_true', help="validate only")
+    importer.add_argument('--max-errors', type=int, default=20, help="number of errors to print")
+    importer.set_defaults(func=import_command)
+
+    rehash = commands.add_parser('rehash', help="wrap legacy SHA-256 password hashes in PBKDF2")
+    rehash.add_argument('--workers', type=int, help="hashing processes (default: all cores)")
+    rehash.set_defaults(func=rehash_command)
+
+    assign = commands.add_parser('assign-examiners', help="assign examiners to every pending defense request")
+    assign.add_argument('--date', help="defense date to record for the approved sessions (YYYY-MM-DD)")
+    assign.add_argument('--dry-run', action='store_true', help="print the plan without approving anything")
+    assign.add_argument('--report', help="write the full plan to a CSV file")
+    assign.add_argument('--show', type=int, default=20, help="number of plan lines or failures to print")
+    assign.set_defaults(func=assign_examiners_command)
+
+    timetable = commands.add_parser('schedule-defenses', help="give every approved defense a time slot and a room")
+    timetable.add_argument('--start', help="first day of the scheduling window (YYYY-MM-DD, default: today)")
+    timetable.add_argument('--days', type=int, default=28, help="length of the window in days")
+    timetable.add_argument('--reschedule', action='store_true', help="also move defenses that already have a time")
+    timetable.add_argument('--dry-run', action='store_true', help="print the timetable without saving it")
+    timetable.add_argument('--report', help="write the timetable to a CSV file")
+    timetable.add_argument('--show', type=int, default=20, help="number of sessions or failures to print")
+    timetable.set_defaults(func=schedule_defenses_command)
+
+    report = commands.add_parser('report', help="print or export department statistics")
+    report.add_argument('report', choices=('grades', 'load', 'lead-time', 'funnel'),
+                        help="grades per supervisor and year, professor load, approval-to-defense time "
+                             "or request counts by status")
+    report.add_argument('--format', choices=('csv', 'json'), help="output format (default: csv, or from --output)")
+    report.add_argument('--output', help="write the report to a file instead of printing it")
+    report.set_defaults(func=report_command)
+
+    query = commands.add_parser('query', help="find archived theses by supervisor, keyword, grade, year and more")
+    query.add_argument('query', help='e.g. \'supervisor = prof01 AND grade in {A, B} AND year between 1400 and 1404\'')
+    query.add_argument('--explain', action='store_true', help="print the query plan and timings instead of the theses")
+    query.add_argument('--sort', choices=('date', 'grade', 'title'), help="result order (default: date)")
+    query.add_argument('--limit', type=int, default=50, help="number of theses to print")
+    query.set_defaults(func=query_command)
+
+    attach = commands.add_parser('attachments', help="store submitted thesis files by content hash")
+    actions = attach.add_subparsers(dest='action')
+    actions.required = True
+    ingest = actions.add_parser('ingest', help="store the files of theses and requests submitted before the store")
+    ingest.add_argument('--workers', type=int, help="hashing threads (default: all cores)")
+    ingest.add_argument('--root', help="only store files under this directory (default: the upload directory)")
+    ingest.add_argument('--dry-run', action='store_true', help="store the files but leave the records unchanged")
+    ingest.add_argument('--show', type=int, default=20, help="number of unreadable files to print")
+    get = actions.add_parser('get', help="copy a stored file out of the store")
+    get.add_argument('sha256')
+    get.add_argument('dest')
+    attach.set_defaults(func=attachments_command)
+
+    notify = commands.add_parser('notifications', help="show, deliver or retry queued notifications")
+    notify.add_argument('action', choices=('status', 'deliver', 'retry'),
+                        help="counts per status and recent failures, deliver what is due now, "
+                             "or queue failed notifications again")
+    notify.add_argument('--sinks', help="sinks to deliver to, as in TMS_NOTIFY_SINKS (default: from the environment)")
+    notify.add_argument('--batch', type=int, default=100, help="notifications per batch")
+    notify.add_argument('--show', type=int, default=20, help="number of failures to print")
+    notify.set_defaults(func=notifications_command)
+
+    serve = commands.add_parser('serve', help="run the HTTP/JSON API server")
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8080)
+    serve.add_argument('--threads', type=int, help="storage I/O threads")
+    serve.set_defaults(func=serve_command)
+
+    args = parser.parse_args(argv)
+    if args.command == 'snapshot':
+        args.collections = [c if c.endswith('.json') else f"{c}.json" for c in args.collections]
+        unknown = set(args.collections) - set(database.PRIMARY_KEYS)
+        if unknown:
+            parser.error(f"unknown collection(s): {', '.join(sorted(unknown))}")
+    if args.command == 'archive' and args.action == 'list' and (args.terms or args.before):
+        parser.error("archive list takes no terms")
+    if args.command == 'assign-examiners' and not args.dry_run and not args.date:
+        parser.error("assign-examiners needs --date unless --dry-run is given")
+    profiling.install_from_env(args.profile)
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+import csv
+import json
+import threading
+from datetime import date
+from src.database import count_by, find_records, get_generation, iter_records
+from src.models import RequestStatus, RequestType, ThesisStatus
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+GRADES = ('A', 'B', 'C', 'D')
+
+# --- Materialized Aggregates ---
+# Thesis statistics are kept in memory and updated by the services as
+# defenses are approved and graded, so reports never re-scan theses.json.
+# Request counts (the funnel, and how many students each professor has
+# approved) come straight from the request index, which put_records already
+# keeps current. A full rebuild runs only when theses.json is reloaded from
+# disk (another process wrote it); it is vectorized with NumPy when that is
+# installed.
+class Aggregates:
+    def __init__(self):
+        # (supervisor_id, year) -> [A, B, C, D, score_sum, defended]
+        self.grades = {}
+        # year -> [days from course approval to defense, defenses]
+        self.lead_times = {}
+        # professor_id -> upcoming defenses they examine
+        self.examining = {}
+        # professor_id -> defended theses they supervised
+        self.defended = {}
+        # Theses already counted, so an update that races with a rebuild
+        # (or repeats) is applied once.
+        self.scheduled = {}
+        self.graded = set()
+
+    def add_scheduled(self, thesis_id, examiners):
+        if thesis_id in self.scheduled or thesis_id in self.graded:
+            return
+        self.scheduled[thesis_id] = examiners
+        for professor_id in examiners:
+            self.examining[professor_id] = self.examining.get(professor_id, 0) + 1
+
+    def add_defended(self, thesis_id, supervisor_id, year, grade, score, lead_days):
+        if thesis_id in self.graded:
+            return
+        self.graded.add(thesis_id)
+        for professor_id in self.scheduled.pop(thesis_id, ()):
+            self.examining[professor_id] -= 1
+        row = self.grades.setdefault((supervisor_id, year), [0, 0, 0, 0, 0.0, 0])
+        if grade in GRADES:
+            row[GRADES.index(grade)] += 1
+        row[4] += score
+        row[5] += 1
+        self.defended[supervisor_id] = self.defended.get(supervisor_id, 0) + 1
+        if lead_days is not None:
+            lead = self.lead_times.setdefault(year, [0, 0])
+            lead[0] += lead_days
+            lead[1] += 1
+
+def _year(thesis):
+    value = (thesis.get('defense_date') or '')[:4]
+    return int(value) if value.isdigit() else None
+
+def _score(thesis):
+    scores = list((thesis.get('scores') or {}).values())
+    return sum(scores) / len(scores) if scores else 0.0
+
+def _lead_days(approval_date, defense_date):
+    try:
+        return (date.fromisoformat(defense_date[:10]) - date.fromisoformat(approval_date[:10])).days
+    except (TypeError, ValueError):
+        return None
+
+def _approval_dates():
+    # student_id -> approval date of their thesis course.
+    return {r['student_id']: r.get('approval_date')
+            for r in find_records('requests.json', type=RequestType.COURSE, status=RequestStatus.APPROVED)}
+
+def _approval_date(student_id):
+    requests = find_records('requests.json', student_id=student_id, type=RequestType.COURSE,
+                            status=RequestStatus.APPROVED)
+    return requests[0].get('approval_date') if requests else None
+
+# --- Full Rebuild ---
+def rebuild_python(theses, approvals):
+    aggregates = Aggregates()
+    for thesis in theses:
+        if thesis.get('status') == ThesisStatus.DEFENSE_APPROVED:
+            aggregates.add_scheduled(thesis['thesis_id'], tuple(thesis.get('examiners') or ()))
+        elif thesis.get('status') == ThesisStatus.DEFENDED:
+            aggregates.add_defended(thesis['thesis_id'], thesis['supervisor_id'], _year(thesis), thesis.get('grade'), _score(thesis),
+                                    _lead_days(approvals.get(thesis['student_id']), thesis.get('defense_date')))
+    return aggregates
+
+def _to_days(values):
+    # ISO dates -> day numbers, NaT where missing. A malformed date only
+    # costs the fast path; it then becomes NaT on its own.
+    dates = [value[:10] if value else 'NaT' for value in values]
+    try:
+        return numpy.array(dates, dtype='datetime64[D]')
+    except ValueError:
+        return numpy.array([_day(value) for value in dates], dtype='datetime64[D]')
+
+def _day(value):
+    try:
+        return numpy.datetime64(value, 'D')
+    except ValueError:
+        return numpy.datetime64('NaT')
+
+def rebuild_numpy(theses, approvals):
+    # One pass pulls the columns out of the records; every grouping after
+    # that is a bincount over integer codes.
+    aggregates = Aggregates()
+    supervisors, years, grades, scores, defense_dates, approved_on, examiners = [], [], [], [], [], [], []
+    for thesis in theses:
+        status = thesis.get('status')
+        if status == ThesisStatus.DEFENSE_APPROVED:
+            panel = tuple(thesis.get('examiners') or ())
+            aggregates.scheduled[thesis['thesis_id']] = panel
+            examiners.extend(panel)
+        elif status == ThesisStatus.DEFENDED:
+            aggregates.graded.add(thesis['thesis_id'])
+            supervisors.append(thesis['supervisor_id'])
+            years.append(_year(thesis) or 0)
+            grade = thesis.get('grade')
+            grades.append(GRADES.index(grade) if grade in GRADES else len(GRADES))
+            scores.append(_score(thesis))
+            defense_dates.append(thesis.get('defense_date'))
+            approved_on.append(approvals.get(thesis['student_id']))
+
+    if examiners:
+        names, counts = numpy.unique(numpy.array(examiners, dtype=object), return_counts=True)
+        aggregates.examining = dict(zip(names.tolist(), counts.tolist()))
+    if not supervisors:
+        return aggregates
+
+    supervisor_names, supervisor_codes = numpy.unique(numpy.array(supervisors, dtype=object), return_inverse=True)
+    year_values, year_codes = numpy.unique(numpy.array(years), return_inverse=True)
+    groups = supervisor_codes * len(year_values) + year_codes
+    group_count = len(supervisor_names) * len(year_values)
+    grade_codes = numpy.array(grades)
+    by_grade = numpy.bincount(groups * (len(GRADES) + 1) + grade_codes,
+                              minlength=group_count * (len(GRADES) + 1)).reshape(group_count, len(GRADES) + 1)
+    score_sums = numpy.bincount(groups, weights=numpy.array(scores), minlength=group_count)
+    defended = by_grade.sum(axis=1)
+    for group in numpy.flatnonzero(defended).tolist():
+        supervisor = supervisor_names[group // len(year_values)]
+        year = int(year_values[group % len(year_values)]) or None
+        aggregates.grades[(supervisor, year)] = [*by_grade[group, :len(GRADES)].tolist(),
+                                                 float(score_sums[group]), int(defended[group])]
+    per_supervisor = numpy.bincount(supervisor_codes, minlength=len(supervisor_names))
+    aggregates.defended = dict(zip(supervisor_names.tolist(), per_supervisor.tolist()))
+
+    lead = (_to_days(defense_dates) - _to_days(approved_on)).astype('float64')
+    known = ~numpy.isnan(lead)
+    lead_sums = numpy.bincount(year_codes[known], weights=lead[known], minlength=len(year_values))
+    lead_counts = numpy.bincount(year_codes[known], minlength=len(year_values))
+    for code in numpy.flatnonzero(lead_counts).tolist():
+        aggregates.lead_times[int(year_values[code]) or None] = [int(lead_sums[code]), int(lead_counts[code])]
+    return aggregates
+
+def rebuild(theses=None, approvals=None):
+    theses = iter_records('theses.json') if theses is None else theses
+    approvals = _approval_dates() if approvals is None else approvals
+    return (rebuild_numpy if numpy is not None else rebuild_python)(theses, approvals)
+
+_lock = threading.Lock()
+_state = {'generation': None, 'aggregates': None}
+
+def get_aggregates():
+    with _lock:
+        generation = get_generation('theses.json')
+        if _state['aggregates'] is None or _state['generation'] != generation:
+            _state['aggregates'] = rebuild()
+            _state['generation'] = generation
+        return _state['aggregates']
+
+# --- Incremental Updates ---
+# Called by the services after their transaction commits. Until the first
+# report nothing is built, and that first build will include the change.
+def record_defense_scheduled(thesis):
+    with _lock:
+        if _state['aggregates'] is not None:
+            _state['aggregates'].add_scheduled(thesis.thesis_id, tuple(thesis.examiners or ()))
+
+def record_defense_graded(thesis):
+    with _lock:
+        aggregates = _state['aggregates']
+        if aggregates is None:
+            return
+        aggregates.add_defended(thesis.thesis_id, thesis.supervisor_id, _year(thesis), thesis.grade, _score(thesis),
+                                _lead_days(_approval_date(thesis.student_id), thesis.defense_date))
+
+# --- Reports ---
+def grade_distribution(aggregates=None):
+    aggregates = aggregates or get_aggregates()
+    rows = []
+    for (supervisor_id, year), (a, b, c, d, score_sum, defended) in sorted(
+            aggregates.grades.items(), key=lambda item: (item[0][0], item[0][1] or 0)):
+        rows.append({'supervisor_id': supervisor_id, 'year': year, 'A': a, 'B': b, 'C': c, 'D': d,
+                     'defended': defended, 'mean_score': round(score_sum / defended, 2)})
+    return rows
+
+def professor_load(aggregates=None):
+    # Capacities in professors.json are what is left, so the totals are the
+    # current load plus that.
+    aggregates = aggregates or get_aggregates()
+    approved = count_by('requests.json', 'professor_id', 'type', 'status')
+    rows = []
+    for professor in iter_records('professors.json'):
+        professor_id = professor['user_id']
+        supervising = (approved.get((professor_id, RequestType.COURSE, RequestStatus.APPROVED), 0)
+                       - aggregates.defended.get(professor_id, 0))
+        examining = aggregates.examining.get(professor_id, 0)
+        supervision_left = professor.get('supervision_capacity') or 0
+        examiner_left = professor.get('examiner_capacity') or 0
+        rows.append({
+            'professor_id': professor_id, 'supervising': supervising, 'supervision_capacity_left': supervision_left,
+            'supervision_load': _share(supervising, supervising + supervision_left),
+            'examining': examining, 'examiner_capacity_left': examiner_left,
+            'examiner_load': _share(examining, examining + examiner_left),
+        })
+    return rows
+
+def _share(part, whole):
+    return round(part / whole, 3) if whole > 0 else 0.0
+
+def lead_times(aggregates=None):
+    aggregates = aggregates or get_aggregates()
+    return [{'year': year, 'defenses': count, 'mean_days': round(days / count, 1)}
+            for year, (days, count) in sorted(aggregates.lead_times.items(), key=lambda item: item[0] or 0)]
+
+def request_funnel():
+    counts = count_by('requests.json', 'type', 'status')
+    return [{'type': str(request_type), 'status': str(status), 'count': count}
+            for (request_type, status), count in sorted(counts.items(), key=lambda item: (str(item[0][0]), str(item[0][1])))]
+
+REPORTS = {
+    'grades': grade_distribution,
+    'load': professor_load,
+    'lead-time': lead_times,
+    'funnel': request_funnel,
+}
+
+def export_report(rows, path, fmt):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        if fmt == 'json':
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+        elif rows:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
@@ -0,0 +1,210 @@
+import csv
+import heapq
+from src import search
+from src.database import find_records, iter_records
+from src.models import RequestStatus, RequestType
+
+# --- Examiner Assignment ---
+# Assigns two examiners to every pending defense request in one pass. Each
+# professor can take at most examiner_capacity more defenses, never sits on
+# a panel for their own student, and is scored per request as
+#     cost = load - AFFINITY_WEIGHT * affinity
+# where load is the share of their capacity this run has already used (so
+# work is spread evenly) and affinity is how often the request's keywords
+# appear in theses they have supervised or examined. Requests are served
+# oldest first, each taking its two cheapest eligible professors; requests
+# left short because capacity ran out are then repaired by swapping an
+# examiner with an already assigned request.
+AFFINITY_WEIGHT = 0.5
+# Only the strongest professors per keyword are scored for affinity; the
+# least loaded professors are always considered as well.
+AFFINITY_CANDIDATES = 25
+PANEL_SIZE = 2
+
+def _keywords(text):
+    if isinstance(text, list):
+        text = ','.join(text)
+    return {k for k in (search.normalize(part).strip() for part in (text or '').split(',')) if k}
+
+def keyword_profiles(theses):
+    # keyword -> [(share, professor_id)], strongest first. share is the
+    # fraction of a professor's theses that carry the keyword.
+    counts = {}
+    totals = {}
+    for thesis in theses:
+        members = {thesis.get('supervisor_id'), *(thesis.get('examiners') or ())} - {None}
+        keywords = _keywords(thesis.get('keywords'))
+        for professor_id in members:
+            totals[professor_id] = totals.get(professor_id, 0) + 1
+            for keyword in keywords:
+                per_keyword = counts.setdefault(keyword, {})
+                per_keyword[professor_id] = per_keyword.get(professor_id, 0) + 1
+    profiles = {}
+    for keyword, per_professor in counts.items():
+        ranked = sorted(((count / totals[p], p) for p, count in per_professor.items()), reverse=True)
+        profiles[keyword] = ranked[:AFFINITY_CANDIDATES]
+    return profiles
+
+class _Loads:
+    # Remaining capacity per professor plus a lazy min-heap on load, so the
+    # least loaded eligible professors are found without scanning them all.
+    def __init__(self, capacities):
+        self.capacity = {p: c for p, c in capacities.items() if c > 0}
+        self.assigned = dict.fromkeys(self.capacity, 0)
+        self.heap = [(0.0, p) for p in sorted(self.capacity)]
+
+    def load(self, professor_id):
+        return self.assigned[professor_id] / self.capacity[professor_id]
+
+    def available(self, professor_id):
+        return professor_id in self.capacity and self.assigned[professor_id] < self.capacity[professor_id]
+
+    def take(self, professor_id):
+        self.assigned[professor_id] += 1
+        if self.available(professor_id):
+            heapq.heappush(self.heap, (self.load(professor_id), professor_id))
+
+    def release(self, professor_id):
+        self.assigned[professor_id] -= 1
+        heapq.heappush(self.heap, (self.load(professor_id), professor_id))
+
+    def least_loaded(self, count, excluded):
+        found = []
+        kept = []
+        while self.heap and len(found) < count:
+            load, professor_id = heapq.heappop(self.heap)
+            if not self.available(professor_id) or load != self.load(professor_id):
+                continue
+            kept.append((load, professor_id))
+            if professor_id not in excluded:
+                found.append(professor_id)
+        for entry in kept:
+            heapq.heappush(self.heap, entry)
+        return found
+
+def _affinities(keywords, profiles):
+    scores = {}
+    for keyword in keywords:
+        for share, professor_id in profiles.get(keyword, ()):
+            scores[professor_id] = scores.get(professor_id, 0.0) + share
+    count = len(keywords) or 1
+    return {p: score / count for p, score in scores.items()}
+
+def plan_assignment(requests, professors, theses):
+    # Returns a plan: {'assignments': [...], 'unassigned': [(request_id, reason)],
+    # 'loads': {professor_id: (assigned, capacity)}}. Nothing is written.
+    profiles = keyword_profiles(theses)
+    loads = _Loads({p['user_id']: p.get('examiner_capacity') or 0 for p in professors})
+    requests = sorted(requests, key=lambda r: (r.get('submission_date') or '', r['request_id']))
+
+    assignments = []
+    short = []
+    for request in requests:
+        supervisor = request['professor_id']
+        details = request.get('details') or {}
+        affinity = _affinities(_keywords(details.get('keywords')), profiles)
+        panel = []
+        while len(panel) < PANEL_SIZE:
+            excluded = {supervisor, *panel}
+            candidates = [p for p in affinity if p not in excluded and loads.available(p)]
+            candidates += loads.least_loaded(PANEL_SIZE - len(panel), excluded)
+            if not candidates:
+                break
+            best = min(candidates, key=lambda p: (loads.load(p) - AFFINITY_WEIGHT * affinity.get(p, 0.0), p))
+            loads.take(best)
+            panel.append(best)
+        entry = {
+            'request_id': request['request_id'], 'student_id': request['student_id'],
+            'supervisor_id': supervisor, 'title': details.get('title', ''),
+            'examiners': panel, 'affinity': affinity,
+        }
+        assignments.append(entry)
+        if len(panel) < PANEL_SIZE:
+            short.append(entry)
+
+    by_examiner = {}
+    for entry in assignments:
+        if len(entry['examiners']) == PANEL_SIZE:
+            for professor_id in entry['examiners']:
+                by_examiner.setdefault(professor_id, []).append(entry)
+    # Half-filled panels give their examiners back first, so the repair can
+    # complete as many of them as the remaining capacity allows.
+    for entry in short:
+        for professor_id in entry['examiners']:
+            loads.release(professor_id)
+        entry['examiners'] = []
+    unassigned = []
+    for entry in short:
+        while len(entry['examiners']) < PANEL_SIZE and _repair(entry, loads, by_examiner):
+            pass
+        if len(entry['examiners']) < PANEL_SIZE:
+            for professor_id in entry['examiners']:
+                loads.release(professor_id)
+            entry['examiners'] = []
+            unassigned.append(entry)
+        else:
+            for professor_id in entry['examiners']:
+                by_examiner.setdefault(professor_id, []).append(entry)
+    complete = [e for e in assignments if len(e['examiners']) == PANEL_SIZE]
+    for entry in complete:
+        affinity = entry.pop('affinity')
+        entry['affinity'] = round(sum(affinity.get(p, 0.0) for p in entry['examiners']) / PANEL_SIZE, 3)
+    return {
+        'assignments': complete,
+        'unassigned': [(e['request_id'], "Not enough examiner capacity outside the supervisor.")
+                       for e in unassigned],
+        'loads': {p: (loads.assigned[p], loads.capacity[p]) for p in sorted(loads.capacity)},
+    }
+
+def _repair(entry, loads, by_examiner):
+    # The only professors with capacity left are on this panel or supervise
+    # it. Hand one of them (free) to another request in exchange for one of
+    # its examiners (moved) who can sit on this panel.
+    blocked = {entry['supervisor_id'], *entry['examiners']}
+    free_professors = [p for p in loads.capacity if loads.available(p)]
+    for free in free_professors:
+        if free not in blocked:
+            loads.take(free)
+            entry['examiners'].append(free)
+            return True
+    for free in free_professors:
+        swap = next(((moved, other) for moved, others in by_examiner.items() if moved not in blocked
+                     for other in others
+                     if free != other['supervisor_id'] and free not in other['examiners']), None)
+        if swap is None:
+            continue
+        moved, other = swap
+        other['examiners'][other['examiners'].index(moved)] = free
+        by_examiner[moved].remove(other)
+        by_examiner.setdefault(free, []).append(other)
+        loads.take(free)
+        entry['examiners'].append(moved)
+        return True
+    return False
+
+def plan_pending():
+    requests = find_records('requests.json', type=RequestType.DEFENSE, status=RequestStatus.DEFENSE_PENDING)
+    return plan_assignment(requests, iter_records('professors.json'), iter_records('theses.json'))
+
+def summarize(plan):
+    used = [assigned / capacity for assigned, capacity in plan['loads'].values() if assigned]
+    assignments = plan['assignments']
+    return {
+        'assigned': len(assignments),
+        'unassigned': len(plan['unassigned']),
+        'examiners_used': len(used),
+        'mean_affinity': round(sum(a['affinity'] for a in assignments) / len(assignments), 3) if assignments else 0.0,
+        'min_load': round(min(used), 3) if used else 0.0,
+        'max_load': round(max(used), 3) if used else 0.0,
+    }
+
+def write_report(plan, path):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['request_id', 'student_id', 'supervisor_id', 'internal_examiner', 'external_examiner',
+                         'affinity', 'title'])
+        for a in plan['assignments']:
+            writer.writerow([a['request_id'], a['student_id'], a['supervisor_id'], *a['examiners'],
+                             a['affinity'], a['title']])
+        for request_id, reason in plan['unassigned']:
+            writer.writerow([request_id, '', '', '', '', '', reason])
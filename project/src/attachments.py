@@ -0,0 +1,175 @@
+import hashlib
+import mmap
+import os
+import shutil
+import string
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from src.database import get_file_path, iter_records
+
+# --- Attachment Store ---
+# Thesis PDFs and images are copied into data/attachments when they are
+# submitted and referenced by the SHA-256 of their content, so a file that
+# is moved or deleted afterwards is still available and the same file
+# submitted twice is stored once. Blobs are sharded by hash prefix
+# (attachments/ab/cd/abcd...) to keep directories small.
+STORE_DIR = get_file_path('attachments')
+# Submissions only store files from here: students copy their files into it
+# and give their path, absolute or relative to it. Anything outside it
+# (data/professors.json, say) would otherwise be served to any user by
+# GET /attachments once the thesis is defended.
+UPLOAD_DIR = os.environ.get('TMS_UPLOAD_DIR') or get_file_path('uploads')
+CHUNK_SIZE = 1024 * 1024
+# Larger files are hashed through mmap instead of read() into a buffer.
+MMAP_THRESHOLD = int(os.environ.get('TMS_MMAP_THRESHOLD', 16 * 1024 * 1024))
+
+CONTENT_TYPES = [
+    (b'%PDF', 'application/pdf'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF8', 'image/gif'),
+]
+
+class AttachmentError(Exception):
+    pass
+
+def is_digest(value):
+    return isinstance(value, str) and len(value) == 64 and all(c in string.hexdigits[:16] for c in value)
+
+def blob_path(digest):
+    if not is_digest(digest):
+        raise AttachmentError(f"Not a SHA-256 digest: {digest!r}")
+    return os.path.join(STORE_DIR, digest[:2], digest[2:4], digest)
+
+def has_blob(digest):
+    return is_digest(digest) and os.path.exists(blob_path(digest))
+
+# --- Hashing ---
+# hashlib releases the GIL while it digests a large buffer, so ingest_many's
+# threads hash on all cores at once.
+def hash_file(f, size):
+    digest = hashlib.sha256()
+    if size >= MMAP_THRESHOLD:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+            for offset in range(0, size, CHUNK_SIZE):
+                digest.update(view[offset:offset + CHUNK_SIZE])
+    else:
+        buffer = bytearray(CHUNK_SIZE)
+        view = memoryview(buffer)
+        while True:
+            read = f.readinto(buffer)
+            if not read:
+                break
+            digest.update(view[:read])
+    return digest.hexdigest()
+
+def ingest(path):
+    # Hashes the file and copies it into the store unless that content is
+    # already there. Returns the digest; raises AttachmentError.
+    try:
+        with open(path, 'rb') as f:
+            before = os.fstat(f.fileno())
+            digest = hash_file(f, before.st_size)
+    except OSError as e:
+        raise AttachmentError(f"Cannot read {path}: {e.strerror or e}")
+    target = blob_path(digest)
+    if os.path.exists(target):
+        return digest
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    temp_path = f"{target}.{uuid.uuid4().hex}.tmp"
+    try:
+        # copyfile uses the kernel's zero-copy paths where it can.
+        shutil.copyfile(path, temp_path)
+        after = os.stat(path)
+        if (after.st_size, after.st_mtime_ns) != (before.st_size, before.st_mtime_ns):
+            raise AttachmentError(f"{path} changed while it was being stored")
+        # Another thread storing the same content replaces it with identical
+        # bytes, so the race is harmless.
+        os.replace(temp_path, target)
+    except OSError as e:
+        raise AttachmentError(f"Cannot store {path}: {e.strerror or e}")
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return digest
+
+def upload_path(path, root=None):
+    # The real path of path if it is a file inside root (the upload
+    # directory by default), otherwise None. Symlinks pointing out of root
+    # are resolved first, so they do not count as inside.
+    if not path:
+        return None
+    root = os.path.realpath(root or UPLOAD_DIR)
+    real = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, real]) != root or not os.path.isfile(real):
+        return None
+    return real
+
+def ingest_many(paths, workers=None):
+    # Returns [(digest, None) or (None, error)] in the order of paths.
+    def attempt(path):
+        try:
+            return ingest(path), None
+        except AttachmentError as e:
+            return None, str(e)
+    paths = list(paths)
+    if len(paths) <= 1:
+        return [attempt(path) for path in paths]
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        return list(executor.map(attempt, paths))
+
+def ingest_uploads(paths, workers=None):
+    # Like ingest_many for files submitted by users, but only stores files
+    # inside the upload directory, and returns the digest or None for each
+    # path with no reason: the error would tell a caller whether a path
+    # exists outside it.
+    real_paths = [upload_path(path) for path in paths]
+    stored = iter(ingest_many([path for path in real_paths if path], workers))
+    return [next(stored)[0] if path else None for path in real_paths]
+
+def unstored():
+    # (filename, record_id, pdf_path, image_path) for theses and defense
+    # requests submitted before attachments were stored.
+    for thesis in iter_records('theses.json'):
+        if not thesis.get('pdf_sha256') and not thesis.get('image_sha256'):
+            yield 'theses.json', thesis['thesis_id'], thesis.get('pdf_path'), thesis.get('image_path')
+    for request in iter_records('requests.json', type='defense_request'):
+        details = request.get('details') or {}
+        if not details.get('pdf_sha256') and not details.get('image_sha256'):
+            yield 'requests.json', request['request_id'], details.get('pdf_path'), details.get('image_path')
+
+# --- Reading ---
+def blob_size(digest):
+    try:
+        return os.path.getsize(blob_path(digest))
+    except OSError:
+        raise AttachmentError(f"No attachment {digest}")
+
+def content_type(digest):
+    with open_blob(digest) as f:
+        head = f.read(8)
+    return next((kind for magic, kind in CONTENT_TYPES if head.startswith(magic)), 'application/octet-stream')
+
+def open_blob(digest):
+    try:
+        return open(blob_path(digest), 'rb')
+    except OSError:
+        raise AttachmentError(f"No attachment {digest}")
+
+def send_blob(digest, out_fd):
+    # Writes the blob to a socket or file descriptor with os.sendfile, so the
+    # bytes go from the page cache to the destination without passing through
+    # Python; falls back to a buffered copy where sendfile is unavailable.
+    with open_blob(digest) as f:
+        size = os.fstat(f.fileno()).st_size
+        if hasattr(os, 'sendfile'):
+            offset = 0
+            while offset < size:
+                sent = os.sendfile(out_fd, f.fileno(), offset, size - offset)
+                if not sent:
+                    break
+                offset += sent
+            return offset
+        with open(out_fd, 'wb', closefd=False) as out:
+            shutil.copyfileobj(f, out, CHUNK_SIZE)
+        return size
@@ -1,34 +1,138 @@
+import base64
 import hashlib
-from src.database import load_data, save_data
+import hmac
+import os
+from concurrent.futures import ProcessPoolExecutor
+from src import database
+from src.database import find_record
+from src.transactions import run_transaction
 
-def hash_password(password):
-     
+PBKDF2_ITERATIONS = int(os.environ.get('TMS_PBKDF2_ITERATIONS', 100_000))
+
+# --- Password Hash Formats ---
+# legacy:                 sha256(password) as 64 hex digits
+# pbkdf2_sha256:          pbkdf2_sha256$<iterations>$<salt>$<hash>
+# pbkdf2_sha256_legacy:   the same, computed over the legacy hex digest, so
+#                         old hashes can be upgraded offline without the
+#                         plaintext (see rehash_legacy_users)
+# Any older format is replaced by a plain pbkdf2_sha256 hash at the next
+# successful login.
+PBKDF2 = 'pbkdf2_sha256'
+PBKDF2_LEGACY = 'pbkdf2_sha256_legacy'
+
+def _b64(raw):
+    return base64.b64encode(raw).decode('ascii').rstrip('=')
+
+def _pbkdf2(algorithm, secret, iterations, salt=None):
+    salt = salt or _b64(os.urandom(12))
+    derived = hashlib.pbkdf2_hmac('sha256', secret.encode('utf-8'), salt.encode('ascii'), iterations)
+    return f"{algorithm}${iterations}${salt}${_b64(derived)}"
+
+def legacy_hash(password):
     return hashlib.sha256(password.encode('utf-8')).hexdigest()
 
+def hash_password(password):
+
+    return _pbkdf2(PBKDF2, password, PBKDF2_ITERATIONS)
+
 def verify_password(plain_password, hashed_password):
-     
-    return hash_password(plain_password) == hashed_password
+
+    algorithm, _, rest = hashed_password.partition('$')
+    if not rest:
+        return hmac.compare_digest(legacy_hash(plain_password), hashed_password)
+    if algorithm not in (PBKDF2, PBKDF2_LEGACY):
+        return False
+    parts = rest.split('$')
+    if len(parts) != 3:
+        return False
+    iterations, salt, _ = parts
+    secret = plain_password if algorithm == PBKDF2 else legacy_hash(plain_password)
+    return hmac.compare_digest(_pbkdf2(algorithm, secret, int(iterations), salt), hashed_password)
+
+def needs_rehash(hashed_password):
+    parts = hashed_password.split('$')
+    return parts[0] != PBKDF2 or int(parts[1]) < PBKDF2_ITERATIONS
+
+def hash_passwords(passwords, workers=None):
+    # Each hash costs tens of milliseconds, so large batches are spread over
+    # a process pool.
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(passwords) <= workers:
+        return [hash_password(p) for p in passwords]
+    chunksize = max(1, len(passwords) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(hash_password, passwords, chunksize=chunksize))
+
+# Keeps failed logins for unknown users as slow as those with a wrong password.
+_dummy_hash = None
+
+def _verify_dummy(password):
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = _pbkdf2(PBKDF2, '', PBKDF2_ITERATIONS, 'dummy')
+    verify_password(password, _dummy_hash)
 
 def login(user_type, user_id, password):
-     
+
     filename = f"{user_type}s.json"
-    users = load_data(filename)
-    for user in users:
-        if user['user_id'] == user_id and verify_password(password, user['password_hash']):
-            return user
-    return None
+    user = find_record(filename, user_id)
+    if user is None:
+        _verify_dummy(password)
+        return None
+    if not verify_password(password, user['password_hash']):
+        return None
+    if needs_rehash(user['password_hash']):
+        user = _upgrade_hash(filename, user, password)
+    return user
+
+def _upgrade_hash(filename, user, password):
+    new_hash = hash_password(password)
+    def apply(tx):
+        current = tx.get(filename, user['user_id'])
+        # Leave it alone if the password was changed in the meantime.
+        if current is None or current['password_hash'] != user['password_hash']:
+            return current
+        current['password_hash'] = new_hash
+        tx.put(filename, current)
+        return current
+    return run_transaction(apply) or user
 
 def change_password_in_db(user_type, user_id, new_password):
-     
+
     filename = f"{user_type}s.json"
-    users = load_data(filename)
-    user_found = False
-    for user in users:
-        if user['user_id'] == user_id:
-            user['password_hash'] = hash_password(new_password)
-            user_found = True
-            break
-    if user_found:
-        save_data(filename, users)
+    new_hash = hash_password(new_password)
+    def apply(tx):
+        user = tx.get(filename, user_id)
+        if not user:
+            return False
+        user['password_hash'] = new_hash
+        tx.put(filename, user)
         return True
-    return False
\ No newline at end of file
+    return run_transaction(apply)
+
+# --- Offline Re-hash ---
+# Wraps every legacy sha256 hash in PBKDF2 using all cores. Users keep their
+# passwords; the wrapped hash is replaced by a plain one at their next login.
+def _wrap_legacy(legacy_hex):
+    return _pbkdf2(PBKDF2_LEGACY, legacy_hex, PBKDF2_ITERATIONS)
+
+def rehash_legacy_users(filename, workers=None, batch_size=5000):
+    legacy = [u for u in database.load_data(filename) if '$' not in u['password_hash']]
+    workers = workers or os.cpu_count() or 1
+    updated = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for start in range(0, len(legacy), batch_size):
+            batch = legacy[start:start + batch_size]
+            chunksize = max(1, len(batch) // (workers * 4))
+            wrapped = list(pool.map(_wrap_legacy, [u['password_hash'] for u in batch], chunksize=chunksize))
+            with database.get_backend().locked([filename]):
+                records = []
+                for user, new_hash in zip(batch, wrapped):
+                    current = find_record(filename, user['user_id'])
+                    if current is not None and current['password_hash'] == user['password_hash']:
+                        current = current.copy()
+                        current['password_hash'] = new_hash
+                        records.append(current)
+                database.put_records(filename, records)
+            updated += len(records)
+    return updated, len(legacy)
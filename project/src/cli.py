@@ -1,5 +1,6 @@
+import csv
 import os
-from src import auth, services
+from src import attachments, auth, query, services
 
 current_user = None
 user_type = None
@@ -10,6 +11,25 @@ def clear_screen():
 def wait_for_enter():
     input("\nPress Enter to return to the menu...")
 
+def page_through(cursor, show):
+    # Prints the results one page at a time; returns how many were shown.
+    shown = 0
+    for page in cursor.pages():
+        for item in page.items:
+            show(item)
+        shown += len(page.items)
+        if page.next_token is None:
+            break
+        if input(f"-- {shown} shown. Enter for more, 'q' to stop: ").strip().lower() == 'q':
+            break
+    return shown
+
+def choose_sort(cursor, fetch):
+    if len(cursor.sorts) < 2:
+        return cursor
+    choice = input(f"Sort by ({'/'.join(cursor.sorts)}) [{cursor.sort}]: ").strip().lower()
+    return fetch(choice) if choice in cursor.sorts else cursor
+
 def main_menu():
     global current_user, user_type
     while True:
@@ -65,12 +85,14 @@ def student_menu():
     while current_user:
         clear_screen()
         print(f"--- Student Menu: {current_user['name']} ---")
+        unread = services.get_unread_count(current_user['user_id'])
         print("1. Request Thesis Course")
         print("2. View Request Status")
         print("3. Submit Defense Request")
         print("4. Search Archive")
-        print("5. Change Password")
-        print("6. Logout")
+        print(f"5. Notifications ({unread} unread)" if unread else "5. Notifications")
+        print("6. Change Password")
+        print("7. Logout")
         choice = input("> ")
         if choice == '1':
             request_thesis_course_view()
@@ -81,8 +103,10 @@ def student_menu():
         elif choice == '4':
             search_menu()
         elif choice == '5':
-            change_password_view()
+            notifications_view()
         elif choice == '6':
+            change_password_view()
+        elif choice == '7':
             logout()
             break
         else:
@@ -97,9 +121,11 @@ def professor_menu():
         print("2. View/Process Defense Requests")
         print("3. View Assigned Defenses (as Examiner)")
         print("4. Submit Grade")
-        print("5. Search Archive")
-        print("6. Change Password")
-        print("7. Logout")
+        print("5. Batch Process Supervision Requests")
+        print("6. Batch Submit Grades")
+        print("7. Search Archive")
+        print("8. Change Password")
+        print("9. Logout")
         choice = input("> ")
         if choice == '1':
             manage_supervision_requests_view()
@@ -110,10 +136,14 @@ def professor_menu():
         elif choice == '4':
             submit_grade_view()
         elif choice == '5':
-            search_menu()
+            batch_supervision_requests_view()
         elif choice == '6':
-            change_password_view()
+            batch_submit_grades_view()
         elif choice == '7':
+            search_menu()
+        elif choice == '8':
+            change_password_view()
+        elif choice == '9':
             logout()
             break
         else:
@@ -139,11 +169,29 @@ def view_student_requests_view():
     clear_screen()
     print("--- Your Request Status ---")
     requests = services.get_student_request_status(current_user['user_id'])
-    if not requests:
+    shown = page_through(requests, lambda r: print(
+        f"Request ID: {r['request_id']}, Course ID: {r['course_id']}, Status: {r['status']}"))
+    if not shown:
         print("You have not submitted any requests.")
-    else:
-        for r in requests:
-            print(f"Request ID: {r['request_id']}, Course ID: {r['course_id']}, Status: {r['status']}")
+    wait_for_enter()
+
+def notifications_view():
+    clear_screen()
+    print("--- Notifications ---")
+
+    # Only what was on the pages the user saw is marked read.
+    unread = []
+
+    def show(n):
+        marker = " " if n['read'] else "*"
+        print(f"{marker} {n['created_at'][:16].replace('T', ' ')}  {n['message']}")
+        if not n['read']:
+            unread.append(n['notification_id'])
+
+    if not page_through(services.get_notifications(current_user['user_id']), show):
+        print("You have no notifications.")
+    if unread:
+        services.mark_notifications_read(current_user['user_id'], unread)
     wait_for_enter()
 
 def submit_defense_request_view():
@@ -152,6 +200,7 @@ def submit_defense_request_view():
     title = input("Thesis Title: ")
     abstract = input("Abstract: ")
     keywords = input("Keywords (comma-separated): ")
+    print(f"Copy the files into {attachments.UPLOAD_DIR} to have them stored with the request.")
     pdf_path = input("Path to thesis PDF file: ")
     image_path = input("Path to first page image file: ")
 
@@ -165,12 +214,9 @@ def manage_supervision_requests_view():
     clear_screen()
     print("--- Pending Supervision Requests ---")
     requests = services.get_supervision_requests(current_user['user_id'])
-    if not requests:
+    if not page_through(requests, lambda r: print(f"ID: {r['request_id']}, Student: {r['student_id']}")):
         print("There are no new requests.")
     else:
-        for r in requests:
-            print(f"ID: {r['request_id']}, Student: {r['student_id']}")
-        
         req_id = input("\nEnter request ID to process: ")
         action = input("Approve or reject? (type 'approve' or 'reject'): ")
         if action.lower() in ['approve', 'reject']:
@@ -183,39 +229,57 @@ def manage_supervision_requests_view():
 def manage_defense_requests_view():
     clear_screen()
     print("--- Pending Defense Requests ---")
-    requests = services.get_defense_requests(current_user['user_id'])
+    requests = list(services.get_defense_requests(current_user['user_id']))
     if not requests:
         print("There are no pending defense requests.")
     else:
         for r in requests:
             print(f"ID: {r['request_id']}, Student: {r['student_id']}, Title: {r['details']['title']}")
+            for match in r['details'].get('similar') or ():
+                print(f"  Possible duplicate of {match['kind']} {match['id']} ({match['similarity']:.0%} similar)")
         
         req_id = input("\nEnter defense request ID to approve: ")
         defense_date = input("Enter defense date (YYYY-MM-DD): ")
+        defense_time = input("Enter defense time (HH:MM, leave empty to schedule later): ").strip() or None
+        room_id = None
+        if defense_time:
+            room_id = input("Enter room ID (optional): ").strip() or None
         internal_examiner = input("Enter Internal Examiner's Professor ID: ")
         external_examiner = input("Enter External Examiner's Professor ID: ")
         
         success, message = services.process_defense_request(
-            current_user['user_id'], req_id, defense_date, internal_examiner, external_examiner
+            current_user['user_id'], req_id, defense_date, internal_examiner, external_examiner,
+            defense_time, room_id
         )
         print(message)
     wait_for_enter()
     
+def print_attachments(thesis):
+    # Stored copies, which stay readable even if the submitted files moved.
+    for label, field in (('PDF', 'pdf_sha256'), ('Image', 'image_sha256')):
+        if attachments.has_blob(thesis.get(field)):
+            print(f"  {label}: {attachments.blob_path(thesis[field])}")
+
 def view_assigned_defenses_view():
     clear_screen()
     print("--- Defenses Assigned to You as Examiner ---")
     theses = services.get_assigned_defenses(current_user['user_id'])
-    if not theses:
+    theses = choose_sort(theses, lambda sort: services.get_assigned_defenses(current_user['user_id'], sort))
+
+    def show(t):
+        when = t.get('defense_time') or t['defense_date']
+        room = f", Room: {t['room_id']}" if t.get('room_id') else ""
+        print(f"Thesis ID: {t['thesis_id']}, Student: {t['student_id']}, Title: {t['title']}, Date: {when}{room}")
+        print_attachments(t)
+
+    if not page_through(theses, show):
         print("No defenses have been assigned to you for grading.")
-    else:
-        for t in theses:
-            print(f"Thesis ID: {t['thesis_id']}, Student: {t['student_id']}, Title: {t['title']}, Date: {t['defense_date']}")
     wait_for_enter()
 
 def submit_grade_view():
     clear_screen()
     print("--- Submit Final Grade ---")
-    theses = services.get_assigned_defenses(current_user['user_id'])
+    theses = list(services.get_assigned_defenses(current_user['user_id']))
     if not theses:
         print("You have no defenses to grade at this time.")
     else:
@@ -234,30 +298,158 @@ def submit_grade_view():
             print("Please enter a valid integer.")
     wait_for_enter()
     
+def print_batch_results(results):
+    succeeded = 0
+    for item_id, success, message in results:
+        print(f"{item_id}: {'OK' if success else 'FAILED'} - {message}")
+        succeeded += success
+    print(f"\n{succeeded} of {len(results)} items succeeded.")
+
+def batch_supervision_requests_view():
+    clear_screen()
+    print("--- Batch Process Supervision Requests ---")
+    requests = list(services.get_supervision_requests(current_user['user_id']))
+    if not requests:
+        print("There are no new requests.")
+    else:
+        for r in requests:
+            print(f"ID: {r['request_id']}, Student: {r['student_id']}")
+
+        ids = input("\nEnter request IDs separated by commas, or 'all': ").strip()
+        if ids.lower() == 'all':
+            request_ids = [r['request_id'] for r in requests]
+        else:
+            request_ids = [i.strip() for i in ids.split(',') if i.strip()]
+        action = input("Approve or reject? (type 'approve' or 'reject'): ").lower()
+        if action in ['approve', 'reject'] and request_ids:
+            success, results = services.process_supervision_requests(current_user['user_id'], request_ids, action)
+            if success:
+                print_batch_results(results)
+            else:
+                print(results)
+        else:
+            print("Invalid action.")
+    wait_for_enter()
+
+def read_grades_csv(path):
+    # Rows are "thesis_id,score"; a header line and blank lines are skipped.
+    grades, errors = [], []
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        for line_number, row in enumerate(csv.reader(f), 1):
+            if not row or not row[0].strip() or row[0].strip() == 'thesis_id':
+                continue
+            try:
+                grades.append((row[0].strip(), int(row[1])))
+            except (IndexError, ValueError):
+                errors.append(f"Line {line_number}: expected thesis_id,score")
+    return grades, errors
+
+def batch_submit_grades_view():
+    clear_screen()
+    print("--- Batch Submit Grades ---")
+    theses = list(services.get_assigned_defenses(current_user['user_id']))
+    if not theses:
+        print("You have no defenses to grade at this time.")
+        wait_for_enter()
+        return
+    for t in theses:
+        print(f"Thesis ID: {t['thesis_id']}, Student: {t['student_id']}")
+
+    print("\nEnter the path of a CSV file with thesis_id,score rows,")
+    print("or leave it empty to type one 'thesis_id,score' per line (empty line to finish).")
+    path = input("CSV file: ").strip()
+    if path:
+        try:
+            grades, errors = read_grades_csv(path)
+        except OSError as e:
+            print(f"Could not read file: {e}")
+            wait_for_enter()
+            return
+    else:
+        lines = []
+        while True:
+            line = input("> ").strip()
+            if not line:
+                break
+            lines.append(line)
+        grades, errors = [], []
+        for line in lines:
+            thesis_id, _, score = line.partition(',')
+            try:
+                grades.append((thesis_id.strip(), int(score)))
+            except ValueError:
+                errors.append(f"'{line}': expected thesis_id,score")
+    for error in errors:
+        print(error)
+    if grades:
+        success, results = services.submit_grades(current_user['user_id'], grades)
+        if success:
+            print_batch_results(results)
+        else:
+            print(results)
+    else:
+        print("No grades to submit.")
+    wait_for_enter()
+
 def search_menu():
     clear_screen()
     print("--- Search Thesis Archive ---")
-    print("Search by: 1. Title 2. Author (Student ID) 3. Supervisor (Prof ID) 4. Keywords")
+    print("Search by: 1. Title 2. Author (Student ID) 3. Supervisor (Prof ID) 4. Keywords 5. Full Text 6. Query")
     choice = input("> ")
-    search_by_map = {'1': 'title', '2': 'author', '3': 'supervisor', '4': 'keywords'}
+    search_by_map = {'1': 'title', '2': 'author', '3': 'supervisor', '4': 'keywords', '5': 'all'}
     
+    if choice == '6':
+        query_view()
+        return
     if choice in search_by_map:
         search_by = search_by_map[choice]
-        query = input(f"Enter search term for '{search_by}': ")
-        results = services.search_theses(query, search_by)
-        
-        if not results:
+        text = input(f"Enter search term for '{search_by}': ")
+        results = services.search_theses(text, search_by)
+        results = choose_sort(results, lambda sort: services.search_theses(text, search_by, sort))
+
+        def show(r):
+            print(f"Title: {r['title']}, Author: {r['student_id']}, Supervisor: {r['supervisor_id']}, Grade: {r['grade']}")
+            print(f"  Abstract: {r['abstract'][:100]}...")
+            print_attachments(r)
+            print("-" * 20)
+
+        print("\n--- Search Results ---")
+        if not page_through(results, show):
             print("No results found.")
-        else:
-            print("\n--- Search Results ---")
-            for r in results:
-                print(f"Title: {r['title']}, Author: {r['student_id']}, Supervisor: {r['supervisor_id']}, Grade: {r['grade']}")
-                print(f"  Abstract: {r['abstract'][:100]}...")
-                print("-" * 20)
     else:
         print("Invalid option.")
     wait_for_enter()
 
+def query_view():
+    print("Combine clauses with AND, e.g.:")
+    print('  supervisor = prof01 AND keyword contains "ML" AND grade in {A, B} AND year between 1400 and 1404')
+    print("Fields: " + ", ".join(query.FIELDS) + ". Start with 'explain' to see how the query runs.")
+    text = input("Query: ").strip()
+    explain = text.lower().startswith('explain ')
+    if explain:
+        text = text[len('explain '):]
+    try:
+        if explain:
+            print(services.explain_query(text).format())
+            wait_for_enter()
+            return
+        results = services.query_theses(text)
+    except query.QueryError as e:
+        print(f"Invalid query: {e}")
+        wait_for_enter()
+        return
+    results = choose_sort(results, lambda sort: services.query_theses(text, sort))
+
+    def show(r):
+        print(f"Title: {r['title']}, Author: {r['student_id']}, Supervisor: {r['supervisor_id']}, Grade: {r['grade']}")
+        print(f"  Keywords: {r['keywords']}  Defended: {r['defense_date']}")
+        print("-" * 20)
+
+    print("\n--- Query Results ---")
+    if not page_through(results, show):
+        print("No results found.")
+    wait_for_enter()
+
 def change_password_view():
     clear_screen()
     print("--- Change Password ---")
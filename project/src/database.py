@@ -1,24 +1,1031 @@
+import contextlib
+import functools
 import json
+import operator
 import os
+import threading
+import uuid
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import compress
+from src.indexes import CollectionIndex, INDEX_SPECS, count_values, matches_criteria
+from src.locking import LockSet
+from src.models import MISSING, decode, encode
+from src.partitions import (PARTITIONED_FILES, ArchivedRecordError, assign_terms, load_partitions, term_report,
+                            write_partition)
+from src.snapshot import SUFFIX as SNAPSHOT_SUFFIX, SnapshotReader, read_snapshot, write_snapshot
 
-DATA_DIR = 'data'
+DATA_DIR = os.environ.get('TMS_DATA_DIR', 'data')
 if not os.path.exists(DATA_DIR):
     os.makedirs(DATA_DIR)
 
+STORAGE_BACKEND = os.environ.get('TMS_STORAGE', 'json')
+SQLITE_FILE = 'thesis.db'
+
+# --- Cache Settings ---
+# Parsed collections are kept in memory and revalidated against the file's
+# (mtime, size, inode) on every access, so writes from other processes are seen.
+CACHE_MAX_ENTRIES = int(os.environ.get('TMS_CACHE_ENTRIES', 16))
+CACHE_MAX_BYTES = int(os.environ.get('TMS_CACHE_BYTES', 512 * 1024 * 1024))
+
+# --- Journaled Collections ---
+# Writes to these files are appended to "<file>.log" as JSON lines and the
+# log is folded back into the snapshot once it grows past the threshold.
+JOURNALED_FILES = {'requests.json', 'notifications.json'}
+JOURNAL_COMPACT_THRESHOLD = int(os.environ.get('TMS_JOURNAL_THRESHOLD', 1000))
+JOURNAL_FSYNC = os.environ.get('TMS_JOURNAL_FSYNC', '1') == '1'
+
+PRIMARY_KEYS = {filename: spec['key'] for filename, spec in INDEX_SPECS.items()}
+
+# --- Locking ---
+# Writers lock each collection through a lock file under data/.locks. File
+# locks are always taken before the in-process cache lock.
+LOCK_DIR = os.path.join(DATA_DIR, '.locks')
+TRANSACTION_DIR = os.path.join(DATA_DIR, '.transactions')
+_locks = LockSet(LOCK_DIR)
+
+_cache = OrderedDict()
+_cache_lock = threading.RLock()
+_cache_counters = {'hits': 0, 'misses': 0, 'evictions': 0}
+_generations = {}
+_positions_state = {}
+_indexes = {}
+_partition_lists = {}
+_partition_indexes = {}
+_backend = None
+
 def get_file_path(filename):
     return os.path.join(DATA_DIR, filename)
 
-def load_data(filename):
-    filepath = get_file_path(filename)
-    if not os.path.exists(filepath):
-        return []
+def get_journal_path(filename):
+    return get_file_path(filename) + '.log'
+
+# A collection's snapshot is "<name>.json", or the binary "<name>.tms" once
+# it has been converted (manage.py snapshot binary, see src/snapshot.py).
+# Journals, caching and locking work the same for both.
+def get_binary_path(filename):
+    return os.path.splitext(get_file_path(filename))[0] + SNAPSHOT_SUFFIX
+
+def get_snapshot_path(filename):
+    binary_path = get_binary_path(filename)
+    return binary_path if os.path.exists(binary_path) else get_file_path(filename)
+
+def is_binary(filename):
+    return os.path.exists(get_binary_path(filename))
+
+def get_archive_dir(filename):
+    return os.path.join(DATA_DIR, 'archive', os.path.splitext(filename)[0])
+
+def _file_signature(filepath):
+    try:
+        st = os.stat(filepath)
+    except FileNotFoundError:
+        return None
+    return _stat_signature(st)
+
+def _stat_signature(st):
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+def _snapshot_signature(filename):
+    signature = _file_signature(get_binary_path(filename))
+    return signature if signature is not None else _file_signature(get_file_path(filename))
+
+def _signature(filename):
+    signature = _snapshot_signature(filename)
+    if filename not in JOURNALED_FILES:
+        return signature
+    log_signature = _file_signature(get_journal_path(filename))
+    if signature is None and log_signature is None:
+        return None
+    return (signature, log_signature)
+
+def _signature_size(signature):
+    if signature is None:
+        return 0
+    if isinstance(signature[0], tuple) or signature[0] is None:
+        return sum(_signature_size(part) for part in signature)
+    return signature[1]
+
+def _cache_lookup(filename, signature):
+    with _cache_lock:
+        entry = _cache.get(filename)
+        if entry is not None and entry[0] == signature:
+            _cache.move_to_end(filename)
+            _cache_counters['hits'] += 1
+            return entry[1]
+        _cache_counters['misses'] += 1
+        return None
+
+def _cache_store(filename, signature, data):
+    with _cache_lock:
+        _generations[filename] = _generations.get(filename, 0) + 1
+        _cache.pop(filename, None)
+        if signature is None or _signature_size(signature) > CACHE_MAX_BYTES:
+            return
+        _cache[filename] = (signature, data)
+        while len(_cache) > CACHE_MAX_ENTRIES or _cached_bytes() > CACHE_MAX_BYTES:
+            _cache.popitem(last=False)
+            _cache_counters['evictions'] += 1
+
+def _cached_bytes():
+    return sum(_signature_size(entry[0]) for entry in _cache.values())
+
+def _cache_refresh(filename, signature):
+    with _cache_lock:
+        entry = _cache.get(filename)
+        if entry is not None:
+            _cache[filename] = (signature, entry[1])
+
+def _local_generation(filename):
+    with _cache_lock:
+        return _generations.get(filename, 0)
+
+def cache_stats():
+    with _cache_lock:
+        stats = dict(_cache_counters)
+        stats['entries'] = len(_cache)
+        stats['bytes'] = _cached_bytes()
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+        for key in _cache_counters:
+            _cache_counters[key] = 0
+
+def _read_json_file(filepath, filename):
+    # Records are decoded into their typed form as they are parsed, so the
+    # plain dicts never all exist at once.
     try:
         with open(filepath, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except (json.JSONDecodeError, FileNotFoundError):
+            return [decode(filename, record) for record in _iter_json_array(f)]
+    except (ValueError, FileNotFoundError):
+        return []
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+def _iter_json_array(f):
+    # Incremental parser for a file holding one JSON array: decodes an element
+    # as soon as it is complete, keeping only the unparsed tail of the text.
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = '', 0, False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        chunk = f.read(STREAM_CHUNK_SIZE)
+        buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+
+    def skip(chars):
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in chars:
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            fill()
+
+    skip(' \t\r\n')
+    if pos >= len(buffer):
+        return
+    if buffer[pos] != '[':
+        raise ValueError("Expected a JSON array")
+    pos += 1
+    while True:
+        skip(' \t\r\n,')
+        if pos >= len(buffer) or buffer[pos] == ']':
+            return
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+                # A value ending exactly at the buffer edge may continue in
+                # the next chunk (numbers); objects never do, but be sure.
+                if end < len(buffer) or eof:
+                    break
+            except ValueError:
+                if eof:
+                    raise
+            fill()
+        pos = end
+        yield item
+
+def _write_json_file(filepath, data):
+    tmp_path = f"{filepath}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False, default=encode)
+    os.replace(tmp_path, filepath)
+
+def _read_binary_file(filepath, filename):
+    # A damaged snapshot raises SnapshotError rather than reading as empty,
+    # so the next write cannot replace it with nothing.
+    try:
+        return read_snapshot(filepath, filename)
+    except FileNotFoundError:
         return []
 
+def _write_binary_file(filepath, filename, data):
+    write_snapshot(filepath, filename, data)
+
+def _read_snapshot(filename):
+    path = get_snapshot_path(filename)
+    if path.endswith(SNAPSHOT_SUFFIX):
+        return _read_binary_file(path, filename)
+    return _read_json_file(path, filename)
+
+def _write_snapshot(filename, data):
+    if is_binary(filename):
+        _write_binary_file(get_binary_path(filename), filename, data)
+    else:
+        _write_json_file(get_file_path(filename), data)
+
+# --- Storage API ---
+# Every read and write goes through the active backend. The JSON backend is
+# the default; set TMS_STORAGE=sqlite (after running "python manage.py
+# migrate") to use the SQLite database instead.
+def load_data(filename):
+    return get_backend().load_data(filename)
+
 def save_data(filename, data):
-    filepath = get_file_path(filename)
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
\ No newline at end of file
+    get_backend().save_data(filename, data)
+
+def put_record(filename, record):
+    get_backend().put_records(filename, [record])
+
+def put_records(filename, records):
+    if records:
+        get_backend().put_records(filename, records)
+
+def find_record(filename, record_id):
+    return get_backend().find_record(filename, record_id)
+
+def find_records(filename, **criteria):
+    return get_backend().find_records(filename, **criteria)
+
+def iter_records(filename, **criteria):
+    return get_backend().iter_records(filename, **criteria)
+
+def find_records_by_ids(filename, record_ids):
+    return get_backend().find_records_by_ids(filename, record_ids)
+
+def count_by(filename, *fields):
+    return get_backend().count_by(filename, fields)
+
+def compact(filename):
+    get_backend().compact(filename)
+
+def get_generation(filename):
+    return get_backend().get_generation(filename)
+
+def map_partitions(filename, func, **criteria):
+    return get_backend().map_partitions(filename, func, criteria)
+
+def is_archived(filename, record_id):
+    return get_backend().is_archived(filename, record_id)
+
+def convert_snapshot(filename, binary):
+    return _json_backend("Snapshot files are").convert(filename, binary)
+
+def list_terms():
+    return _json_backend("Term partitions are").terms()
+
+def freeze_terms(terms):
+    return _json_backend("Term partitions are").freeze(terms)
+
+def _json_backend(feature):
+    backend = get_backend()
+    if not isinstance(backend, JsonBackend):
+        raise ValueError(f"{feature} only used by the JSON backend.")
+    return backend
+
+def get_backend():
+    if _backend is None:
+        set_backend(STORAGE_BACKEND)
+        _backend.recover()
+    return _backend
+
+def set_backend(backend):
+    global _backend
+    if isinstance(backend, str):
+        if backend == 'sqlite':
+            from src.sqlite_backend import SqliteBackend
+            backend = SqliteBackend(get_file_path(SQLITE_FILE))
+        elif backend == 'json':
+            backend = JsonBackend()
+        else:
+            raise ValueError(f"Unknown storage backend: {backend}")
+    if _backend is not None and _backend is not backend:
+        _backend.close()
+    _backend = backend
+    return backend
+
+# --- JSON Backend ---
+class JsonBackend:
+    name = 'json'
+
+    # --- Partitioned Reads ---
+    # Requests and theses may have frozen term partitions next to the hot
+    # file (src/partitions.py). The public reads combine the two, skipping
+    # partitions whose field summaries rule the query out; the _hot_*
+    # methods below work on the collection file alone.
+    def partitions(self, filename):
+        if filename not in PARTITIONED_FILES:
+            return ()
+        directory = get_archive_dir(filename)
+        signature = _file_signature(directory)
+        with _cache_lock:
+            entry = _partition_lists.get(filename)
+            if entry is None or entry[0] != signature:
+                entry = (signature, load_partitions(directory, filename))
+                _partition_lists[filename] = entry
+            return entry[1]
+
+    def _matching(self, filename, criteria):
+        return [p for p in self.partitions(filename) if p.may_match(criteria)]
+
+    def load_data(self, filename):
+        data = self._load_hot(filename)
+        partitions = self.partitions(filename)
+        if not partitions:
+            return data
+        return data + [r for p in partitions for r in self._partition_records(filename, p, {})]
+
+    def find_record(self, filename, record_id):
+        record = self._hot_find_record(filename, record_id)
+        if record is None and self.partitions(filename):
+            found = self._archived_by_ids(filename, [record_id])
+            return found[0] if found else None
+        return record
+
+    def find_records(self, filename, **criteria):
+        records = self._hot_find_records(filename, **criteria)
+        for partition in self._matching(filename, criteria):
+            records.extend(self._partition_records(filename, partition, criteria))
+        return records
+
+    def iter_records(self, filename, **criteria):
+        yield from self._hot_iter_records(filename, **criteria)
+        for partition in self._matching(filename, criteria):
+            yield from self._partition_records(filename, partition, criteria)
+
+    def iter_data(self, filename):
+        yield from self._hot_iter_data(filename)
+        for partition in self.partitions(filename):
+            yield from self._partition_records(filename, partition, {})
+
+    def count_by(self, filename, fields):
+        counts = self._hot_count_by(filename, fields)
+        partitions = self.partitions(filename)
+        if not partitions:
+            return counts
+        counts = Counter(counts)
+        for partition in partitions:
+            counts.update(self._partition_count(filename, partition, tuple(fields)))
+        return dict(counts)
+
+    def find_records_by_ids(self, filename, record_ids):
+        found = self._hot_find_records_by_ids(filename, record_ids)
+        if len(found) == len(record_ids) or not self.partitions(filename):
+            return found
+        key = PRIMARY_KEYS[filename]
+        by_id = {r[key]: r for r in found}
+        by_id.update((r[key], r) for r in self._archived_by_ids(filename, [i for i in record_ids if i not in by_id]))
+        return [by_id[i] for i in record_ids if i in by_id]
+
+    def get_generation(self, filename):
+        generation = self._hot_generation(filename)
+        if not self.partitions(filename):
+            return generation
+        return (generation, _file_signature(get_archive_dir(filename)))
+
+    def map_partitions(self, filename, func, criteria):
+        # func(records) for the hot file and for every partition that may
+        # hold matches, run on a thread pool; returns the results in that
+        # order.
+        sources = [functools.partial(self._hot_iter_records, filename, **criteria)]
+        sources += [functools.partial(self._partition_records, filename, p, criteria)
+                    for p in self._matching(filename, criteria)]
+        if len(sources) == 1:
+            return [func(sources[0]())]
+        with ThreadPoolExecutor(max_workers=min(len(sources), os.cpu_count() or 1)) as executor:
+            return list(executor.map(lambda source: func(source()), sources))
+
+    def is_archived(self, filename, record_id):
+        return (bool(self.partitions(filename)) and self._hot_find_record(filename, record_id) is None
+                and bool(self._archived_by_ids(filename, [record_id])))
+
+    # --- Frozen Partitions ---
+    # A partition small enough for the cache is loaded whole and indexed
+    # once; it never changes, so the index is kept for as long as the file
+    # is there. Bigger ones are read a column at a time.
+    def _partition_index(self, filename, partition):
+        signature = _file_signature(partition.path)
+        if signature is None or signature[1] > CACHE_MAX_BYTES:
+            return None
+        with _cache_lock:
+            entry = _partition_indexes.get(partition.name)
+            if entry is not None and entry[0] == signature:
+                return entry[1]
+        index = CollectionIndex.for_collection(filename, _read_binary_file(partition.path, filename))
+        with _cache_lock:
+            _partition_indexes[partition.name] = (signature, index)
+        return index
+
+    def _partition_records(self, filename, partition, criteria):
+        index = self._partition_index(filename, partition)
+        if index is not None:
+            records = index.find(**criteria)
+        else:
+            records = _reader_records(partition.path, filename, criteria)
+        return self._visible(filename, partition, records)
+
+    def _partition_by_ids(self, filename, partition, record_ids):
+        index = self._partition_index(filename, partition)
+        if index is not None:
+            records = [r for r in map(index.get, record_ids) if r is not None]
+        else:
+            with SnapshotReader(partition.path, filename) as reader:
+                records = _reader_records_by_ids(reader, PRIMARY_KEYS[filename], record_ids)
+        return self._visible(filename, partition, records)
+
+    def _partition_count(self, filename, partition, fields):
+        if partition.pending:
+            return count_values(self._partition_records(filename, partition, {}), fields)
+        if fields not in partition.counts:
+            index = self._partition_index(filename, partition)
+            if index is not None:
+                partition.counts[fields] = index.count_by(fields)
+            else:
+                with SnapshotReader(partition.path, filename) as reader:
+                    partition.counts[fields] = _reader_count_by(reader, fields)
+        return partition.counts[fields]
+
+    def _visible(self, filename, partition, records):
+        # A pending partition only adds what the hot file no longer has.
+        if not partition.pending:
+            return records
+        key = PRIMARY_KEYS[filename]
+        records = list(records)
+        hot = {r[key] for r in self._hot_find_records_by_ids(filename, [r[key] for r in records])}
+        return [r for r in records if r[key] not in hot]
+
+    def _archived_by_ids(self, filename, record_ids):
+        key = PRIMARY_KEYS[filename]
+        found = {}
+        for partition in self.partitions(filename):
+            wanted = [i for i in record_ids if i not in found and partition.may_contain(key, i)]
+            if wanted:
+                found.update((r[key], r) for r in self._partition_by_ids(filename, partition, wanted))
+        return [found[i] for i in record_ids if i in found]
+
+    # --- Freezing Terms ---
+    # The records of each term are written to a pending partition, removed
+    # from the hot file, and the partition is then activated. recover()
+    # finishes a freeze a crash interrupted.
+    def terms(self):
+        # {term: {'requests', 'theses', 'open': hot record counts,
+        #         'frozen': {filename: archived count}}}
+        report = term_report(self._load_hot('requests.json'), self._load_hot('theses.json'),
+                             list(self.iter_records('courses.json')))
+        for filename in PARTITIONED_FILES:
+            for partition in self.partitions(filename):
+                entry = report.setdefault(partition.term, {'requests': 0, 'theses': 0, 'open': 0})
+                entry.setdefault('frozen', {})[filename] = partition.count
+        return report
+
+    def freeze(self, terms):
+        # -> {term: {filename: records moved}}
+        with self.locked(PARTITIONED_FILES):
+            hot = {filename: self._load_hot(filename) for filename in PARTITIONED_FILES}
+            courses = list(self.iter_records('courses.json'))
+            report = term_report(hot['requests.json'], hot['theses.json'], courses)
+            frozen = {p.term for filename in PARTITIONED_FILES for p in self.partitions(filename)}
+            for term in terms:
+                if term not in report:
+                    raise ValueError(f"Unknown term: {term}")
+                if term in frozen:
+                    raise ValueError(f"Term {term} is already frozen.")
+                if report[term]['open']:
+                    raise ValueError(f"Term {term} still has {report[term]['open']} pending requests or ungraded defenses.")
+            assigned = assign_terms(hot['requests.json'], hot['theses.json'], courses)
+            moved = {term: {} for term in terms}
+            for filename in PARTITIONED_FILES:
+                key = PRIMARY_KEYS[filename]
+                by_term = {term: [] for term in terms}
+                for record in hot[filename]:
+                    term = assigned[filename].get(record[key])
+                    if term in by_term:
+                        by_term[term].append(record)
+                for term, records in by_term.items():
+                    if records:
+                        write_partition(get_archive_dir(filename), filename, term, records)
+                    moved[term][filename] = len(records)
+            for filename in PARTITIONED_FILES:
+                self._finish_freeze(filename)
+            return moved
+
+    def _finish_freeze(self, filename):
+        _partition_lists.pop(filename, None)
+        pending = [p for p in self.partitions(filename) if p.pending]
+        if not pending:
+            return
+        key = PRIMARY_KEYS[filename]
+        archived = set()
+        for partition in pending:
+            with SnapshotReader(partition.path, filename) as reader:
+                archived.update(reader.column(key))
+        data = self._load_hot(filename)
+        remaining = [r for r in data if r[key] not in archived]
+        if len(remaining) != len(data):
+            self._save_hot(filename, remaining)
+        for partition in pending:
+            partition.activate()
+        _partition_lists.pop(filename, None)
+
+    # --- Writes ---
+    def save_data(self, filename, data):
+        if self.partitions(filename):
+            data = self._drop_archived(filename, data)
+        self._save_hot(filename, data)
+
+    def _drop_archived(self, filename, data):
+        # Records a frozen partition already holds stay there; a changed
+        # one is refused.
+        key = PRIMARY_KEYS[filename]
+        data = [decode(filename, record) for record in data]
+        archived = {r[key]: r for r in self._archived_by_ids(filename, [r[key] for r in data])}
+        changed = [r[key] for r in data if r[key] in archived and archived[r[key]] != r]
+        if changed:
+            raise ArchivedRecordError(f"{filename}: {', '.join(map(str, changed[:5]))} belong to frozen terms and cannot be changed.")
+        return [r for r in data if r[key] not in archived]
+
+    def _load_hot(self, filename):
+        signature = _signature(filename)
+        if signature is None:
+            return []
+        cached = _cache_lookup(filename, signature)
+        if cached is not None:
+            return cached
+        data = _read_snapshot(filename)
+        if filename in JOURNALED_FILES:
+            positions, entries = _replay_journal(filename, data)
+        _cache_store(filename, signature, data)
+        if filename in JOURNALED_FILES:
+            _positions_state[filename] = {
+                'generation': _local_generation(filename), 'data': data,
+                'positions': positions, 'entries': entries,
+            }
+        return data
+
+    def _save_hot(self, filename, data):
+        data = [decode(filename, record) for record in data]
+        with self.locked([filename]), _cache_lock:
+            _write_snapshot(filename, data)
+            if filename in JOURNALED_FILES:
+                _reset_journal(filename)
+            _cache_store(filename, _signature(filename), data)
+            _positions_state.pop(filename, None)
+
+    def put_records(self, filename, records):
+        key = PRIMARY_KEYS[filename]
+        records = [decode(filename, record) for record in records]
+        journaled = filename in JOURNALED_FILES
+        with self.locked([filename]), _cache_lock:
+            data = self._load_hot(filename)
+            positions = _get_positions(filename, data)
+            if self.partitions(filename):
+                # Ids the hot file lacks are new, unless a frozen term has them.
+                archived = self._archived_by_ids(filename, [r[key] for r in records if r[key] not in positions])
+                if archived:
+                    raise ArchivedRecordError(f"{filename}: {', '.join(str(r[key]) for r in archived[:5])} "
+                                              f"belong to frozen terms and cannot be changed.")
+            before = _signature(filename)
+            if journaled:
+                _append_journal(filename, records)
+            _upsert(data, positions, key, records)
+            if not journaled:
+                _write_snapshot(filename, data)
+            _update_index(filename, data, records)
+            entry = _cache.get(filename)
+            if entry is not None and entry[0] == before:
+                _cache_refresh(filename, _signature(filename))
+            else:
+                # Not cached, or changed on disk since it was cached; force a reload.
+                _cache.pop(filename, None)
+                _generations[filename] = _generations.get(filename, 0) + 1
+            state = _positions_state[filename]
+            if journaled:
+                state['entries'] += len(records)
+                if state['entries'] >= JOURNAL_COMPACT_THRESHOLD:
+                    self.compact(filename)
+
+    def compact(self, filename):
+        if filename not in JOURNALED_FILES:
+            return
+        with self.locked([filename]):
+            self._save_hot(filename, self._load_hot(filename))
+
+    def convert(self, filename, binary):
+        # Rewrites the snapshot in the other format with the journal folded
+        # in. The new file is written before the old one is removed, and a
+        # journal whose base is gone is ignored, so a crash in between
+        # leaves a complete snapshot either way.
+        with self.locked([filename]), _cache_lock:
+            if _snapshot_signature(filename) is None or is_binary(filename) == binary:
+                return False
+            data = self._load_hot(filename)
+            if binary:
+                _write_binary_file(get_binary_path(filename), filename, data)
+                if filename in JOURNALED_FILES:
+                    _reset_journal(filename)
+                os.remove(get_file_path(filename))
+            else:
+                _write_json_file(get_file_path(filename), data)
+                os.remove(get_binary_path(filename))
+                if filename in JOURNALED_FILES:
+                    _reset_journal(filename)
+            _cache_store(filename, _signature(filename), data)
+            _positions_state.pop(filename, None)
+            return True
+
+    # --- Transactions ---
+    # A commit spanning several files first writes a redo record listing every
+    # changed record, then applies each file, then deletes the record. Puts
+    # are idempotent, so a redo record left by a crash is simply replayed the
+    # next time any of its files is locked.
+    @contextlib.contextmanager
+    def locked(self, filenames):
+        wanted = set(filenames)
+        while True:
+            acquired = _locks.acquire(wanted)
+            if not acquired:
+                # Already held by an enclosing lock on this thread.
+                yield
+                return
+            try:
+                pending = [r for r in _pending_redo_records() if wanted & set(r[1])]
+                missing = set().union(*(r[1] for r in pending)) - set(_locks.held())
+            except BaseException:
+                _locks.release(acquired)
+                raise
+            if missing:
+                _locks.release(acquired)
+                wanted |= missing
+                continue
+            try:
+                for path, writes in pending:
+                    try:
+                        self._apply_writes(writes)
+                    except ArchivedRecordError:
+                        # It can never be applied; set aside as .failed for an
+                        # operator to inspect instead of failing every lock.
+                        os.replace(path, path[:-len('.json')] + '.failed')
+                        continue
+                    os.remove(path)
+                yield
+            finally:
+                _locks.release(acquired)
+            return
+
+    def apply_atomic(self, writes):
+        if len(writes) == 1:
+            self._apply_writes(writes)
+            return
+        path = _write_redo_record(writes)
+        self._apply_writes(writes)
+        os.remove(path)
+
+    def _apply_writes(self, writes):
+        for filename, records in writes.items():
+            self.put_records(filename, records)
+
+    def recover(self):
+        for path, writes in _pending_redo_records():
+            with self.locked(writes):
+                pass
+        for filename in PARTITIONED_FILES:
+            if any(p.pending for p in self.partitions(filename)):
+                with self.locked(PARTITIONED_FILES):
+                    self._finish_freeze(filename)
+
+    # --- Hot Partition ---
+    # Indexes are rebuilt whenever the cached collection is replaced and are
+    # updated in place by put_records, so lookups never scan the whole list.
+    def get_index(self, filename):
+        data = self._load_hot(filename)
+        with _cache_lock:
+            generation = _local_generation(filename)
+            entry = _indexes.get(filename)
+            if entry is None or entry[0] != generation or entry[1] is not data:
+                entry = (generation, data, CollectionIndex.for_collection(filename, data))
+                _indexes[filename] = entry
+            return entry[2]
+
+    # Held while reading so a put_records in another thread cannot change the
+    # index mid-lookup.
+    def _hot_find_record(self, filename, record_id):
+        if self.streaming(filename):
+            found = self._hot_find_records_by_ids(filename, [record_id])
+            return found[0] if found else None
+        with _cache_lock:
+            return self.get_index(filename).get(record_id)
+
+    def _hot_find_records(self, filename, **criteria):
+        if self.streaming(filename):
+            return list(self._hot_iter_records(filename, **criteria))
+        with _cache_lock:
+            return self.get_index(filename).find(**criteria)
+
+    def _hot_count_by(self, filename, fields):
+        if self.streaming(filename):
+            if is_binary(filename):
+                return self._binary_count_by(filename, fields)
+            return count_values(self._hot_iter_data(filename), fields)
+        with _cache_lock:
+            return self.get_index(filename).count_by(fields)
+
+    def _hot_find_records_by_ids(self, filename, record_ids):
+        if not self.streaming(filename):
+            with _cache_lock:
+                index = self.get_index(filename)
+                return [r for r in map(index.get, record_ids) if r is not None]
+        if is_binary(filename):
+            return self._binary_records_by_ids(filename, record_ids)
+        key = PRIMARY_KEYS[filename]
+        wanted = set(record_ids)
+        found = {}
+        for record in self._hot_iter_data(filename):
+            if record.get(key) in wanted:
+                found[record[key]] = record
+                if len(found) == len(wanted):
+                    break
+        return [found[i] for i in record_ids if i in found]
+
+    def _hot_generation(self, filename):
+        if self.streaming(filename):
+            # Streamed collections are never cached, so the files themselves
+            # are the version.
+            return _signature(filename)
+        return _local_generation(filename)
+
+    # --- Streaming Reads ---
+    # Collections too big for the cache are never materialized: reads parse
+    # the snapshot one record at a time and overlay the journal, so memory
+    # stays bounded by the largest record plus the journal tail.
+    def streaming(self, filename):
+        return _signature_size(_signature(filename)) > CACHE_MAX_BYTES
+
+    def _open_stream(self, filename):
+        # The snapshot (an open JSON file or a SnapshotReader) and the journal
+        # records that replace or extend it, by key.
+        path = get_snapshot_path(filename)
+        try:
+            if path.endswith(SNAPSHOT_SUFFIX):
+                f = SnapshotReader(path, filename)
+            else:
+                f = open(path, 'r', encoding='utf-8')
+        except FileNotFoundError:
+            f = None
+        key = PRIMARY_KEYS[filename]
+        overrides = {}
+        if filename in JOURNALED_FILES:
+            snapshot = None if f is None else list(_stat_signature(os.fstat(f.fileno())))
+            for records in _journal_batches(filename, snapshot):
+                for record in records:
+                    overrides[record[key]] = record
+        return f, overrides
+
+    def _hot_iter_data(self, filename):
+        if not self.streaming(filename):
+            yield from self._load_hot(filename)
+            return
+        f, overrides = self._open_stream(filename)
+        key = PRIMARY_KEYS[filename]
+        if f is not None:
+            with f:
+                if isinstance(f, SnapshotReader):
+                    records = f.iter_records()
+                else:
+                    records = (decode(filename, record) for record in _iter_json_array(f))
+                for record in records:
+                    yield overrides.pop(record.get(key), record)
+        yield from overrides.values()
+
+    # A streamed binary snapshot is read a column at a time: lookups decode
+    # the key column and then only the records asked for, and counts decode
+    # only the counted columns.
+    def _binary_records_by_ids(self, filename, record_ids):
+        key = PRIMARY_KEYS[filename]
+        f, overrides = self._open_stream(filename)
+        found = {i: overrides[i] for i in record_ids if i in overrides}
+        wanted = [i for i in record_ids if i not in found]
+        if f is not None:
+            with f:
+                for record in _reader_records_by_ids(f, key, wanted) if wanted else ():
+                    found.setdefault(record[key], record)
+        return [found[i] for i in record_ids if i in found]
+
+    def _binary_count_by(self, filename, fields):
+        f, overrides = self._open_stream(filename)
+        counts = Counter()
+        if f is not None:
+            with f:
+                # Records the journal replaced are counted in their new form.
+                counts.update(_reader_count_by(f, fields, PRIMARY_KEYS[filename], overrides))
+        for value, count in count_values(overrides.values(), fields).items():
+            counts[value] += count
+        return dict(counts)
+
+    def _hot_iter_records(self, filename, **criteria):
+        if not self.streaming(filename):
+            yield from self._hot_find_records(filename, **criteria)
+            return
+        for record in self._hot_iter_data(filename):
+            if matches_criteria(record, criteria):
+                yield record
+
+    def close(self):
+        pass
+
+# --- Column Reads ---
+# Binary snapshots too big to cache are queried through their columns: a
+# filter, lookup or count decodes only the fields it names, and records are
+# built only for the positions that match.
+def _column_values(reader, field):
+    return [None if v is MISSING else v for v in reader.column(field)]
+
+def _reader_positions(reader, criteria):
+    keep = None
+    for field, expected in criteria.items():
+        hits = [expected in v if isinstance(v, list) else v == expected for v in _column_values(reader, field)]
+        keep = hits if keep is None else list(map(operator.and_, keep, hits))
+    return list(compress(range(reader.count), keep))
+
+def _reader_records(path, filename, criteria):
+    with SnapshotReader(path, filename) as reader:
+        if criteria:
+            yield from reader.select(_reader_positions(reader, criteria))
+        else:
+            yield from reader.iter_records()
+
+def _reader_records_by_ids(reader, key, record_ids):
+    keys = reader.column(key)
+    wanted = set(record_ids)
+    if len(wanted) == 1:
+        positions = [keys.index(record_id) for record_id in wanted if record_id in keys]
+    else:
+        positions = [i for i, k in enumerate(keys) if k in wanted]
+    return list(reader.select(positions))
+
+def _reader_count_by(reader, fields, key=None, skip=()):
+    # skip: ids whose stored records are not to be counted.
+    columns = [_column_values(reader, field) for field in fields]
+    if skip:
+        keep = [k not in skip for k in reader.column(key)]
+        columns = [list(compress(column, keep)) for column in columns]
+    return Counter(columns[0] if len(fields) == 1 else zip(*columns))
+
+def _get_positions(filename, data):
+    state = _positions_state.get(filename)
+    if state is not None and state['data'] is data and state['generation'] == _local_generation(filename):
+        return state['positions']
+    key = PRIMARY_KEYS[filename]
+    positions = {item.get(key): i for i, item in enumerate(data)}
+    _positions_state[filename] = {
+        'generation': _local_generation(filename), 'data': data,
+        'positions': positions, 'entries': 0 if state is None else state['entries'],
+    }
+    return positions
+
+def _upsert(data, positions, key, records):
+    for record in records:
+        position = positions.get(record[key])
+        if position is None:
+            positions[record[key]] = len(data)
+            data.append(record)
+        else:
+            data[position] = record
+
+def _update_index(filename, data, records):
+    entry = _indexes.get(filename)
+    if entry is not None and entry[1] is data and entry[0] == _local_generation(filename):
+        for record in records:
+            entry[2].add(record)
+
+def _write_redo_record(writes):
+    os.makedirs(TRANSACTION_DIR, exist_ok=True)
+    path = os.path.join(TRANSACTION_DIR, f"{uuid.uuid4()}.json")
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(writes, f, ensure_ascii=False, default=encode)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + '.tmp', path)
+    return path
+
+def _pending_redo_records():
+    try:
+        names = sorted(os.listdir(TRANSACTION_DIR))
+    except FileNotFoundError:
+        return []
+    records = []
+    for name in names:
+        if not name.endswith('.json'):
+            continue
+        path = os.path.join(TRANSACTION_DIR, name)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                records.append((path, json.load(f)))
+        except (FileNotFoundError, json.JSONDecodeError):
+            continue
+    return records
+
+# --- Journal Files ---
+# The first line of a log names the snapshot it applies to. A log whose base
+# no longer matches the snapshot was already folded in by a compaction that
+# was interrupted before the log could be reset, so it is ignored.
+def _journal_header(filename):
+    return {'op': 'base', 'snapshot': _snapshot_signature(filename)}
+
+def _encode_entries(entries):
+    return b''.join(
+        json.dumps(entry, ensure_ascii=False, separators=(',', ':'), default=encode).encode('utf-8') + b'\n'
+        for entry in entries
+    )
+
+def _reset_journal(filename):
+    log_path = get_journal_path(filename)
+    tmp_path = f"{log_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_encode_entries([_journal_header(filename)]))
+        if JOURNAL_FSYNC:
+            os.fsync(f.fileno())
+    os.replace(tmp_path, log_path)
+
+def _append_journal(filename, records):
+    log_path = get_journal_path(filename)
+    if not os.path.exists(log_path):
+        _reset_journal(filename)
+    # One line per batch, so a torn append never applies half a transaction.
+    payload = _encode_entries([{'op': 'put', 'records': records}])
+    with open(log_path, 'r+b') as f:
+        _repair_torn_tail(f)
+        f.seek(0, os.SEEK_END)
+        f.write(payload)
+        f.flush()
+        if JOURNAL_FSYNC:
+            os.fsync(f.fileno())
+
+def _repair_torn_tail(f):
+    end = f.seek(0, os.SEEK_END)
+    if end == 0:
+        return
+    f.seek(end - 1)
+    if f.read(1) == b'\n':
+        return
+    position = end
+    while position > 0:
+        start = max(0, position - 4096)
+        f.seek(start)
+        chunk = f.read(position - start)
+        newline = chunk.rfind(b'\n')
+        if newline != -1:
+            f.truncate(start + newline + 1)
+            return
+        position = start
+    f.truncate(0)
+
+def _replay_journal(filename, data):
+    key = PRIMARY_KEYS[filename]
+    positions = {item.get(key): i for i, item in enumerate(data)}
+    entries = 0
+    for records in _journal_batches(filename, _base_signature(filename)):
+        _upsert(data, positions, key, records)
+        entries += len(records)
+    return positions, entries
+
+def _journal_batches(filename, snapshot):
+    # Yields the record lists of every complete 'put' line of a log that
+    # belongs to the given snapshot signature.
+    try:
+        f = open(get_journal_path(filename), 'rb')
+    except FileNotFoundError:
+        return
+    with f:
+        for line_number, line in enumerate(f):
+            if not line.endswith(b'\n'):
+                break  # torn final record from an interrupted append
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry.get('op') == 'base':
+                if line_number == 0 and entry.get('snapshot') != snapshot:
+                    return
+                continue
+            if entry.get('op') == 'put':
+                records = entry['records'] if 'records' in entry else [entry['record']]
+                yield [decode(filename, record) for record in records]
+
+def _base_signature(filename):
+    signature = _snapshot_signature(filename)
+    return None if signature is None else list(signature)
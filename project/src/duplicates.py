@@ -0,0 +1,452 @@
+import json
+import os
+import random
+import sys
+import threading
+import zlib
+from array import array
+from src.database import find_records, get_file_path, get_generation, iter_records
+from src.models import RequestStatus, RequestType
+from src.search import tokenize
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+INDEX_FILE = 'duplicates_index.bin'
+LOG_COMPACT_THRESHOLD = int(os.environ.get('TMS_DUPLICATES_LOG_THRESHOLD', 500))
+
+# --- Similarity Settings ---
+# Title and abstract are compared as sets of word 3-grams (after the search
+# normalization), and Jaccard similarity is estimated from 64 MinHash values.
+# LSH splits the signature into 16 bands of 4: two texts become candidates if
+# any band matches, which happens for 90% of pairs at similarity 0.6 and
+# practically always above 0.75.
+SHINGLE_SIZE = 3
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SIMILARITY_THRESHOLD = float(os.environ.get('TMS_DUPLICATE_THRESHOLD', 0.7))
+MAX_MATCHES = 5
+
+# h(x) = (a * x + b) mod p with a fixed seed, so signatures stored on disk
+# stay comparable. Shingle hashes are 32-bit, so a * x fits in 64 bits.
+_PRIME = (1 << 31) - 1
+_rng = random.Random(20240521)
+_A = [_rng.randrange(1, _PRIME) for _ in range(NUM_PERM)]
+_B = [_rng.randrange(0, _PRIME) for _ in range(NUM_PERM)]
+
+def shingles(title, abstract):
+    tokens = tokenize(f"{title or ''} {abstract or ''}")
+    if len(tokens) < SHINGLE_SIZE:
+        return set(tokens)
+    return {' '.join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+
+def _shingle_hashes(title, abstract):
+    return [zlib.crc32(s.encode('utf-8')) for s in shingles(title, abstract)]
+
+def signature(title, abstract):
+    # NUM_PERM minimum hash values, or None for a text without words.
+    hashes = _shingle_hashes(title, abstract)
+    if not hashes:
+        return None
+    if numpy is not None:
+        x = numpy.array(hashes, dtype=numpy.uint64)
+        values = (_A_VECTOR[:, None] * x[None, :] + _B_VECTOR[:, None]) % _PRIME
+        return values.min(axis=1).astype(numpy.uint32)
+    return array('I', [min((a * x + b) % _PRIME for x in hashes) for a, b in zip(_A, _B)])
+
+def signatures(documents, batch_size=2000):
+    # Signatures for many (title, abstract) pairs. With NumPy the shingles of
+    # a whole batch are hashed in one array operation and reduced per document.
+    if numpy is None:
+        return [signature(title, abstract) for title, abstract in documents]
+    result = []
+    documents = list(documents)
+    for start in range(0, len(documents), batch_size):
+        per_document = [_shingle_hashes(t, a) for t, a in documents[start:start + batch_size]]
+        present = [i for i, hashes in enumerate(per_document) if hashes]
+        batch = [None] * len(per_document)
+        if present:
+            lengths = numpy.array([len(per_document[i]) for i in present])
+            offsets = numpy.concatenate(([0], numpy.cumsum(lengths)[:-1]))
+            x = numpy.fromiter((h for i in present for h in per_document[i]), dtype=numpy.uint64,
+                               count=int(lengths.sum()))
+            values = (_A_VECTOR[:, None] * x[None, :] + _B_VECTOR[:, None]) % _PRIME
+            minima = numpy.minimum.reduceat(values, offsets, axis=1).T.astype(numpy.uint32)
+            for i, row in zip(present, minima):
+                batch[i] = row
+        result.extend(batch)
+    return result
+
+if numpy is not None:
+    _A_VECTOR = numpy.array(_A, dtype=numpy.uint64)
+    _B_VECTOR = numpy.array(_B, dtype=numpy.uint64)
+    # Mixes the ROWS values of a band into one 64-bit key (wrapping).
+    _BAND_MIX = numpy.array([0x9E3779B97F4A7C15 ** i % (1 << 64) for i in range(ROWS)], dtype=numpy.uint64)
+
+# --- Band Tables ---
+# Both tables store the signatures by row and answer "which rows share a band
+# with this signature" and "how similar are these rows to it".
+class _SortedBands:
+    # NumPy: signatures in one growing uint32 matrix. Band keys of all rows
+    # up to `merged` are kept sorted per band and searched with searchsorted;
+    # rows added since then (the tail) are compared directly. The tail is
+    # merged into the sorted part once it grows past a fraction of the index.
+    # At 500k theses this holds about 190 MB: 128 for the signatures, 32 each
+    # for the sorted 32-bit keys and their rows.
+    MERGE_MIN = 4096
+
+    def __init__(self):
+        self.signatures = numpy.zeros((1024, NUM_PERM), dtype=numpy.uint32)
+        self.count = 0
+        self.merged = 0
+        self.sorted_keys = numpy.zeros((BANDS, 0), dtype=numpy.uint32)
+        self.sorted_rows = numpy.zeros((BANDS, 0), dtype=numpy.int32)
+        self.tail_keys = numpy.zeros((0, BANDS), dtype=numpy.uint32)
+
+    @staticmethod
+    def band_keys(matrix):
+        # The high half of a wrapping 64-bit mix; a rare 32-bit collision only
+        # adds a candidate that fails the similarity check.
+        bands = matrix.reshape(len(matrix), BANDS, ROWS).astype(numpy.uint64)
+        return ((bands * _BAND_MIX).sum(axis=2, dtype=numpy.uint64) >> numpy.uint64(32)).astype(numpy.uint32)
+
+    def append(self, rows):
+        rows = numpy.asarray(rows, dtype=numpy.uint32).reshape(-1, NUM_PERM)
+        needed = self.count + len(rows)
+        if needed > len(self.signatures):
+            self.signatures = numpy.resize(self.signatures, (max(needed, 2 * len(self.signatures)), NUM_PERM))
+        self.signatures[self.count:needed] = rows
+        self.count = needed
+        if self.count - self.merged > max(self.MERGE_MIN, self.merged // 8):
+            self.merge()
+        else:
+            self.tail_keys = numpy.concatenate((self.tail_keys, self.band_keys(rows)))
+
+    def merge(self):
+        keys = self.band_keys(self.signatures[:self.count]).T
+        self.sorted_rows = numpy.argsort(keys, axis=1, kind='stable').astype(numpy.int32)
+        self.sorted_keys = numpy.take_along_axis(keys, self.sorted_rows, axis=1)
+        self.merged = self.count
+        self.tail_keys = numpy.zeros((0, BANDS), dtype=numpy.uint32)
+
+    def candidates(self, sig):
+        query = self.band_keys(numpy.asarray(sig, dtype=numpy.uint32).reshape(1, NUM_PERM))[0]
+        found = []
+        if self.merged:
+            for band in range(BANDS):
+                keys = self.sorted_keys[band]
+                low = numpy.searchsorted(keys, query[band], 'left')
+                high = numpy.searchsorted(keys, query[band], 'right')
+                if high > low:
+                    found.append(self.sorted_rows[band, low:high])
+        if len(self.tail_keys):
+            found.append(numpy.flatnonzero((self.tail_keys == query).any(axis=1)) + self.merged)
+        return numpy.unique(numpy.concatenate(found)).tolist() if found else []
+
+    def similarities(self, rows, sig):
+        if not rows:
+            return []
+        return (self.signatures[rows] == numpy.asarray(sig, dtype=numpy.uint32)).mean(axis=1).tolist()
+
+    def row(self, index):
+        return self.signatures[index]
+
+class _DictBands:
+    # Pure Python: one dict of band value -> rows per band.
+    def __init__(self):
+        self.signatures = []
+        self.buckets = [{} for _ in range(BANDS)]
+
+    def append(self, rows):
+        for sig in rows:
+            index = len(self.signatures)
+            self.signatures.append(sig)
+            for band in range(BANDS):
+                key = tuple(sig[band * ROWS:(band + 1) * ROWS])
+                self.buckets[band].setdefault(key, []).append(index)
+
+    def candidates(self, sig):
+        found = set()
+        for band in range(BANDS):
+            found.update(self.buckets[band].get(tuple(sig[band * ROWS:(band + 1) * ROWS]), ()))
+        return sorted(found)
+
+    def similarities(self, rows, sig):
+        return [sum(a == b for a, b in zip(self.signatures[row], sig)) / NUM_PERM for row in rows]
+
+    def row(self, index):
+        return self.signatures[index]
+
+# --- Signature Index ---
+# Documents are theses ("t:<thesis_id>") and pending defense requests
+# ("r:<request_id>"). Removing a document only forgets its row; rows are
+# reclaimed when the index is rebuilt at compaction.
+class SignatureIndex:
+    def __init__(self):
+        self.tables = _SortedBands() if numpy is not None else _DictBands()
+        self.doc_ids = []
+        self.rows = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add_many(self, doc_ids, sigs):
+        # sigs: one signature per id, or a (len(doc_ids), NUM_PERM) matrix.
+        if not len(doc_ids):
+            return
+        for doc_id in doc_ids:
+            self.rows[doc_id] = len(self.doc_ids)
+            self.doc_ids.append(doc_id)
+        self.tables.append(sigs)
+
+    def remove(self, doc_id):
+        self.rows.pop(doc_id, None)
+
+    def similar(self, sig, threshold=SIMILARITY_THRESHOLD, limit=MAX_MATCHES):
+        # [(doc_id, similarity)], most similar first.
+        rows = [row for row in self.tables.candidates(sig) if self.rows.get(self.doc_ids[row]) == row]
+        scored = [(self.doc_ids[row], score) for row, score in zip(rows, self.tables.similarities(rows, sig))
+                  if score >= threshold]
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        return scored[:limit]
+
+    def live(self):
+        for doc_id, row in self.rows.items():
+            yield doc_id, self.tables.row(row)
+
+# --- Persistence ---
+# The snapshot is a JSON header line with the document ids followed by their
+# signatures as raw little-endian uint32 values; documents added or removed
+# since the last compaction are appended to "<snapshot>.log" as JSON lines.
+# Replaying an entry twice is harmless.
+_lock = threading.RLock()
+_state = {'index': None, 'snapshot': None, 'offset': 0, 'log_entries': 0, 'generations': None}
+
+def _snapshot_path():
+    return get_file_path(INDEX_FILE)
+
+def _log_path():
+    return _snapshot_path() + '.log'
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+def _read_snapshot(path):
+    index = SignatureIndex()
+    with open(path, 'rb') as f:
+        header = json.loads(f.readline())
+        if header.get('version') != 1 or header.get('num_perm') != NUM_PERM:
+            return index
+        doc_ids = header['ids']
+        data = f.read(len(doc_ids) * NUM_PERM * 4)
+    if numpy is not None:
+        index.add_many(doc_ids, numpy.frombuffer(data, dtype='<u4').astype(numpy.uint32).reshape(-1, NUM_PERM))
+    else:
+        values = array('I', data)
+        if sys.byteorder != 'little':
+            values.byteswap()
+        index.add_many(doc_ids, [values[i * NUM_PERM:(i + 1) * NUM_PERM] for i in range(len(doc_ids))])
+    return index
+
+def _load():
+    snapshot = _stat(_snapshot_path())
+    index = SignatureIndex()
+    if snapshot is not None:
+        try:
+            index = _read_snapshot(_snapshot_path())
+        except (ValueError, KeyError):
+            index = SignatureIndex()
+    _state.update(index=index, snapshot=snapshot, offset=0, log_entries=0, generations=None)
+    _replay_log()
+
+def _replay_log():
+    try:
+        f = open(_log_path(), 'rb')
+    except FileNotFoundError:
+        _state['offset'] = 0
+        return
+    added_ids, added = [], []
+    with f:
+        f.seek(_state['offset'])
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            _state['offset'] += len(line)
+            _state['log_entries'] += 1
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry.get('signature') is None:
+                _state['index'].add_many(added_ids, added)
+                added_ids, added = [], []
+                _state['index'].remove(entry['doc_id'])
+            else:
+                added_ids.append(entry['doc_id'])
+                added.append(_from_list(entry['signature']))
+    _state['index'].add_many(added_ids, added)
+
+def _from_list(values):
+    return numpy.array(values, dtype=numpy.uint32) if numpy is not None else array('I', values)
+
+def _append_log(entries):
+    payload = b''.join(
+        json.dumps({'doc_id': doc_id, 'signature': None if sig is None else [int(v) for v in sig]},
+                   separators=(',', ':')).encode('utf-8') + b'\n'
+        for doc_id, sig in entries
+    )
+    with open(_log_path(), 'ab') as f:
+        f.write(payload)
+    _state['offset'] += len(payload)
+    _state['log_entries'] += len(entries)
+    if _state['log_entries'] >= LOG_COMPACT_THRESHOLD:
+        compact()
+
+def _record(entries):
+    # Large changes (a first build, a reload after a bulk import) go straight
+    # into a new snapshot instead of through the log.
+    if len(entries) >= LOG_COMPACT_THRESHOLD:
+        compact()
+    elif entries:
+        _append_log(entries)
+
+def compact():
+    # Rows of removed documents are left out of the snapshot, and are
+    # dropped from memory the next time it is loaded.
+    with _lock:
+        index = get_index()
+        live = list(index.live())
+        if numpy is not None:
+            data = numpy.array([sig for _, sig in live], dtype='<u4').tobytes()
+        else:
+            values = array('I')
+            for _, sig in live:
+                values.extend(sig)
+            if sys.byteorder != 'little':
+                values.byteswap()
+            data = values.tobytes()
+        header = {'version': 1, 'num_perm': NUM_PERM, 'ids': [doc_id for doc_id, _ in live]}
+        tmp_path = f"{_snapshot_path()}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(json.dumps(header, separators=(',', ':')).encode('utf-8') + b'\n')
+            f.write(data)
+        os.replace(tmp_path, _snapshot_path())
+        open(_log_path(), 'wb').close()
+        _state.update(snapshot=_stat(_snapshot_path()), offset=0, log_entries=0)
+
+def get_index():
+    with _lock:
+        if _state['index'] is None or _stat(_snapshot_path()) != _state['snapshot']:
+            _load()
+        else:
+            log = _stat(_log_path())
+            log_size = 0 if log is None else log[1]
+            if log_size < _state['offset']:
+                _load()
+            elif log_size > _state['offset']:
+                _replay_log()
+        return _state['index']
+
+# --- Documents ---
+def _thesis_document(thesis):
+    return 't:' + thesis['thesis_id'], thesis.get('title'), thesis.get('abstract')
+
+def _request_document(request):
+    details = request.get('details') or {}
+    return 'r:' + request['request_id'], details.get('title'), details.get('abstract')
+
+def _pending_requests():
+    return find_records('requests.json', type=RequestType.DEFENSE, status=RequestStatus.DEFENSE_PENDING)
+
+def _documents():
+    for thesis in iter_records('theses.json'):
+        yield _thesis_document(thesis)
+    for request in _pending_requests():
+        yield _request_document(request)
+
+def _add(index, documents):
+    # Returns the (doc_id, signature) entries added; texts without words are
+    # skipped.
+    documents = list(documents)
+    entries = [(doc_id, sig) for (doc_id, _, _), sig
+               in zip(documents, signatures((title, abstract) for _, title, abstract in documents))
+               if sig is not None]
+    index.add_many([doc_id for doc_id, _ in entries], [sig for _, sig in entries])
+    return entries
+
+SYNC_BATCH_SIZE = 5000
+
+def sync():
+    # Brings the index in line with theses.json and the pending defense
+    # requests after either was reloaded from disk. Only documents the index
+    # lacks are hashed.
+    with _lock:
+        index = get_index()
+        generations = (get_generation('theses.json'), get_generation('requests.json'))
+        if _state['generations'] == generations:
+            return index
+        wanted = set()
+        missing = []
+        changes = []
+        for document in _documents():
+            wanted.add(document[0])
+            if document[0] not in index.rows:
+                missing.append(document)
+                if len(missing) >= SYNC_BATCH_SIZE:
+                    changes += _add(index, missing)
+                    missing = []
+        changes += _add(index, missing)
+        stale = [doc_id for doc_id in index.rows if doc_id not in wanted]
+        for doc_id in stale:
+            index.remove(doc_id)
+        _record(changes + [(doc_id, None) for doc_id in stale])
+        _state['generations'] = generations
+        return index
+
+# --- Public API ---
+def find_similar(title, abstract, threshold=SIMILARITY_THRESHOLD, limit=MAX_MATCHES):
+    # [(kind, id, similarity)] for theses ('thesis') and pending defense
+    # requests ('request') whose title and abstract resemble the given text.
+    sig = signature(title, abstract)
+    if sig is None:
+        return []
+    with _lock:
+        matches = sync().similar(sig, threshold, limit)
+    kinds = {'t': 'thesis', 'r': 'request'}
+    return [(kinds[doc_id[0]], doc_id[2:], round(score, 3)) for doc_id, score in matches]
+
+def index_requests(requests):
+    with _lock:
+        _record(_add(get_index(), (_request_document(r) for r in requests)))
+
+def index_finalized(requests, theses):
+    # A finalized defense request becomes a thesis: swap the documents.
+    with _lock:
+        index = get_index()
+        removed = ['r:' + r['request_id'] for r in requests]
+        for doc_id in removed:
+            index.remove(doc_id)
+        entries = [(doc_id, None) for doc_id in removed]
+        entries += _add(index, (_thesis_document(t) for t in theses))
+        _record(entries)
+
+def rebuild():
+    with _lock:
+        index = SignatureIndex()
+        batch = []
+        for document in _documents():
+            batch.append(document)
+            if len(batch) >= SYNC_BATCH_SIZE:
+                _add(index, batch)
+                batch = []
+        _add(index, batch)
+        _state.update(index=index, offset=0, log_entries=0)
+        compact()
+        return _state['index']
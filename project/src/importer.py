@@ -0,0 +1,149 @@
+import csv
+import json
+import os
+from src import auth, database
+
+# --- Row Schemas ---
+# field: (converter, required). Rows are validated one by one while the input
+# is streamed, so a bad file is rejected without ever being held in memory.
+SCHEMAS = {
+    'students': {
+        'filename': 'students.json',
+        'fields': {'user_id': (str, True), 'name': (str, True), 'password': (str, True)},
+    },
+    'professors': {
+        'filename': 'professors.json',
+        'fields': {'user_id': (str, True), 'name': (str, True), 'password': (str, True),
+                   'supervision_capacity': (int, True), 'examiner_capacity': (int, True)},
+    },
+    'courses': {
+        'filename': 'courses.json',
+        'fields': {'course_id': (str, True), 'title': (str, True), 'professor_id': (str, True),
+                   'year': (int, True), 'semester': (str, True), 'capacity': (int, True),
+                   'unit': (int, True)},
+    },
+}
+
+def iter_rows(path):
+    # Yields (line_number, row) from a CSV file with a header line or from a
+    # JSONL file (one object per line), chosen by extension.
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        if path.endswith(('.jsonl', '.ndjson')):
+            for line_number, line in enumerate(f, 1):
+                if line.strip():
+                    try:
+                        yield line_number, json.loads(line)
+                    except json.JSONDecodeError as e:
+                        yield line_number, e
+        else:
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+
+def validate_row(kind, row):
+    if isinstance(row, Exception):
+        raise ValueError(f"invalid JSON: {row}")
+    if not isinstance(row, dict):
+        raise ValueError(f"expected an object, got {type(row).__name__}")
+    record = {}
+    for field, (convert, required) in SCHEMAS[kind]['fields'].items():
+        value = row.get(field)
+        if isinstance(value, str):
+            value = value.strip()
+        if value in (None, ''):
+            if required:
+                raise ValueError(f"missing '{field}'")
+            continue
+        try:
+            value = convert(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"'{field}' must be {convert.__name__}, got {value!r}")
+        if convert is int and value < 0:
+            raise ValueError(f"'{field}' must not be negative")
+        record[field] = value
+    return record
+
+# --- Import ---
+# Returns (imported_count, errors) where errors is a list of
+# (line_number, message). The file is read twice. The first pass validates
+# every row and keeps only the ids seen, so nothing is written unless every
+# row is valid, or skip_invalid is set, in which case the bad rows are left
+# out; a dry run stops there. The second pass hashes and writes the rows
+# IMPORT_BATCH at a time, so memory is bounded by the batch and one id per
+# row rather than by the file. An import stopped half-way keeps the batches
+# already written.
+IMPORT_BATCH = int(os.environ.get('TMS_IMPORT_BATCH', 5000))
+
+def _validate_file(kind, path):
+    # Returns ({record_id: line_number} of the valid rows, errors).
+    filename = SCHEMAS[kind]['filename']
+    key = database.PRIMARY_KEYS[filename]
+    seen, errors = {}, []
+    professors = set()
+    for line_number, row in iter_rows(path):
+        try:
+            record = validate_row(kind, row)
+            record_id = record[key]
+            if record_id in seen:
+                raise ValueError(f"duplicate {key} '{record_id}' (first seen on line {seen[record_id]})")
+            if database.find_record(filename, record_id) is not None:
+                raise ValueError(f"{key} '{record_id}' already exists")
+            if kind == 'courses' and record['professor_id'] not in professors:
+                if database.find_record('professors.json', record['professor_id']) is None:
+                    raise ValueError(f"unknown professor '{record['professor_id']}'")
+                professors.add(record['professor_id'])
+        except ValueError as e:
+            errors.append((line_number, str(e)))
+            continue
+        seen[record_id] = line_number
+    return seen, errors
+
+def _write_batch(kind, batch, workers):
+    # batch: [(line_number, record)]. Returns (written, errors).
+    filename = SCHEMAS[kind]['filename']
+    key = database.PRIMARY_KEYS[filename]
+    if 'password' in SCHEMAS[kind]['fields']:
+        hashes = auth.hash_passwords([r['password'] for _, r in batch], workers)
+        batch = [(line, {('password_hash' if k == 'password' else k): (h if k == 'password' else v) for k, v in r.items()})
+                 for (line, r), h in zip(batch, hashes)]
+    # Someone may have added one of these ids since the first pass, so the
+    # duplicate check is repeated under the lock before the write.
+    with database.get_backend().locked([filename]):
+        clashes = [(line, f"{key} '{r[key]}' already exists")
+                   for line, r in batch if database.find_record(filename, r[key]) is not None]
+        taken = {line for line, _ in clashes}
+        records = [r for line, r in batch if line not in taken]
+        database.put_records(filename, records)
+    return len(records), clashes
+
+def import_file(kind, path, workers=None, skip_invalid=False, dry_run=False):
+    if kind not in SCHEMAS:
+        raise ValueError(f"Unknown import kind: {kind}")
+    seen, errors = _validate_file(kind, path)
+    if (errors and not skip_invalid) or not seen:
+        return 0, errors
+    if dry_run:
+        return len(seen), errors
+
+    valid_lines = set(seen.values())
+    del seen
+    imported, batch = 0, []
+    for line_number, row in iter_rows(path):
+        if line_number not in valid_lines:
+            continue
+        try:
+            batch.append((line_number, validate_row(kind, row)))
+        except ValueError as e:
+            # The file changed since the first pass.
+            errors.append((line_number, str(e)))
+            continue
+        if len(batch) >= IMPORT_BATCH:
+            written, clashes = _write_batch(kind, batch, workers)
+            imported += written
+            errors += clashes
+            batch = []
+    if batch:
+        written, clashes = _write_batch(kind, batch, workers)
+        imported += written
+        errors += clashes
+    return imported, errors
@@ -0,0 +1,114 @@
+# --- Index Definitions ---
+# Every collection gets a primary-key map. Each entry in 'groups' is a tuple
+# of fields; a single-field group over a list value (e.g. 'examiners') is
+# indexed once per element.
+INDEX_SPECS = {
+    'requests.json': {
+        'key': 'request_id',
+        'groups': [('professor_id', 'type', 'status'), ('type', 'status'), ('student_id',)],
+    },
+    'theses.json': {
+        'key': 'thesis_id',
+        'groups': [('examiners',), ('supervisor_id',), ('student_id',), ('status',)],
+        'lists': ('examiners',),
+    },
+    'students.json': {'key': 'user_id', 'groups': []},
+    'professors.json': {'key': 'user_id', 'groups': []},
+    'courses.json': {'key': 'course_id', 'groups': [('professor_id',)]},
+    'rooms.json': {'key': 'room_id', 'groups': []},
+    'availability.json': {'key': 'professor_id', 'groups': []},
+    'notifications.json': {'key': 'notification_id', 'groups': [('user_id', 'read'), ('user_id',), ('status',)]},
+}
+
+class CollectionIndex:
+    def __init__(self, key, groups):
+        self.key = key
+        self.groups = [tuple(group) for group in groups]
+        self.records = {}
+        self.postings = {group: {} for group in self.groups}
+        self._indexed_under = {}
+
+    @classmethod
+    def for_collection(cls, filename, records=()):
+        spec = INDEX_SPECS.get(filename, {'key': 'id', 'groups': []})
+        index = cls(spec['key'], spec['groups'])
+        for record in records:
+            index.add(record)
+        return index
+
+    def __len__(self):
+        return len(self.records)
+
+    def add(self, record):
+        pk = record.get(self.key)
+        if pk in self.records:
+            self.remove(pk)
+        self.records[pk] = record
+        entries = []
+        for group in self.groups:
+            postings = self.postings[group]
+            for value in self._group_values(record, group):
+                postings.setdefault(value, {})[pk] = record
+                entries.append((group, value))
+        self._indexed_under[pk] = entries
+
+    def remove(self, pk):
+        if self.records.pop(pk, None) is None:
+            return
+        for group, value in self._indexed_under.pop(pk, ()):
+            bucket = self.postings[group].get(value)
+            if bucket is not None:
+                bucket.pop(pk, None)
+                if not bucket:
+                    del self.postings[group][value]
+
+    def get(self, pk):
+        return self.records.get(pk)
+
+    def find(self, **criteria):
+        group = self._best_group(criteria)
+        if group is None:
+            candidates = self.records.values()
+        else:
+            value = criteria[group[0]] if len(group) == 1 else tuple(criteria[f] for f in group)
+            candidates = self.postings[group].get(value, {}).values()
+        remaining = {f: v for f, v in criteria.items() if group is None or f not in group}
+        return [r for r in candidates if matches_criteria(r, remaining)]
+
+    def count_by(self, fields):
+        # {value or tuple of values: count}, straight from the postings when
+        # the fields form an index group.
+        group = tuple(fields)
+        if group in self.postings:
+            return {value: len(bucket) for value, bucket in self.postings[group].items()}
+        return count_values(self.records.values(), group)
+
+    def _best_group(self, criteria):
+        covered = [g for g in self.groups if all(f in criteria for f in g)]
+        return max(covered, key=len) if covered else None
+
+    @staticmethod
+    def _group_values(record, group):
+        if len(group) == 1:
+            value = record.get(group[0])
+            if isinstance(value, list):
+                return set(value)
+            return [value]
+        return [tuple(record.get(f) for f in group)]
+
+def matches_criteria(record, criteria):
+    for field, expected in criteria.items():
+        value = record.get(field)
+        if isinstance(value, list):
+            if expected not in value:
+                return False
+        elif value != expected:
+            return False
+    return True
+
+def count_values(records, fields):
+    counts = {}
+    for record in records:
+        value = record.get(fields[0]) if len(fields) == 1 else tuple(record.get(f) for f in fields)
+        counts[value] = counts.get(value, 0) + 1
+    return counts
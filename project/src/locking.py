@@ -0,0 +1,86 @@
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+# --- Inter-process File Locks ---
+# flock() locks belong to the open file, so two threads of one process that
+# open the lock file separately also exclude each other.
+class FileLock:
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def acquire(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        f = open(self.path, 'a+b')
+        try:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        continue
+        except BaseException:
+            f.close()
+            raise
+        self._file = f
+
+    def release(self):
+        f, self._file = self._file, None
+        if f is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            f.close()
+
+class LockSet:
+    # Re-entrant per thread: a name this thread already holds is skipped, and
+    # new names are always taken in sorted order so writers cannot deadlock.
+    def __init__(self, directory):
+        self.directory = directory
+        self._local = threading.local()
+
+    def held(self):
+        held = getattr(self._local, 'held', None)
+        if held is None:
+            held = self._local.held = {}
+        return held
+
+    def acquire(self, names):
+        held = self.held()
+        acquired = []
+        try:
+            for name in sorted(set(names)):
+                if name in held:
+                    continue
+                lock = FileLock(os.path.join(self.directory, name + '.lock'))
+                lock.acquire()
+                held[name] = lock
+                acquired.append(name)
+        except BaseException:
+            self.release(acquired)
+            raise
+        return acquired
+
+    def release(self, names):
+        held = self.held()
+        for name in reversed(names):
+            lock = held.pop(name, None)
+            if lock is not None:
+                lock.release()
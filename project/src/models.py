@@ -1,39 +1,335 @@
-from abc import ABC, abstractmethod
+import copy
+import json
+import sys
+from abc import abstractmethod
+from collections.abc import Mapping, MutableMapping
+from enum import Enum
 
-class User(ABC):
-    def __init__(self, user_id, name, password_hash):
-        self.user_id = user_id
-        self.name = name
-        self.password_hash = password_hash
+# --- Status Enums ---
+# Members are str subclasses, so they compare, hash and serialize exactly like
+# the strings stored in the JSON files, while every record shares one object.
+class _StrEnum(str, Enum):
+    __str__ = str.__str__
+    __format__ = str.__format__
+
+class RequestType(_StrEnum):
+    COURSE = "course_request"
+    DEFENSE = "defense_request"
+
+class RequestStatus(_StrEnum):
+    PENDING = "Pending Professor Approval"
+    APPROVED = "Approved"
+    REJECTED = "Rejected"
+    DEFENSE_PENDING = "Pending Defense Approval"
+    FINALIZED = "Finalized"
+
+class ThesisStatus(_StrEnum):
+    DEFENSE_APPROVED = "Approved for Defense"
+    DEFENDED = "Defended"
+
+class _Missing:
+    # Marks an optional field the stored record does not have, so it is
+    # written back without it.
+    __slots__ = ()
+
+    def __bool__(self):
+        return False
+
+    def __repr__(self):
+        return 'MISSING'
+
+MISSING = _Missing()
+
+def _enum(enum_type):
+    def convert(value):
+        try:
+            return enum_type(value)
+        except ValueError:
+            return value
+    return convert
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+def _intern_list(value):
+    return [_intern(v) for v in value] if type(value) is list else value
+
+def _intern_keys(value):
+    return {_intern(k): v for k, v in value.items()} if type(value) is dict else value
+
+# --- Records ---
+# A Record keeps its fields in __slots__ instead of a per-record dict. It also
+# implements the mapping protocol, so record['status'] and record.get(...)
+# keep working everywhere a dict used to be passed around. Fields a stored
+# record lacks stay MISSING; keys the class does not know go to _extra.
+class Record(MutableMapping):
+    __slots__ = ('_extra',)
+    _fields = ()
+    _field_set = frozenset()
+    _converters = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._field_set = frozenset(cls._fields)
+
+    def __init__(self, *args, **kwargs):
+        if len(args) > len(self._fields):
+            raise TypeError(f"{type(self).__name__} takes at most {len(self._fields)} positional arguments")
+        values = dict(zip(self._fields, args))
+        values.update(kwargs)
+        self._extra = None
+        converters = self._converters
+        for field in self._fields:
+            value = values.pop(field, MISSING)
+            if value is not MISSING and field in converters:
+                value = converters[field](value)
+            setattr(self, field, value)
+        if values:
+            self._extra = values
+
+    @classmethod
+    def from_dict(cls, data):
+        record = cls.__new__(cls)
+        record._extra = None
+        converters = cls._converters
+        for field in cls._fields:
+            value = data.get(field, MISSING)
+            if value is not MISSING and field in converters:
+                value = converters[field](value)
+            setattr(record, field, value)
+        if not cls._field_set.issuperset(data):
+            record._extra = {k: v for k, v in data.items() if k not in cls._field_set}
+        return record
+
+    def to_dict(self):
+        data = {}
+        for field in self._fields:
+            value = getattr(self, field)
+            if value is not MISSING:
+                data[field] = value
+        if self._extra:
+            data.update(self._extra)
+        return data
+
+    def copy(self):
+        # Deep enough for services to mutate the copy: nested lists and dicts
+        # (examiners, scores, details) are copied too.
+        record = type(self).__new__(type(self))
+        for field in self._fields:
+            value = getattr(self, field)
+            if type(value) is dict:
+                value = dict(value)
+            elif type(value) is list:
+                value = list(value)
+            elif isinstance(value, Record):
+                value = value.copy()
+            setattr(record, field, value)
+        record._extra = copy.deepcopy(self._extra)
+        return record
+
+    # --- Mapping protocol ---
+    def __getitem__(self, key):
+        if key in self._field_set:
+            value = getattr(self, key)
+            if value is not MISSING:
+                return value
+        elif self._extra and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        if key in self._field_set:
+            value = getattr(self, key)
+            return default if value is MISSING else value
+        if self._extra:
+            return self._extra.get(key, default)
+        return default
+
+    def __setitem__(self, key, value):
+        if key in self._field_set:
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key in self._field_set and getattr(self, key) is not MISSING:
+            setattr(self, key, MISSING)
+        elif self._extra and key in self._extra:
+            del self._extra[key]
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        if key in self._field_set:
+            return getattr(self, key) is not MISSING
+        return bool(self._extra) and key in self._extra
+
+    def __iter__(self):
+        for field in self._fields:
+            if getattr(self, field) is not MISSING:
+                yield field
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __eq__(self, other):
+        if type(other) is type(self):
+            return (all(getattr(self, f) == getattr(other, f) for f in self._fields)
+                    and (self._extra or None) == (other._extra or None))
+        if isinstance(other, Mapping):
+            return self.to_dict() == dict(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+class User(Record):
+    __slots__ = ('user_id', 'name', 'password_hash')
+    _fields = __slots__
+    _converters = {'user_id': _intern}
 
     @abstractmethod
     def get_dashboard(self):
         pass
 
 class Student(User):
-    def __init__(self, user_id, name, password_hash):
-        super().__init__(user_id, name, password_hash)
+    __slots__ = ()
 
     def get_dashboard(self):
         return f"Student Dashboard: {self.name} ({self.user_id})"
 
 class Professor(User):
-    def __init__(self, user_id, name, password_hash, supervision_capacity, examiner_capacity):
-        super().__init__(user_id, name, password_hash)
-        self.supervision_capacity = supervision_capacity
-        self.examiner_capacity = examiner_capacity
+    __slots__ = ('supervision_capacity', 'examiner_capacity')
+    _fields = User._fields + __slots__
 
     def get_dashboard(self):
         return (f"Professor Dashboard: {self.name} ({self.user_id})\n"
                 f"Supervision Capacity: {self.supervision_capacity}\n"
                 f"Examiner Capacity: {self.examiner_capacity}")
 
-class ThesisCourse:
-    def __init__(self, course_id, title, professor_id, year, semester, capacity, unit):
-        self.course_id = course_id
-        self.title = title
-        self.professor_id = professor_id
-        self.year = year
-        self.semester = semester
-        self.capacity = capacity
-        self.unit = unit
\ No newline at end of file
+class ThesisCourse(Record):
+    __slots__ = ('course_id', 'title', 'professor_id', 'year', 'semester', 'capacity', 'unit')
+    _fields = __slots__
+    _converters = {'course_id': _intern, 'professor_id': _intern, 'semester': _intern}
+
+class PackedMapping(Mapping):
+    # A read-only mapping kept as one compact JSON string and decoded on each
+    # access. Used for rarely read, text-heavy values (defense request
+    # details), where one string costs far less than a dict of strings.
+    __slots__ = ('_packed',)
+
+    def __init__(self, data):
+        self._packed = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+    def unpack(self):
+        return json.loads(self._packed)
+
+    def dumps(self):
+        return self._packed
+
+    @classmethod
+    def loads(cls, packed):
+        # From text produced by dumps(), without re-serializing it.
+        mapping = cls.__new__(cls)
+        mapping._packed = packed
+        return mapping
+
+    def __getitem__(self, key):
+        return self.unpack()[key]
+
+    def __iter__(self):
+        return iter(self.unpack())
+
+    def __len__(self):
+        return len(self.unpack())
+
+    def __eq__(self, other):
+        if isinstance(other, PackedMapping):
+            return self._packed == other._packed
+        if isinstance(other, Mapping):
+            return self.unpack() == dict(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"PackedMapping({self._packed})"
+
+def _packed(value):
+    return PackedMapping(value) if type(value) is dict else value
+
+class Request(Record):
+    # Course requests use course_id/request_date/approval_date; defense
+    # requests use course_request_id/submission_date/details.
+    __slots__ = ('request_id', 'type', 'student_id', 'course_id', 'course_request_id', 'professor_id',
+                 'request_date', 'submission_date', 'status', 'approval_date', 'details')
+    _fields = __slots__
+    _converters = {'type': _enum(RequestType), 'status': _enum(RequestStatus), 'details': _packed,
+                   'student_id': _intern, 'course_id': _intern, 'professor_id': _intern}
+
+class Thesis(Record):
+    __slots__ = ('thesis_id', 'student_id', 'supervisor_id', 'title', 'abstract', 'keywords',
+                 'pdf_path', 'image_path', 'defense_date', 'examiners', 'status', 'grade', 'scores',
+                 'defense_time', 'room_id', 'pdf_sha256', 'image_sha256')
+    _fields = __slots__
+    _converters = {'status': _enum(ThesisStatus), 'student_id': _intern, 'supervisor_id': _intern,
+                   'examiners': _intern_list, 'scores': _intern_keys, 'room_id': _intern}
+
+class Room(Record):
+    __slots__ = ('room_id', 'name')
+    _fields = __slots__
+
+class Availability(Record):
+    # unavailable: [[start, end], ...] as ISO datetimes, end exclusive.
+    __slots__ = ('professor_id', 'unavailable')
+    _fields = __slots__
+    _converters = {'professor_id': _intern}
+
+class Notification(Record):
+    # An outbox entry: written in the transaction that changed a status,
+    # then delivered by src/notifications.py. delivered lists the sinks that
+    # have it; read is the recipient's own flag.
+    __slots__ = ('notification_id', 'user_id', 'event', 'subject_id', 'message', 'created_at', 'status',
+                 'attempts', 'next_attempt', 'lease_until', 'delivered', 'last_error', 'sent_at', 'read')
+    _fields = __slots__
+    _converters = {'user_id': _intern, 'event': _intern, 'status': _intern}
+
+# --- Storage Codec ---
+RECORD_TYPES = {
+    'students.json': Student,
+    'professors.json': Professor,
+    'courses.json': ThesisCourse,
+    'requests.json': Request,
+    'theses.json': Thesis,
+    'rooms.json': Room,
+    'availability.json': Availability,
+    'notifications.json': Notification,
+}
+
+def decode(filename, data):
+    # Stored dict -> typed record; collections without a type stay dicts.
+    record_type = RECORD_TYPES.get(filename)
+    if record_type is None or isinstance(data, record_type):
+        return data
+    return record_type.from_dict(data)
+
+def encode(obj):
+    # json "default" hook: typed records are written as plain objects.
+    if isinstance(obj, Record):
+        return obj.to_dict()
+    if isinstance(obj, PackedMapping):
+        return obj.unpack()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def clone(record):
+    if record is None:
+        return None
+    if isinstance(record, Record):
+        return record.copy()
+    return copy.deepcopy(record)
@@ -0,0 +1,300 @@
+import heapq
+import json
+import os
+import random
+import smtplib
+import threading
+import urllib.request
+import uuid
+from datetime import datetime, timedelta
+from email.generator import BytesGenerator
+from email.message import Message
+from email.utils import format_datetime
+from urllib.parse import urlparse
+from src.database import LOCK_DIR, find_records, get_file_path
+from src.locking import FileLock
+from src.models import Notification
+from src.transactions import run_transaction
+
+# --- Notification Outbox ---
+# Services record a notification in the same transaction as the status
+# change it reports (enqueue), so a change is never committed without its
+# notification and vice versa. The recipient sees it in their menu at once;
+# a background worker delivers it to the configured sinks in batches:
+#     mbox                    appended to data/notifications.mbox
+#     mbox:/path/to/file      or to another mbox file
+#     smtp://host:port        sent through an SMTP server
+#     http(s)://host/path     POSTed as a JSON batch to a webhook
+# TMS_NOTIFY_SINKS is a comma-separated list of them ("mbox" by default,
+# empty for none). A notification is retried with exponential backoff until
+# every sink has it; sinks that already took it are not sent it again.
+OUTBOX_FILE = 'notifications.json'
+PENDING = 'pending'
+SENT = 'sent'
+FAILED = 'failed'
+
+NOTIFY_SINKS = os.environ.get('TMS_NOTIFY_SINKS', 'mbox')
+NOTIFY_DOMAIN = os.environ.get('TMS_NOTIFY_DOMAIN', 'localhost')
+NOTIFY_SENDER = os.environ.get('TMS_NOTIFY_SENDER', f"thesis-office@{NOTIFY_DOMAIN}")
+BATCH_SIZE = int(os.environ.get('TMS_NOTIFY_BATCH', 100))
+POLL_INTERVAL = float(os.environ.get('TMS_NOTIFY_INTERVAL', 5.0))
+MAX_ATTEMPTS = int(os.environ.get('TMS_NOTIFY_MAX_ATTEMPTS', 8))
+RETRY_BASE = float(os.environ.get('TMS_NOTIFY_RETRY_SECONDS', 10.0))
+RETRY_MAX = 3600.0
+# A worker claims a batch for this long, so that workers in other processes
+# skip it; a crashed worker's batch is picked up again afterwards.
+LEASE_SECONDS = 120.0
+SINK_TIMEOUT = 10.0
+
+worker_stats = {'batches': 0, 'sent': 0, 'retried': 0, 'failed': 0, 'errors': 0}
+
+def enqueue(tx, user_id, event, message, subject_id=None):
+    now = datetime.now().isoformat()
+    tx.put(OUTBOX_FILE, Notification(
+        notification_id=str(uuid.uuid4()), user_id=user_id, event=event, subject_id=subject_id, message=message,
+        created_at=now, status=PENDING, attempts=0, next_attempt=now, lease_until=None, delivered=[],
+        last_error=None, sent_at=None, read=False,
+    ))
+
+def _subject(notification):
+    return f"[Thesis Management] {notification.event.replace('_', ' ').capitalize()}"
+
+def _address(user_id):
+    return f"{user_id}@{NOTIFY_DOMAIN}"
+
+def _email(notification):
+    # The legacy Message class: EmailMessage's header parsing costs about
+    # fifty times as much per message.
+    message = Message()
+    message['From'] = NOTIFY_SENDER
+    message['To'] = _address(notification.user_id)
+    message['Subject'] = _subject(notification)
+    message['Date'] = format_datetime(datetime.fromisoformat(notification.created_at).astimezone())
+    message['Message-ID'] = f"<{notification.notification_id}@{NOTIFY_DOMAIN}>"
+    message.set_payload(notification.message, 'utf-8')
+    return message
+
+# --- Sinks ---
+# A sink takes a whole batch; raising means none of it counts as delivered.
+class MboxSink:
+    def __init__(self, path=None):
+        self.path = path or get_file_path('notifications.mbox')
+        self.name = f"mbox:{self.path}"
+
+    def send(self, batch):
+        # Appended in mbox format ("From " lines escaped) rather than through
+        # the mailbox module, which reads the whole file on every open.
+        lock = FileLock(os.path.join(LOCK_DIR, f"{os.path.basename(self.path)}.lock"))
+        lock.acquire()
+        try:
+            with open(self.path, 'ab') as f:
+                for notification in batch:
+                    message = _email(notification)
+                    message.set_unixfrom(f"From {NOTIFY_SENDER} {datetime.now().strftime('%a %b %d %H:%M:%S %Y')}")
+                    BytesGenerator(f, mangle_from_=True).flatten(message, unixfrom=True)
+                    f.write(b'\n')
+                f.flush()
+                os.fsync(f.fileno())
+        finally:
+            lock.release()
+
+class SmtpSink:
+    def __init__(self, host, port=25):
+        self.host, self.port = host, port
+        self.name = f"smtp://{host}:{port}"
+
+    def send(self, batch):
+        with smtplib.SMTP(self.host, self.port, timeout=SINK_TIMEOUT) as smtp:
+            for notification in batch:
+                smtp.send_message(_email(notification))
+
+class WebhookSink:
+    def __init__(self, url):
+        self.url = url
+        self.name = url
+
+    def send(self, batch):
+        body = json.dumps({'notifications': [{
+            'id': n.notification_id, 'user_id': n.user_id, 'event': n.event, 'subject_id': n.subject_id,
+            'message': n.message, 'created_at': n.created_at,
+        } for n in batch]}, ensure_ascii=False).encode('utf-8')
+        request = urllib.request.Request(self.url, data=body, method='POST',
+                                         headers={'Content-Type': 'application/json'})
+        # urlopen raises for any status other than 2xx.
+        with urllib.request.urlopen(request, timeout=SINK_TIMEOUT) as response:
+            response.read()
+
+# scheme -> factory taking the parsed spec; register more with add_sink_type.
+SINK_TYPES = {
+    'mbox': lambda spec: MboxSink(spec.path or None),
+    'smtp': lambda spec: SmtpSink(spec.hostname or 'localhost', spec.port or 25),
+    'http': lambda spec: WebhookSink(spec.geturl()),
+    'https': lambda spec: WebhookSink(spec.geturl()),
+}
+
+def add_sink_type(scheme, factory):
+    SINK_TYPES[scheme] = factory
+
+def parse_sinks(text):
+    sinks = []
+    for spec in filter(None, (part.strip() for part in (text or '').split(','))):
+        parsed = urlparse(spec if ':' in spec else f"{spec}:")
+        if parsed.scheme not in SINK_TYPES:
+            raise ValueError(f"Unknown notification sink {spec!r}. Known: {', '.join(SINK_TYPES)}.")
+        sinks.append(SINK_TYPES[parsed.scheme](parsed))
+    return sinks
+
+# --- Delivery ---
+def _backoff(attempts):
+    delay = min(RETRY_BASE * 2 ** (attempts - 1), RETRY_MAX)
+    return delay * random.uniform(0.8, 1.2)
+
+def _due(notification, now):
+    return (notification.status == PENDING and notification.next_attempt <= now
+            and (notification.lease_until or '') <= now)
+
+def _claim(tx, now, limit):
+    # Candidates come from the status index; only the claimed ones are read
+    # through the transaction, so a large backlog does not make every claim
+    # conflict with new notifications.
+    candidates = heapq.nsmallest(limit, (n for n in find_records(OUTBOX_FILE, status=PENDING) if _due(n, now)),
+                                 key=lambda n: n.created_at)
+    until = (datetime.fromisoformat(now) + timedelta(seconds=LEASE_SECONDS)).isoformat()
+    claimed = []
+    for candidate in candidates:
+        notification = tx.get(OUTBOX_FILE, candidate.notification_id)
+        if notification is not None and _due(notification, now):
+            notification.lease_until = until
+            tx.put(OUTBOX_FILE, notification)
+            claimed.append(notification)
+    return claimed
+
+def _record(tx, batch, sinks, errors, now):
+    outcome = {'sent': 0, 'retried': 0, 'failed': 0}
+    for claimed in batch:
+        notification = tx.get(OUTBOX_FILE, claimed.notification_id)
+        if notification is None:
+            continue
+        notification.delivered = [sink.name for sink in sinks
+                                  if sink.name not in errors or sink.name in notification.delivered]
+        notification.lease_until = None
+        if len(notification.delivered) == len(sinks):
+            notification.status = SENT
+            notification.sent_at = now
+            notification.last_error = None
+            outcome['sent'] += 1
+        else:
+            notification.attempts += 1
+            notification.last_error = '; '.join(f"{name}: {error}" for name, error in errors.items()
+                                                if name not in notification.delivered)
+            if notification.attempts >= MAX_ATTEMPTS:
+                notification.status = FAILED
+                outcome['failed'] += 1
+            else:
+                retry_at = datetime.fromisoformat(now) + timedelta(seconds=_backoff(notification.attempts))
+                notification.next_attempt = retry_at.isoformat()
+                outcome['retried'] += 1
+        tx.put(OUTBOX_FILE, notification)
+    return outcome
+
+def deliver_batch(sinks, limit=BATCH_SIZE):
+    # Claims up to limit due notifications, sends them and records the
+    # outcome; returns how many were claimed.
+    batch = run_transaction(lambda tx: _claim(tx, datetime.now().isoformat(), limit))
+    if not batch:
+        return 0
+    errors = {}
+    for sink in sinks:
+        pending = [n for n in batch if sink.name not in n.delivered]
+        if not pending:
+            continue
+        try:
+            sink.send(pending)
+        except Exception as e:
+            errors[sink.name] = f"{type(e).__name__}: {e}"
+    outcome = run_transaction(lambda tx: _record(tx, batch, sinks, errors, datetime.now().isoformat()))
+    worker_stats['batches'] += 1
+    for name, count in outcome.items():
+        worker_stats[name] += count
+    return len(batch)
+
+def deliver_all(sinks, limit=BATCH_SIZE):
+    # Delivers everything that is due now; returns how many were claimed.
+    total = 0
+    while True:
+        claimed = deliver_batch(sinks, limit)
+        total += claimed
+        if claimed < limit:
+            return total
+
+def retry_failed():
+    # Gives every notification that ran out of attempts a fresh set.
+    def reset(tx):
+        now = datetime.now().isoformat()
+        failed = tx.find(OUTBOX_FILE, status=FAILED)
+        for notification in failed:
+            notification.update(status=PENDING, attempts=0, next_attempt=now, lease_until=None)
+            tx.put(OUTBOX_FILE, notification)
+        return len(failed)
+    return run_transaction(reset)
+
+# --- Background Worker ---
+class OutboxWorker:
+    def __init__(self, sinks, batch_size=BATCH_SIZE, interval=POLL_INTERVAL):
+        self.sinks = sinks
+        self.batch_size = batch_size
+        self.interval = interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='notification-outbox', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            # Cleared before the batch, so a wake during it is not lost.
+            self._wake.clear()
+            try:
+                claimed = deliver_batch(self.sinks, self.batch_size)
+            except Exception:
+                # Storage errors or conflicts; the batch's lease runs out and
+                # it is claimed again.
+                worker_stats['errors'] += 1
+                claimed = 0
+            if claimed < self.batch_size:
+                self._wake.wait(self.interval)
+
+_worker_lock = threading.Lock()
+_worker = None
+
+def start_worker(sinks=None):
+    # One worker per process; safe to call more than once.
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = OutboxWorker(parse_sinks(NOTIFY_SINKS) if sinks is None else sinks).start()
+        return _worker
+
+def stop_worker(timeout=None):
+    global _worker
+    with _worker_lock:
+        worker, _worker = _worker, None
+    if worker is not None:
+        worker.stop(timeout)
+
+def wake_worker():
+    # Called after a commit that enqueued something, so delivery does not
+    # wait for the next poll.
+    worker = _worker
+    if worker is not None:
+        worker.wake()
@@ -0,0 +1,94 @@
+import base64
+import binascii
+import heapq
+import json
+import operator
+import os
+import zlib
+
+# --- Cursors ---
+# List services return a Cursor instead of a list. Nothing is read until a
+# page is asked for, and a page is a heap selection of the next `limit`
+# results after the continuation token (O(n log limit), no full sort), so
+# the cost of sorting, loading and printing a page does not grow with the
+# number of results. Results are ordered by (sort key, record id), and the
+# token records the last position shown: a page is always "the next ones
+# after this", which stays correct while records are added or removed
+# between pages.
+PAGE_SIZE = int(os.environ.get('TMS_PAGE_SIZE', 20))
+MAX_PAGE_SIZE = 1000
+
+class InvalidToken(Exception):
+    pass
+
+class Page:
+    __slots__ = ('items', 'next_token')
+
+    def __init__(self, items, next_token):
+        self.items = items
+        self.next_token = next_token
+
+class Cursor:
+    # source: a zero-argument callable returning the records, called once
+    # per page. sorts: name -> (key function, descending). scope identifies
+    # the query, so a token cannot be replayed against another one.
+    def __init__(self, source, sorts, sort, id_key, scope):
+        if sort not in sorts:
+            raise ValueError(f"Unknown sort key: {sort}. Use one of: {', '.join(sorts)}")
+        self._source = source
+        self._key, self.descending = sorts[sort]
+        self.sort = sort
+        self.sorts = tuple(sorts)
+        self.id_key = id_key
+        self._scope = zlib.crc32(json.dumps([sort, *scope], default=str).encode('utf-8'))
+
+    def _position(self):
+        key, record_id = self._key, operator.attrgetter(self.id_key)
+        return lambda record: (key(record), record_id(record))
+
+    def page(self, limit=PAGE_SIZE, token=None):
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        position = self._position()
+        select = heapq.nlargest if self.descending else heapq.nsmallest
+        if token is None:
+            top = select(limit + 1, self._source(), key=position)
+        else:
+            # Positions are computed once per record and kept for the filter.
+            after = self._decode(token)
+            entries = ((position(r), r) for r in self._source())
+            if self.descending:
+                entries = (e for e in entries if e[0] < after)
+            else:
+                entries = (e for e in entries if e[0] > after)
+            top = [r for _, r in select(limit + 1, entries, key=operator.itemgetter(0))]
+        next_token = self._encode(position(top[limit - 1])) if len(top) > limit else None
+        return Page(top[:limit], next_token)
+
+    def pages(self, limit=PAGE_SIZE):
+        token = None
+        while True:
+            page = self.page(limit, token)
+            yield page
+            if page.next_token is None:
+                return
+            token = page.next_token
+
+    def __iter__(self):
+        # Everything, in order; for callers that need the whole set.
+        return iter(sorted(self._source(), key=self._position(), reverse=self.descending))
+
+    # --- Continuation Tokens ---
+    # Opaque to callers: URL-safe base64 of [scope, sort key, record id].
+    def _encode(self, position):
+        payload = json.dumps([self._scope, *position], ensure_ascii=False, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+    def _decode(self, token):
+        try:
+            payload = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            scope, key, record_id = json.loads(payload.decode('utf-8'))
+        except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+            raise InvalidToken("Malformed continuation token.")
+        if scope != self._scope:
+            raise InvalidToken("The continuation token belongs to a different query.")
+        return key, record_id
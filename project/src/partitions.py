@@ -0,0 +1,224 @@
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from src.indexes import INDEX_SPECS, CollectionIndex
+from src.models import RECORD_TYPES, RequestStatus, RequestType, ThesisStatus, encode
+from src.snapshot import SUFFIX, write_snapshot
+
+# --- Term Partitions ---
+# Requests and theses are grouped by academic term: the year and semester of
+# the thesis course. A course request belongs to the term of its course,
+# a defense request to that of the course request it follows, and a thesis
+# to that of its student's approved course request. Records of open terms
+# (and records whose term is unknown) stay in the hot collection file.
+# Closed terms can be frozen: their records move into read-only binary
+# snapshots under data/archive/<collection>/, one per term:
+#     <term>.tms    the records (src/snapshot.py)
+#     <term>.json   counts per index group and a summary of every indexed
+#                   field
+# A summary lists the distinct values of a field, or holds a Bloom filter
+# of them when there are many. Reads skip every partition whose summaries
+# rule out the query, so pending-request queues, a student's requests or a
+# lookup by a new id only touch the hot file.
+PARTITIONED_FILES = ('requests.json', 'theses.json')
+SUMMARY_MAX_VALUES = 64
+BLOOM_BITS_PER_VALUE = 10
+BLOOM_HASHES = 7
+
+# A term is closed once nothing in it awaits a decision or a grade.
+OPEN_REQUEST_STATUSES = {RequestStatus.PENDING, RequestStatus.DEFENSE_PENDING}
+OPEN_THESIS_STATUSES = {ThesisStatus.DEFENSE_APPROVED}
+
+class ArchivedRecordError(Exception):
+    pass
+
+def term_name(course):
+    return f"{course['year']}-{course['semester']}"
+
+def term_year(term):
+    return int(term.split('-', 1)[0])
+
+# --- Field Summaries ---
+def _summary_key(value):
+    return json.dumps(value, ensure_ascii=False, default=encode)
+
+class BloomFilter:
+    # No false negatives; about 1% false positives at 10 bits per value.
+    def __init__(self, size, bits=None):
+        self.size = size
+        self.bits = bits if bits is not None else bytearray((size + 7) // 8)
+
+    @classmethod
+    def for_values(cls, values):
+        bloom = cls(max(64, len(values) * BLOOM_BITS_PER_VALUE))
+        for value in values:
+            bloom.add(value)
+        return bloom
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(BLOOM_HASHES)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def to_json(self):
+        return {'size': self.size, 'bits': base64.b64encode(self.bits).decode('ascii')}
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data['size'], bytearray(base64.b64decode(data['bits'])))
+
+def summarize(filename, records):
+    spec = INDEX_SPECS[filename]
+    fields = dict.fromkeys([spec['key'], *(field for group in spec['groups'] for field in group)])
+    summaries = {}
+    for field in fields:
+        values = set()
+        for record in records:
+            value = record.get(field)
+            values.update(map(_summary_key, value) if isinstance(value, list) else (_summary_key(value),))
+        if len(values) <= SUMMARY_MAX_VALUES:
+            summaries[field] = {'values': sorted(values)}
+        else:
+            summaries[field] = {'bloom': BloomFilter.for_values(values).to_json()}
+    return summaries
+
+# --- Partition Files ---
+class Partition:
+    # A pending partition was written by a freeze that had not yet removed
+    # its records from the hot file; readers use only those of its records
+    # the hot file no longer has, so the records are seen exactly once
+    # whichever step a crash interrupted.
+    def __init__(self, directory, filename, meta):
+        self.filename = filename
+        self.term = meta['term']
+        self.count = meta['count']
+        self.pending = meta.get('pending', False)
+        self.path = os.path.join(directory, meta['file'])
+        self.meta_path = os.path.join(directory, f"{self.term}.json")
+        self.name = f"archive/{os.path.basename(directory)}/{self.term}"
+        self.counts = _typed_counts(filename, meta.get('counts', ()))
+        self._meta = meta
+        self._summaries = {}
+        for field, summary in meta['fields'].items():
+            if 'values' in summary:
+                self._summaries[field] = frozenset(summary['values'])
+            else:
+                self._summaries[field] = BloomFilter.from_json(summary['bloom'])
+
+    def may_contain(self, field, value):
+        summary = self._summaries.get(field)
+        return summary is None or _summary_key(value) in summary
+
+    def may_match(self, criteria):
+        return all(self.may_contain(field, value) for field, value in criteria.items())
+
+    def activate(self):
+        _write_meta(self.meta_path, {**self._meta, 'pending': False})
+        self.pending = False
+
+def _counts(filename, records):
+    # [[fields, [[value or values, count], ...]], ...] for every index group,
+    # so counts over frozen terms never read their records.
+    index = CollectionIndex.for_collection(filename, records)
+    return [[list(group), [[list(value) if len(group) > 1 else value, count]
+                           for value, count in index.count_by(group).items()]]
+            for group in index.groups]
+
+def _typed_counts(filename, stored):
+    # The stored values converted back as records decode them (enums), so
+    # they add up with the counts of the hot file.
+    record_type = RECORD_TYPES.get(filename)
+    converters = record_type._converters if record_type else {}
+    lists = INDEX_SPECS[filename].get('lists', ())
+    counts = {}
+    for fields, rows in stored:
+        # List fields are counted per element, which their converters do not take.
+        convert = [(field not in lists and converters.get(field)) or (lambda v: v) for field in fields]
+        typed = counts[tuple(fields)] = {}
+        for value, count in rows:
+            if len(fields) == 1:
+                typed[None if value is None else convert[0](value)] = count
+            else:
+                typed[tuple(None if v is None else c(v) for c, v in zip(convert, value))] = count
+    return counts
+
+def _write_meta(path, meta):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, separators=(',', ':'), default=encode)
+    os.replace(tmp_path, path)
+    # Readers notice changes by the directory's mtime, which the file system
+    # may only update once per clock tick; move it forward explicitly.
+    directory = os.path.dirname(path)
+    st = os.stat(directory)
+    os.utime(directory, ns=(st.st_atime_ns, max(time.time_ns(), st.st_mtime_ns + 1)))
+
+def write_partition(directory, filename, term, records):
+    # Written pending; Partition.activate() once the hot file is rewritten.
+    os.makedirs(directory, exist_ok=True)
+    data_name = f"{term}{SUFFIX}"
+    write_snapshot(os.path.join(directory, data_name), filename, records)
+    meta = {'collection': filename, 'term': term, 'file': data_name, 'count': len(records),
+            'counts': _counts(filename, records), 'fields': summarize(filename, records), 'pending': True}
+    _write_meta(os.path.join(directory, f"{term}.json"), meta)
+    return Partition(directory, filename, meta)
+
+def load_partitions(directory, filename):
+    try:
+        names = sorted(os.listdir(directory))
+    except FileNotFoundError:
+        return ()
+    partitions = []
+    for name in names:
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            continue
+        partitions.append(Partition(directory, filename, meta))
+    return tuple(partitions)
+
+# --- Term Assignment ---
+def assign_terms(requests, theses, courses):
+    # -> {filename: {record id: term}} for the records whose term is known.
+    course_terms = {c['course_id']: term_name(c) for c in courses}
+    request_terms, student_terms = {}, {}
+    for request in requests:
+        if request.get('type') == RequestType.COURSE and request.get('course_id') in course_terms:
+            term = request_terms[request['request_id']] = course_terms[request['course_id']]
+            if request.get('status') == RequestStatus.APPROVED:
+                student_terms[request['student_id']] = term
+    for request in requests:
+        if request.get('type') == RequestType.DEFENSE and request.get('course_request_id') in request_terms:
+            request_terms[request['request_id']] = request_terms[request['course_request_id']]
+    thesis_terms = {t['thesis_id']: student_terms[t['student_id']] for t in theses if t.get('student_id') in student_terms}
+    return {'requests.json': request_terms, 'theses.json': thesis_terms}
+
+def term_report(requests, theses, courses):
+    # {term: {'requests': n, 'theses': n, 'open': n}} over the given records.
+    courses = list(courses)
+    terms = {term_name(c): {'requests': 0, 'theses': 0, 'open': 0} for c in courses}
+    assigned = assign_terms(requests, theses, courses)
+    for filename, records, open_statuses in (('requests.json', requests, OPEN_REQUEST_STATUSES),
+                                              ('theses.json', theses, OPEN_THESIS_STATUSES)):
+        key, kind = INDEX_SPECS[filename]['key'], os.path.splitext(filename)[0]
+        for record in records:
+            term = assigned[filename].get(record[key])
+            if term is None:
+                continue
+            terms[term][kind] += 1
+            if record.get('status') in open_statuses:
+                terms[term]['open'] += 1
+    return terms
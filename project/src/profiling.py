@@ -0,0 +1,266 @@
+import atexit
+import collections
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+
+# --- Instrumentation ---
+# Off by default, and then nothing is wrapped, so it costs nothing. Turned on
+# by --profile (main.py, manage.py) or TMS_PROFILE=1, install() replaces the
+# storage I/O helpers, every public function of services and auth, and the
+# CLI views with timing wrappers, and prints a report when the process exits.
+#     TMS_PROFILE_REPORT=profile.json   also write the report as JSON
+#     TMS_PROFILE_CPROFILE=run.prof     cProfile the main thread (pstats format)
+#     TMS_PROFILE_STACKS=run.folded     sample every thread's stack into
+#                                       collapsed stacks for flamegraph.pl,
+#                                       speedscope or inferno
+SAMPLE_INTERVAL = float(os.environ.get('TMS_PROFILE_SAMPLE_MS', 5)) / 1000
+# Latency histogram buckets: bucket i counts calls under 2**i microseconds.
+BUCKETS = 32
+
+class Histogram:
+    __slots__ = ('count', 'total', 'max', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * BUCKETS
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.buckets[min(BUCKETS - 1, int(seconds * 1_000_000).bit_length())] += 1
+
+    def percentile(self, p):
+        # Upper bound of the bucket holding the p-th percentile, in ms.
+        rank = self.count * p / 100
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= rank:
+                return min(2 ** i / 1000, self.max * 1000)
+        return self.max * 1000
+
+    def summary(self):
+        return {
+            'calls': self.count, 'total_ms': round(self.total * 1000, 3),
+            'mean_ms': round(self.total * 1000 / self.count, 3) if self.count else 0.0,
+            'p50_ms': round(self.percentile(50), 3), 'p90_ms': round(self.percentile(90), 3),
+            'p99_ms': round(self.percentile(99), 3), 'max_ms': round(self.max * 1000, 3),
+        }
+
+_lock = threading.Lock()
+_timings = {}
+# operation -> [files, bytes, seconds] for whole-file parses and writes.
+_io = {}
+_state = {'installed': False, 'started': None, 'profiler': None, 'sampler': None}
+
+def record(name, seconds):
+    with _lock:
+        histogram = _timings.get(name)
+        if histogram is None:
+            histogram = _timings[name] = Histogram()
+        histogram.add(seconds)
+
+def record_io(operation, size, seconds):
+    with _lock:
+        totals = _io.setdefault(operation, [0, 0, 0.0])
+        totals[0] += 1
+        totals[1] += size
+        totals[2] += seconds
+
+def timed(name, func):
+    if inspect.isgeneratorfunction(func):
+        # Generators are timed over the whole iteration, not their creation.
+        @functools.wraps(func)
+        def generator(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                yield from func(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start)
+        return generator
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            record(name, time.perf_counter() - start)
+    return wrapper
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+# --- Storage I/O ---
+# Whole-file parses and writes of the JSON backend, with the bytes moved.
+def _wrap_io(database):
+    read_json, write_json, append_journal = (database._read_json_file, database._write_json_file,
+                                             database._append_journal)
+    read_binary, write_binary = database._read_binary_file, database._write_binary_file
+
+    def read_json_file(filepath, filename):
+        start = time.perf_counter()
+        data = read_json(filepath, filename)
+        record_io('parse', _file_size(filepath), time.perf_counter() - start)
+        return data
+
+    def write_json_file(filepath, data):
+        start = time.perf_counter()
+        write_json(filepath, data)
+        record_io('serialize', _file_size(filepath), time.perf_counter() - start)
+
+    def read_binary_file(filepath, filename):
+        start = time.perf_counter()
+        data = read_binary(filepath, filename)
+        record_io('parse', _file_size(filepath), time.perf_counter() - start)
+        return data
+
+    def write_binary_file(filepath, filename, data):
+        start = time.perf_counter()
+        write_binary(filepath, filename, data)
+        record_io('serialize', _file_size(filepath), time.perf_counter() - start)
+
+    def journal_append(filename, records):
+        log_path = database.get_journal_path(filename)
+        before = _file_size(log_path)
+        start = time.perf_counter()
+        append_journal(filename, records)
+        record_io('journal', _file_size(log_path) - before, time.perf_counter() - start)
+
+    return {'_read_json_file': read_json_file, '_write_json_file': write_json_file,
+            '_read_binary_file': read_binary_file, '_write_binary_file': write_binary_file,
+            '_append_journal': journal_append}
+
+def _public_functions(module, predicate=lambda name: not name.startswith('_')):
+    return {name: value for name, value in vars(module).items()
+            if callable(value) and getattr(value, '__module__', None) == module.__name__
+            and not isinstance(value, type) and predicate(name)}
+
+def _patch(module, replacements):
+    # Rebinds the names in the module, and in every loaded src module that
+    # imported the same function with "from ... import".
+    originals = {id(getattr(module, name)): wrapper for name, wrapper in replacements.items()}
+    for name, wrapper in replacements.items():
+        setattr(module, name, wrapper)
+    for loaded in list(sys.modules.values()):
+        if loaded is None or loaded is module or not getattr(loaded, '__name__', '').startswith('src.'):
+            continue
+        for name, value in list(vars(loaded).items()):
+            if id(value) in originals and callable(value):
+                setattr(loaded, name, originals[id(value)])
+
+def install(report_path=None, cprofile_path=None, stacks_path=None):
+    with _lock:
+        if _state['installed']:
+            return
+        _state['installed'] = True
+        _state['started'] = time.perf_counter()
+    from src import auth, cli, database, services
+
+    _patch(database, _wrap_io(database))
+    _patch(database, {name: timed(f"database.{name}", func) for name, func in _public_functions(database).items()
+                      if name in ('load_data', 'save_data', 'put_record', 'put_records', 'find_record',
+                                  'find_records', 'find_records_by_ids', 'count_by')})
+    for module in (services, auth):
+        short = module.__name__.rsplit('.', 1)[1]
+        _patch(module, {name: timed(f"{short}.{name}", func) for name, func in _public_functions(module).items()})
+    _patch(cli, {name: timed(f"cli.{name}", func) for name, func in _public_functions(
+        cli, lambda name: name.endswith(('_view', '_menu'))).items()})
+
+    report_path = report_path or os.environ.get('TMS_PROFILE_REPORT')
+    cprofile_path = cprofile_path or os.environ.get('TMS_PROFILE_CPROFILE')
+    stacks_path = stacks_path or os.environ.get('TMS_PROFILE_STACKS')
+    if cprofile_path:
+        import cProfile
+        _state['profiler'] = cProfile.Profile()
+        _state['profiler'].enable()
+    if stacks_path:
+        _state['sampler'] = StackSampler(SAMPLE_INTERVAL)
+        _state['sampler'].start()
+    atexit.register(_finish, report_path, cprofile_path, stacks_path)
+
+def install_from_env(flag=False):
+    if flag or os.environ.get('TMS_PROFILE', '') not in ('', '0'):
+        install()
+
+# --- Stack Sampling ---
+# A daemon thread that periodically records the stack of every other thread;
+# identical stacks are counted, one "frame;frame;frame count" line each.
+class StackSampler(threading.Thread):
+    def __init__(self, interval):
+        super().__init__(name='profiling-sampler', daemon=True)
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        names = {}
+        while not self.stopped.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for ident, frame in sys._current_frames().items():
+                if ident == self.ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stack.append(names.get(ident, 'thread'))
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def write(self, path):
+        self.stopped.set()
+        self.join()
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+# --- Report ---
+def report():
+    from src import database
+    with _lock:
+        timings = {name: histogram.summary() for name, histogram in _timings.items()}
+        io = {operation: {'files': files, 'bytes': size, 'ms': round(seconds * 1000, 3),
+                          'mb_per_s': round(size / seconds / (1024 * 1024), 1) if seconds else 0.0}
+              for operation, (files, size, seconds) in _io.items()}
+    elapsed = time.perf_counter() - _state['started'] if _state['started'] else 0.0
+    return {'elapsed_s': round(elapsed, 3), 'timings': timings, 'io': io, 'cache': database.cache_stats()}
+
+def print_report(result, out=sys.stderr):
+    print(f"\n--- Profile ({result['elapsed_s']:.2f}s) ---", file=out)
+    print(f"{'function':<45}{'calls':>8}{'total ms':>11}{'mean ms':>10}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}",
+          file=out)
+    for name, row in sorted(result['timings'].items(), key=lambda item: -item[1]['total_ms']):
+        print(f"{name:<45}{row['calls']:>8}{row['total_ms']:>11.1f}{row['mean_ms']:>10.3f}"
+              f"{row['p50_ms']:>9.3f}{row['p99_ms']:>9.3f}{row['max_ms']:>9.1f}", file=out)
+    for operation, row in sorted(result['io'].items()):
+        print(f"{operation}: {row['files']} files, {row['bytes'] / (1024 * 1024):.1f} MB in {row['ms']:.0f} ms "
+              f"({row['mb_per_s']} MB/s)", file=out)
+    cache = result['cache']
+    print(f"cache: {cache['hits']} hits, {cache['misses']} misses ({cache['hit_rate']:.0%}), "
+          f"{cache['evictions']} evictions, {cache['entries']} files held", file=out)
+
+def _finish(report_path, cprofile_path, stacks_path):
+    if _state['profiler'] is not None:
+        _state['profiler'].disable()
+        _state['profiler'].dump_stats(cprofile_path)
+    if _state['sampler'] is not None:
+        _state['sampler'].write(stacks_path)
+    result = report()
+    print_report(result)
+    if report_path:
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
@@ -0,0 +1,449 @@
+import bisect
+import re
+import threading
+import time
+from array import array
+from src import search
+from src.database import get_generation, iter_records
+from src.models import ThesisStatus
+
+# --- Archive Queries ---
+# Compound queries over the defended theses, e.g.
+#     supervisor = prof01 AND keyword contains "ML" AND grade in {A, B}
+#     AND year between 1400 and 1404
+# A query is clauses joined by AND; each clause is one of
+#     field = value            field in {value, value, ...}
+#     field contains words     (every word must occur)
+#     field between low and high, or field <, <=, >, >= value
+# Values with spaces or symbols are quoted. Keywords are case-insensitive,
+# and so are the words of keyword/title/abstract.
+#
+# Every field has an index: posting lists of positions per value, per-record
+# columns that a candidate can be checked against, sorted arrays for ranges,
+# and for titles and abstracts the search module's inverted index. The
+# executor estimates each clause's result size from its index, starts from
+# the smallest, and narrows the candidates with each further clause, either
+# by checking them one by one or, when the clause matches fewer records
+# than there are candidates or cannot be checked, through its postings:
+# intersected as a set, or searched by bisection for a few candidates.
+class QueryError(ValueError):
+    pass
+
+# name -> kind: 'value' (one value per thesis), 'list' (matches any
+# element), 'words' (keywords: whole keywords with =, words with contains),
+# 'text' (search index words), 'range' (ordered values).
+FIELDS = {
+    'supervisor': 'value',
+    'author': 'value',
+    'grade': 'value',
+    'examiner': 'list',
+    'keyword': 'words',
+    'title': 'text',
+    'abstract': 'text',
+    'year': 'range',
+    'date': 'range',
+    'score': 'range',
+}
+ALIASES = {'student': 'author', 'student_id': 'author', 'supervisor_id': 'supervisor', 'examiners': 'examiner',
+           'keywords': 'keyword', 'defense_year': 'year', 'defense_date': 'date'}
+OPERATORS = {
+    'value': ('=', 'in'),
+    'list': ('=', 'in'),
+    'words': ('=', 'in', 'contains'),
+    'text': ('contains',),
+    'range': ('=', 'between', '<', '<=', '>', '>='),
+}
+_ATTRIBUTES = {'supervisor': 'supervisor_id', 'author': 'student_id', 'grade': 'grade', 'examiner': 'examiners'}
+
+# --- Field Values ---
+_DATE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+_MONTH_DAYS = (0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334)
+
+def jalali_year(iso_date):
+    # Solar Hijri year of a Gregorian YYYY-MM-DD date (the calendar of the
+    # course years), by the 33-year cycle arithmetic.
+    gy, gm, gd = int(iso_date[:4]), int(iso_date[5:7]), int(iso_date[8:10])
+    gy2 = gy + 1 if gm > 2 else gy
+    days = (355666 + 365 * gy + (gy2 + 3) // 4 - (gy2 + 99) // 100 + (gy2 + 399) // 400
+            + gd + _MONTH_DAYS[gm - 1])
+    jy = -1595 + 33 * (days // 12053)
+    days %= 12053
+    jy += 4 * (days // 1461)
+    days %= 1461
+    if days > 365:
+        jy += (days - 1) // 365
+    return jy
+
+def _defense_day(thesis):
+    value = (thesis.get('defense_date') or '')[:10]
+    return value if _DATE.match(value) else None
+
+def _range_value(field, thesis, years):
+    if field == 'score':
+        scores = thesis.get('scores')
+        return sum(scores.values()) / len(scores) if scores else None
+    day = _defense_day(thesis)
+    if field == 'date' or day is None:
+        return day
+    if day not in years:
+        years[day] = jalali_year(day)
+    return years[day]
+
+def _keywords(thesis):
+    text = thesis.get('keywords') or ''
+    if isinstance(text, list):
+        text = ', '.join(text)
+    whole = {search.normalize(k).strip() for k in text.split(',')}
+    return {f"={k}" for k in whole if k} | set(search.tokenize(text))
+
+# --- Parsing ---
+_TOKENS = re.compile(r'\s*(?:"([^"]*)"|\'([^\']*)\'|(<=|>=|[=<>{},])|([^\s"\'<>={},]+))')
+
+class Predicate:
+    # low/high bound ranges (None: open); values holds the others' values.
+    def __init__(self, field, op, values=(), low=None, high=None, low_open=False, high_open=False):
+        self.field = field
+        self.kind = FIELDS[field]
+        self.op = op
+        self.values = tuple(values)
+        self.low, self.high = low, high
+        self.low_open, self.high_open = low_open, high_open
+
+    def __str__(self):
+        if self.op == 'between':
+            return f"{self.field} between {_show(self.low)} and {_show(self.high)}"
+        if self.op == 'in':
+            return f"{self.field} in {{{', '.join(map(_show, self.values))}}}"
+        if self.kind == 'range':
+            return f"{self.field} {self.op} {_show(self.low if self.high is None else self.high)}"
+        return f"{self.field} {self.op} {_show(self.values[0])}"
+
+def _show(value):
+    text = str(value)
+    return text if re.fullmatch(r'[\w.-]+', text) else f'"{text}"'
+
+def _tokenize(text):
+    tokens, position = [], 0
+    text = text.strip()
+    while position < len(text):
+        match = _TOKENS.match(text, position)
+        if match is None or match.end() == position:
+            raise QueryError(f"Unexpected character at position {position + 1}: {text[position]!r}")
+        double, single, symbol, word = match.groups()
+        if symbol is not None:
+            tokens.append(('symbol', symbol))
+        elif word is not None:
+            tokens.append(('word', word))
+        else:
+            tokens.append(('quoted', double if double is not None else single))
+        position = match.end()
+    return tokens
+
+def _convert(field, value):
+    if field == 'year':
+        try:
+            return int(value)
+        except ValueError:
+            raise QueryError(f"year needs a whole number, not {value!r}.")
+    if field == 'score':
+        try:
+            return float(value)
+        except ValueError:
+            raise QueryError(f"score needs a number, not {value!r}.")
+    if field == 'date' and not _DATE.match(value):
+        raise QueryError(f"date needs YYYY-MM-DD, not {value!r}.")
+    if FIELDS[field] == 'words':
+        return search.normalize(value).strip()
+    return value
+
+def parse(text):
+    tokens = _tokenize(text)
+    if not tokens:
+        raise QueryError("The query is empty.")
+    position = 0
+
+    def take(description):
+        nonlocal position
+        if position >= len(tokens):
+            raise QueryError(f"Expected {description} at the end of the query.")
+        token = tokens[position]
+        position += 1
+        return token
+
+    def value(field):
+        kind, token = take("a value")
+        if kind == 'symbol':
+            raise QueryError(f"Expected a value for {field}, found {token!r}.")
+        return _convert(field, token)
+
+    def keyword(token, word):
+        return token[0] == 'word' and token[1].lower() == word
+
+    predicates = []
+    while True:
+        kind, name = take("a field name")
+        field = ALIASES.get(name.lower(), name.lower())
+        if kind != 'word' or field not in FIELDS:
+            raise QueryError(f"Unknown field {name!r}. Fields: {', '.join(FIELDS)}.")
+        op = take("an operator")[1].lower()
+        if op not in OPERATORS[FIELDS[field]]:
+            raise QueryError(f"{field} takes {', '.join(OPERATORS[FIELDS[field]])}, not {op!r}.")
+        if op == 'in':
+            if take("'{'") != ('symbol', '{'):
+                raise QueryError(f"Expected '{{' after 'in' for {field}.")
+            values = [value(field)]
+            while True:
+                token = take("',' or '}'")
+                if token == ('symbol', '}'):
+                    break
+                if token != ('symbol', ','):
+                    raise QueryError(f"Expected ',' or '}}' in the values of {field}.")
+                values.append(value(field))
+            predicate = Predicate(field, op, values)
+        elif op == 'between':
+            low = value(field)
+            if not keyword(take("'and'"), 'and'):
+                raise QueryError(f"Expected 'and' in: {field} between {low} and ...")
+            predicate = Predicate(field, op, low=low, high=value(field))
+        elif FIELDS[field] == 'range':
+            bound = value(field)
+            if op == '=':
+                predicate = Predicate(field, op, low=bound, high=bound)
+            elif op in ('<', '<='):
+                predicate = Predicate(field, op, high=bound, high_open=op == '<')
+            else:
+                predicate = Predicate(field, op, low=bound, low_open=op == '>')
+        else:
+            predicate = Predicate(field, op, [value(field)])
+        if op == 'contains' and not any(search.tokenize(v) for v in predicate.values):
+            raise QueryError(f"'{predicate}' has no searchable words.")
+        predicates.append(predicate)
+        if position == len(tokens):
+            return predicates
+        if not keyword(take("'and'"), 'and'):
+            raise QueryError(f"Expected AND between clauses, found {tokens[position - 1][1]!r}.")
+
+# --- Index ---
+class ArchiveIndex:
+    def __init__(self):
+        self.ids = []
+        self.position_of = {}
+        # field -> value -> array of positions, ascending
+        self.postings = {field: {} for field, kind in FIELDS.items() if kind in ('value', 'list', 'words')}
+        # field -> value (or tuple for lists) per position, for checking
+        self.columns = {field: [] for field, kind in FIELDS.items() if kind in ('value', 'list', 'range')}
+        # field -> (sorted values, their positions)
+        self.sorted = {field: ([], array('I')) for field, kind in FIELDS.items() if kind == 'range'}
+        self._years = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, theses):
+        index = cls()
+        for thesis in theses:
+            index._append(thesis)
+        # Built unsorted, then sorted once.
+        for field, (values, positions) in index.sorted.items():
+            order = sorted(range(len(values)), key=values.__getitem__)
+            index.sorted[field] = ([values[i] for i in order], array('I', [positions[i] for i in order]))
+        return index
+
+    def add(self, thesis):
+        if thesis['thesis_id'] in self.position_of:
+            return
+        position = len(self.ids)
+        self._append(thesis, keep_sorted=False)
+        for field, (values, positions) in self.sorted.items():
+            value = self.columns[field][position]
+            if value is not None:
+                at = bisect.bisect_right(values, value)
+                values.insert(at, value)
+                positions.insert(at, position)
+
+    def _append(self, thesis, keep_sorted=True):
+        position = len(self.ids)
+        self.ids.append(thesis['thesis_id'])
+        self.position_of[thesis['thesis_id']] = position
+        for field, attribute in _ATTRIBUTES.items():
+            value = thesis.get(attribute)
+            if FIELDS[field] == 'list':
+                value = tuple(dict.fromkeys(value or ()))
+                for element in value:
+                    self.postings[field].setdefault(element, array('I')).append(position)
+            else:
+                self.postings[field].setdefault(value, array('I')).append(position)
+            self.columns[field].append(value)
+        for word in _keywords(thesis):
+            self.postings['keyword'].setdefault(word, array('I')).append(position)
+        for field, (values, positions) in self.sorted.items():
+            value = _range_value(field, thesis, self._years)
+            self.columns[field].append(value)
+            if value is not None and keep_sorted:
+                values.append(value)
+                positions.append(position)
+
+    # --- Access Paths ---
+    # estimate(p): how many positions p matches (exact except for text,
+    # where it is the rarest word's document count). positions(p): those
+    # positions. check(p): a test for one position, or None where a clause
+    # can only be intersected.
+    def _words(self, predicate):
+        postings = self.postings['keyword']
+        if predicate.op == 'contains':
+            return [[postings.get(w, ()) for w in search.tokenize(v)] for v in predicate.values]
+        return [[postings.get(f"={v}", ())] for v in predicate.values]
+
+    def _range(self, predicate):
+        values = self.sorted[predicate.field][0]
+        low = 0 if predicate.low is None else (
+            bisect.bisect_right if predicate.low_open else bisect.bisect_left)(values, predicate.low)
+        high = len(values) if predicate.high is None else (
+            bisect.bisect_left if predicate.high_open else bisect.bisect_right)(values, predicate.high)
+        return low, max(low, high)
+
+    def estimate(self, predicate, load_theses):
+        if predicate.kind == 'range':
+            low, high = self._range(predicate)
+            return high - low
+        if predicate.kind == 'text':
+            return search.document_frequency(load_theses, ' '.join(predicate.values))
+        if predicate.kind == 'words':
+            return sum(min(map(len, lists)) for lists in self._words(predicate))
+        postings = self.postings[predicate.field]
+        return sum(len(postings.get(v, ())) for v in predicate.values)
+
+    def positions(self, predicate, load_theses):
+        if predicate.kind == 'range':
+            low, high = self._range(predicate)
+            return self.sorted[predicate.field][1][low:high]
+        if predicate.kind == 'text':
+            ids = search.document_ids(load_theses, ' '.join(predicate.values), predicate.field)
+            return [self.position_of[i] for i in ids if i in self.position_of]
+        if predicate.kind == 'words':
+            matched = set()
+            words = self._words(predicate)
+            if len(words) == 1 and len(words[0]) == 1:
+                return words[0][0]
+            for lists in words:
+                lists = sorted(lists, key=len)
+                found = set(lists[0])
+                for other in lists[1:]:
+                    found.intersection_update(other)
+                matched |= found
+            return matched
+        postings = self.postings[predicate.field]
+        if len(predicate.values) == 1:
+            return postings.get(predicate.values[0], ())
+        return set().union(*(postings.get(v, ()) for v in predicate.values))
+
+    def check(self, predicate):
+        if predicate.kind in ('text', 'words'):
+            return None
+        column = self.columns[predicate.field]
+        if predicate.kind == 'range':
+            low, high = predicate.low, predicate.high
+
+            def in_range(position):
+                value = column[position]
+                if value is None:
+                    return False
+                if low is not None and (value <= low if predicate.low_open else value < low):
+                    return False
+                return high is None or (value < high if predicate.high_open else value <= high)
+            return in_range
+        wanted = set(predicate.values)
+        if predicate.kind == 'list':
+            return lambda position: not wanted.isdisjoint(column[position])
+        return lambda position: column[position] in wanted
+
+# --- Execution ---
+class Plan:
+    def __init__(self, query, total):
+        self.query = query
+        self.total = total
+        self.steps = []
+        self.rows = 0
+        self.ms = 0.0
+
+    def format(self):
+        width = max([len(str(p)) for p, *_ in self.steps] + [len('clause')])
+        lines = [f"Plan for: {self.query}",
+                 f"  {'step':<5}{'clause':<{width + 2}}{'access':<11}{'estimated':>10}{'rows':>10}"]
+        for number, (predicate, access, estimate, rows) in enumerate(self.steps, 1):
+            lines.append(f"  {number:<5}{str(predicate):<{width + 2}}{access:<11}{estimate:>10,}{rows:>10,}")
+        lines.append(f"{self.rows:,} of {self.total:,} theses in {self.ms:.2f} ms")
+        return '\n'.join(lines)
+
+    def to_dict(self):
+        return {'query': self.query, 'theses': self.total, 'rows': self.rows, 'ms': round(self.ms, 3),
+                'steps': [{'clause': str(p), 'access': a, 'estimated': e, 'rows': r} for p, a, e, r in self.steps]}
+
+def _in_postings(postings, position):
+    at = bisect.bisect_left(postings, position)
+    return at < len(postings) and postings[at] == position
+
+def execute(index, predicates, load_theses):
+    # -> (thesis ids, Plan)
+    start = time.perf_counter()
+    plan = Plan(' AND '.join(map(str, predicates)), len(index))
+    estimates = [(index.estimate(p, load_theses), i, p) for i, p in enumerate(predicates)]
+    estimates.sort(key=lambda item: item[:2])
+    candidates = None
+    for estimate, _, predicate in estimates:
+        if candidates is None:
+            candidates = index.positions(predicate, load_theses)
+            access = 'range' if predicate.kind == 'range' else 'postings'
+        elif not candidates:
+            access = 'skipped'
+        else:
+            check = index.check(predicate)
+            if check is not None and len(candidates) <= estimate:
+                candidates = [c for c in candidates if check(c)]
+                access = 'check'
+            else:
+                matched = index.positions(predicate, load_theses)
+                if predicate.kind != 'range' and isinstance(matched, array) and len(candidates) * 16 < len(matched):
+                    # Postings are in position order: a few candidates are
+                    # looked up rather than the postings made into a set.
+                    candidates = [c for c in candidates if _in_postings(matched, c)]
+                    access = 'lookup'
+                else:
+                    matched = matched if isinstance(matched, set) else set(matched)
+                    candidates = [c for c in candidates if c in matched]
+                    access = 'intersect'
+        plan.steps.append((predicate, access, estimate, len(candidates)))
+    ids = [index.ids[position] for position in sorted(candidates or ())]
+    plan.rows = len(ids)
+    plan.ms = (time.perf_counter() - start) * 1000
+    return ids, plan
+
+# --- Archive State ---
+# Built from theses.json the first time a query runs and again whenever the
+# file is reloaded; services add theses as their final grade is recorded.
+_lock = threading.Lock()
+_state = {'generation': None, 'index': None}
+
+def _defended_theses():
+    return iter_records('theses.json', status=ThesisStatus.DEFENDED)
+
+def get_index():
+    with _lock:
+        generation = get_generation('theses.json')
+        if _state['index'] is None or _state['generation'] != generation:
+            _state['index'] = ArchiveIndex.build(_defended_theses())
+            _state['generation'] = generation
+        return _state['index']
+
+def index_thesis(thesis):
+    with _lock:
+        if _state['index'] is not None and thesis.get('status') == ThesisStatus.DEFENDED:
+            _state['index'].add(thesis)
+
+def run(text):
+    # -> (thesis ids, Plan); raises QueryError for a malformed query.
+    predicates = parse(text)
+    index = get_index()
+    with _lock:
+        return execute(index, predicates, _defended_theses)
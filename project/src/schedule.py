@@ -0,0 +1,345 @@
+import bisect
+import itertools
+import os
+import threading
+from datetime import date, datetime, timedelta
+from src.database import find_records, get_generation, iter_records
+from src.models import ThesisStatus
+
+# --- Scheduling Settings ---
+# Defenses take one fixed-length session starting at one of SLOT_TIMES on a
+# working day (Saturday to Wednesday). A thesis whose defense_date has no
+# time (entered before scheduling existed) blocks its panel for the whole day.
+SESSION_MINUTES = int(os.environ.get('TMS_DEFENSE_MINUTES', 90))
+SLOT_TIMES = ('09:00', '10:30', '13:00', '14:30', '16:00')
+WORKDAYS = (5, 6, 0, 1, 2)
+# How many already placed defenses a stuck one may try to move aside.
+MAX_MOVES = 20
+
+class IntervalIndex:
+    # Bookings per key (a professor or a room) sorted by start. Any booking
+    # overlapping [start, end) starts after start - longest booking, so one
+    # bisect finds the few that can clash: O(log n) per check.
+    def __init__(self):
+        self._starts = {}
+        self._entries = {}
+        self._longest = {}
+        self._keys = {}
+
+    def add(self, key, start, end, item):
+        starts = self._starts.setdefault(key, [])
+        position = bisect.bisect_right(starts, start)
+        starts.insert(position, start)
+        self._entries.setdefault(key, []).insert(position, (start, end, item))
+        self._longest[key] = max(self._longest.get(key, timedelta(0)), end - start)
+        self._keys.setdefault(item, set()).add(key)
+
+    def remove(self, item):
+        for key in self._keys.pop(item, ()):
+            entries = self._entries[key]
+            for position in reversed(range(len(entries))):
+                if entries[position][2] == item:
+                    del entries[position]
+                    del self._starts[key][position]
+
+    def overlapping(self, key, start, end):
+        starts = self._starts.get(key)
+        if not starts:
+            return []
+        entries = self._entries[key]
+        first = bisect.bisect_right(starts, start - self._longest[key])
+        last = bisect.bisect_left(starts, end)
+        return [item for s, e, item in entries[first:last] if e > start]
+
+def parse_time(value):
+    # 'YYYY-MM-DD HH:MM' or 'YYYY-MM-DDTHH:MM'; None if it is not a full time.
+    try:
+        return datetime.fromisoformat(value) if value and len(value) > 10 else None
+    except ValueError:
+        return None
+
+def booking_interval(thesis):
+    start = parse_time(thesis.get('defense_time'))
+    if start is not None:
+        return start, start + timedelta(minutes=SESSION_MINUTES)
+    try:
+        day = date.fromisoformat((thesis.get('defense_date') or '')[:10])
+    except ValueError:
+        return None
+    start = datetime.combine(day, datetime.min.time())
+    return start, start + timedelta(days=1)
+
+def panel(thesis):
+    return [thesis['supervisor_id'], *(thesis.get('examiners') or ())]
+
+def _book(index, thesis):
+    interval = booking_interval(thesis)
+    if interval is None:
+        return
+    item = ('thesis', thesis['thesis_id'])
+    for professor_id in dict.fromkeys(panel(thesis)):
+        index.add(('professor', professor_id), *interval, item)
+    if thesis.get('room_id'):
+        index.add(('room', thesis['room_id']), *interval, item)
+
+def _build_index(theses, availability, skip=()):
+    index = IntervalIndex()
+    for thesis in theses:
+        if thesis['thesis_id'] not in skip:
+            _book(index, thesis)
+    for entry in availability:
+        for start, end in entry.get('unavailable') or ():
+            index.add(('professor', entry['professor_id']), datetime.fromisoformat(start),
+                      datetime.fromisoformat(end), ('unavailable', entry['professor_id']))
+    return index
+
+def _upcoming():
+    return find_records('theses.json', status=ThesisStatus.DEFENSE_APPROVED)
+
+# --- Conflict Checks ---
+# The index over upcoming defenses and availability is rebuilt only when
+# either collection is reloaded, so a manual check costs a few bisects.
+# Bookings made by this process are added with index_defenses.
+_lock = threading.Lock()
+_state = {'generation': None, 'index': None}
+
+def get_index():
+    with _lock:
+        generation = (get_generation('theses.json'), get_generation('availability.json'))
+        if _state['generation'] != generation:
+            _state['index'] = _build_index(_upcoming(), iter_records('availability.json'))
+            _state['generation'] = generation
+        return _state['index']
+
+def index_defenses(theses):
+    with _lock:
+        index = _state['index']
+        if index is None:
+            return
+        for thesis in theses:
+            index.remove(('thesis', thesis['thesis_id']))
+            if thesis.get('status') == ThesisStatus.DEFENSE_APPROVED:
+                _book(index, thesis)
+
+def find_conflicts(start, professor_ids, room_id=None, exclude=(), bookings=()):
+    # Returns a message per clash with another defense or unavailability.
+    # bookings are defenses checked as well as the index: the ones a
+    # transaction read, which the index may not have seen yet if another
+    # process or thread booked them. Theses in exclude are ignored.
+    end = start + timedelta(minutes=SESSION_MINUTES)
+    indexes = [get_index()]
+    if bookings:
+        indexes.append(_build_index(bookings, ()))
+    conflicts = []
+    for index in indexes:
+        for professor_id in dict.fromkeys(professor_ids):
+            for kind, item_id in index.overlapping(('professor', professor_id), start, end):
+                if kind == 'unavailable':
+                    conflicts.append(f"{professor_id} is not available at that time.")
+                elif item_id not in exclude:
+                    conflicts.append(f"{professor_id} already has the defense of thesis {item_id} at that time.")
+        if room_id:
+            for _, item_id in index.overlapping(('room', room_id), start, end):
+                if item_id not in exclude:
+                    conflicts.append(f"Room {room_id} is taken by the defense of thesis {item_id}.")
+    return list(dict.fromkeys(conflicts))
+
+# --- Timetable Solver ---
+# Defenses sharing a professor may not share a slot, so slots are colors of
+# the conflict graph. DSatur colors the defense with the most distinct slots
+# already blocked by its neighbours first and gives it the earliest slot its
+# whole panel is free in (no clash with fixed bookings or unavailability) and
+# a room is left. A defense with no such slot tries to move one neighbour
+# out of the way before it is reported as unscheduled. Defenses whose date
+# was already agreed only get slots on that day.
+def day_slots(day):
+    return [datetime.combine(day, datetime.strptime(t, '%H:%M').time()) for t in SLOT_TIMES]
+
+def slot_starts(first_day, days):
+    slots = []
+    for offset in range(days):
+        day = first_day + timedelta(days=offset)
+        if day.weekday() in WORKDAYS:
+            slots.extend(day_slots(day))
+    return slots
+
+def _agreed_day(thesis):
+    try:
+        return date.fromisoformat((thesis.get('defense_date') or '')[:10])
+    except ValueError:
+        return None
+
+class _Timetable:
+    def __init__(self, theses, slots, allowed, usable, rooms, fixed):
+        self.panels = {t['thesis_id']: panel(t) for t in theses}
+        self.slots = slots
+        self.allowed = allowed
+        self.usable = usable
+        self.rooms = rooms
+        self.fixed = fixed
+        self.length = timedelta(minutes=SESSION_MINUTES)
+        self.slot_of = {}
+        self.room_of = {}
+        self.busy = {}
+        self.rooms_used = {}
+        self._fixed_free = {}
+        self._open_rooms = {}
+        self._scan_from = {}
+        self.neighbours = {}
+        by_professor = {}
+        for thesis_id, members in self.panels.items():
+            for professor_id in members:
+                by_professor.setdefault(professor_id, []).append(thesis_id)
+        for thesis_id, members in self.panels.items():
+            self.neighbours[thesis_id] = {n for p in members for n in by_professor[p]} - {thesis_id}
+
+    def _professor_free(self, professor_id, slot):
+        key = (professor_id, slot)
+        free = self._fixed_free.get(key)
+        if free is None:
+            start = self.slots[slot]
+            free = self._fixed_free[key] = not self.fixed.overlapping(('professor', professor_id), start,
+                                                                      start + self.length)
+        return free and slot not in self.busy.get(professor_id, ())
+
+    def _free_room(self, slot):
+        open_rooms = self._open_rooms.get(slot)
+        if open_rooms is None:
+            start = self.slots[slot]
+            open_rooms = self._open_rooms[slot] = [
+                r for r in self.rooms if not self.fixed.overlapping(('room', r), start, start + self.length)]
+        used = self.rooms_used.get(slot, ())
+        if len(used) < len(open_rooms):
+            for room_id in open_rooms:
+                if room_id not in used:
+                    return room_id
+        return None
+
+    def feasible(self, thesis_id, slot):
+        room_id = self._free_room(slot)
+        if room_id is None or not all(self._professor_free(p, slot) for p in self.panels[thesis_id]):
+            return None
+        return room_id
+
+    def place(self, thesis_id, slot, room_id):
+        self.slot_of[thesis_id] = slot
+        self.room_of[thesis_id] = room_id
+        self.rooms_used.setdefault(slot, set()).add(room_id)
+        for professor_id in self.panels[thesis_id]:
+            self.busy.setdefault(professor_id, set()).add(slot)
+
+    def unplace(self, thesis_id):
+        slot = self.slot_of.pop(thesis_id)
+        self._scan_from.clear()
+        self.rooms_used[slot].discard(self.room_of.pop(thesis_id))
+        for professor_id in self.panels[thesis_id]:
+            self.busy[professor_id].discard(slot)
+        return slot
+
+    def rooms_left(self, thesis_id):
+        return any(self._free_room(slot) is not None for slot in self.allowed[thesis_id])
+
+    def first_slot(self, thesis_id):
+        # Slots fill up front to back, so every slot list remembers how far
+        # its leading run of full slots reaches.
+        slots = self.allowed[thesis_id]
+        start = self._scan_from.get(id(slots), 0)
+        while start < len(slots) and self._free_room(slots[start]) is None:
+            start += 1
+        self._scan_from[id(slots)] = start
+        for slot in itertools.islice(slots, start, None):
+            room_id = self.feasible(thesis_id, slot)
+            if room_id is not None:
+                return slot, room_id
+        return None
+
+    def move_aside(self, thesis_id):
+        # Try slots blocked only by one placed neighbour that fits elsewhere.
+        if not self.rooms_left(thesis_id):
+            return False
+        tried = 0
+        usable = self.usable[thesis_id]
+        placed = [n for n in self.neighbours[thesis_id] if self.slot_of.get(n) in usable]
+        for neighbour in sorted(placed, key=self.slot_of.get):
+            if tried == MAX_MOVES:
+                break
+            tried += 1
+            old_room = self.room_of[neighbour]
+            old_slot = self.unplace(neighbour)
+            room_id = self.feasible(thesis_id, old_slot)
+            if room_id is not None:
+                self.place(thesis_id, old_slot, room_id)
+                target = self.first_slot(neighbour)
+                if target is not None:
+                    self.place(neighbour, *target)
+                    return True
+                self.unplace(thesis_id)
+            self.place(neighbour, old_slot, old_room)
+        return False
+
+def propose_timetable(theses, first_day, days, rooms, fixed, keep_days=True):
+    # theses: defenses to place; fixed: IntervalIndex of everything else.
+    # Returns {'sessions': [(thesis_id, start, room_id)], 'unscheduled': [(thesis_id, reason)]}.
+    window = slot_starts(first_day, days)
+    agreed = {t['thesis_id']: _agreed_day(t) if keep_days else None for t in theses}
+    starts = set(window)
+    for day in set(agreed.values()) - {None}:
+        starts.update(day_slots(day))
+    slots = sorted(starts)
+    position = {start: slot for slot, start in enumerate(slots)}
+    by_day = {day: [position[start] for start in day_slots(day)] for day in set(agreed.values()) - {None}}
+    by_day[None] = [position[start] for start in window]
+    allowed = {thesis_id: by_day[day] for thesis_id, day in agreed.items()}
+    usable_by_day = {day: frozenset(day_ids) for day, day_ids in by_day.items()}
+    usable = {thesis_id: usable_by_day[day] for thesis_id, day in agreed.items()}
+    table = _Timetable(theses, slots, allowed, usable, rooms, fixed)
+    # Bucket queue on saturation. Buckets are dicts used as ordered sets and
+    # filled in rising degree, so popitem() takes the busiest defense first.
+    order = sorted(table.panels, key=lambda t: (len(table.neighbours[t]), t))
+    saturation = {thesis_id: set() for thesis_id in order}
+    buckets = {0: dict.fromkeys(order)}
+    top = 0
+    unscheduled = []
+    done = set()
+    while True:
+        while top > 0 and not buckets.get(top):
+            top -= 1
+        if not buckets.get(top):
+            break
+        thesis_id, _ = buckets[top].popitem()
+        done.add(thesis_id)
+        target = table.first_slot(thesis_id)
+        if target is not None:
+            table.place(thesis_id, *target)
+        elif not (rooms and table.move_aside(thesis_id)):
+            unscheduled.append(thesis_id)
+            continue
+        slot = table.slot_of[thesis_id]
+        for neighbour in table.neighbours[thesis_id]:
+            seen = saturation[neighbour]
+            if neighbour not in done and slot in usable[neighbour] and slot not in seen:
+                del buckets[len(seen)][neighbour]
+                seen.add(slot)
+                buckets.setdefault(len(seen), {})[neighbour] = None
+                top = max(top, len(seen))
+    def reason(thesis_id):
+        if not rooms:
+            return "No rooms are defined."
+        if agreed[thesis_id]:
+            return f"No free slot for the whole panel on {agreed[thesis_id].isoformat()}."
+        return "No free slot for the whole panel in the scheduling window."
+    return {
+        'sessions': sorted(((t, slots[s], table.room_of[t]) for t, s in table.slot_of.items()),
+                           key=lambda session: (session[1], session[2])),
+        'unscheduled': [(thesis_id, reason(thesis_id)) for thesis_id in sorted(unscheduled)],
+    }
+
+def plan_schedule(first_day, days, reschedule=False):
+    # Places every upcoming defense without a time around the ones that keep
+    # theirs. reschedule places all of them again, inside the window.
+    upcoming = _upcoming()
+    pending = [t for t in upcoming if reschedule or parse_time(t.get('defense_time')) is None]
+    pending_ids = {t['thesis_id'] for t in pending}
+    fixed = _build_index(upcoming, iter_records('availability.json'), skip=pending_ids)
+    rooms = sorted(r['room_id'] for r in iter_records('rooms.json'))
+    return propose_timetable(pending, first_day, days, rooms, fixed, keep_days=not reschedule)
@@ -0,0 +1,331 @@
+import bisect
+import heapq
+import json
+import math
+import os
+import re
+import threading
+import unicodedata
+from src.database import get_file_path, get_generation
+
+INDEX_FILE = 'search_index.json'
+LOG_COMPACT_THRESHOLD = int(os.environ.get('TMS_SEARCH_LOG_THRESHOLD', 500))
+
+# --- Ranking Settings ---
+FIELDS = ('title', 'abstract', 'keywords')
+FIELD_WEIGHTS = {'title': 3.0, 'abstract': 1.0, 'keywords': 2.0}
+BM25_K1 = 1.2
+BM25_B = 0.75
+PREFIX_MATCH_WEIGHT = 0.5
+
+# --- Text Normalization ---
+_CHAR_MAP = str.maketrans({
+    'ي': 'ی', 'ى': 'ی', 'ئ': 'ی', 'ك': 'ک', 'ة': 'ه', 'ۀ': 'ه',
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا', 'ؤ': 'و',
+    '\u200c': '', '\u200d': '', '\u0640': '',
+    **{chr(0x06F0 + i): str(i) for i in range(10)},
+    **{chr(0x0660 + i): str(i) for i in range(10)},
+})
+_DIACRITICS = re.compile('[\u064b-\u065f\u0670\u06d6-\u06ed]')
+_TOKEN = re.compile(r'\w+')
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'by', 'for', 'from', 'in', 'into', 'is',
+    'of', 'on', 'or', 'the', 'this', 'to', 'with',
+    'و', 'در', 'به', 'از', 'که', 'را', 'با', 'این', 'آن', 'برای', 'یک', 'است',
+}
+
+def normalize(text):
+    text = unicodedata.normalize('NFKC', text or '').casefold()
+    text = _DIACRITICS.sub('', text.translate(_CHAR_MAP))
+    return text
+
+def tokenize(text):
+    return [t for t in _TOKEN.findall(normalize(text)) if t not in STOPWORDS]
+
+def _field_text(thesis, field):
+    value = thesis.get(field) or ''
+    if isinstance(value, list):
+        value = ' '.join(value)
+    return value
+
+def analyze(thesis):
+    terms = {}
+    for position, field in enumerate(FIELDS):
+        for token in tokenize(_field_text(thesis, field)):
+            terms.setdefault(token, [0, 0, 0])[position] += 1
+    return terms
+
+# --- Inverted Index ---
+class InvertedIndex:
+    def __init__(self):
+        self.postings = {}
+        self.doc_lengths = {}
+        self.doc_terms = {}
+        self.sorted_terms = []
+        self.total_lengths = [0, 0, 0]
+
+    def add(self, doc_id, terms):
+        self.remove(doc_id)
+        lengths = [0, 0, 0]
+        for term, counts in terms.items():
+            bucket = self.postings.get(term)
+            if bucket is None:
+                bucket = self.postings[term] = {}
+                bisect.insort(self.sorted_terms, term)
+            bucket[doc_id] = counts
+            for i in range(3):
+                lengths[i] += counts[i]
+        self.doc_lengths[doc_id] = lengths
+        self.doc_terms[doc_id] = list(terms)
+        for i in range(3):
+            self.total_lengths[i] += lengths[i]
+
+    def remove(self, doc_id):
+        lengths = self.doc_lengths.pop(doc_id, None)
+        if lengths is None:
+            return
+        for term in self.doc_terms.pop(doc_id, ()):
+            bucket = self.postings.get(term)
+            if bucket is None:
+                continue
+            bucket.pop(doc_id, None)
+            if not bucket:
+                del self.postings[term]
+                position = bisect.bisect_left(self.sorted_terms, term)
+                if position < len(self.sorted_terms) and self.sorted_terms[position] == term:
+                    del self.sorted_terms[position]
+        for i in range(3):
+            self.total_lengths[i] -= lengths[i]
+
+    def expand(self, token):
+        matches = [(token, 1.0)] if token in self.postings else []
+        position = bisect.bisect_right(self.sorted_terms, token)
+        while position < len(self.sorted_terms) and self.sorted_terms[position].startswith(token):
+            matches.append((self.sorted_terms[position], PREFIX_MATCH_WEIGHT))
+            position += 1
+        return matches
+
+    def search(self, query, fields=FIELDS, limit=None):
+        tokens = tokenize(query)
+        if not tokens or not self.doc_lengths:
+            return []
+        weights = [FIELD_WEIGHTS[f] if f in fields else 0.0 for f in FIELDS]
+        doc_count = len(self.doc_lengths)
+        average_length = sum(w * t for w, t in zip(weights, self.total_lengths)) / doc_count or 1.0
+
+        scores = None
+        for token in tokens:
+            token_scores = {}
+            for term, match_weight in self.expand(token):
+                bucket = self.postings[term]
+                idf = math.log(1 + (doc_count - len(bucket) + 0.5) / (len(bucket) + 0.5))
+                for doc_id, counts in bucket.items():
+                    tf = sum(w * c for w, c in zip(weights, counts))
+                    if tf == 0:
+                        continue
+                    length = sum(w * l for w, l in zip(weights, self.doc_lengths[doc_id]))
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+                    score = match_weight * idf * tf * (BM25_K1 + 1) / (tf + norm)
+                    token_scores[doc_id] = max(token_scores.get(doc_id, 0.0), score)
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {d: s + token_scores[d] for d, s in scores.items() if d in token_scores}
+            if not scores:
+                return []
+        if limit:
+            return heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+    def to_json(self):
+        return {'version': 1, 'postings': self.postings, 'doc_lengths': self.doc_lengths}
+
+    @classmethod
+    def from_json(cls, payload):
+        index = cls()
+        index.postings = payload.get('postings', {})
+        index.doc_lengths = payload.get('doc_lengths', {})
+        index.sorted_terms = sorted(index.postings)
+        doc_terms = {doc_id: [] for doc_id in index.doc_lengths}
+        for term, bucket in index.postings.items():
+            for doc_id in bucket:
+                doc_terms.setdefault(doc_id, []).append(term)
+        index.doc_terms = doc_terms
+        for lengths in index.doc_lengths.values():
+            for i in range(3):
+                index.total_lengths[i] += lengths[i]
+        return index
+
+# --- Persistence ---
+# The snapshot holds the inverted index; documents indexed since the last
+# compaction are appended to "<snapshot>.log" as {doc_id, terms} lines.
+# Replaying an entry twice is harmless, so compaction needs no coordination.
+_lock = threading.RLock()
+_state = {'index': None, 'snapshot': None, 'offset': 0, 'log_entries': 0, 'theses_generation': None}
+
+def _snapshot_path():
+    return get_file_path(INDEX_FILE)
+
+def _log_path():
+    return _snapshot_path() + '.log'
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+def _load():
+    snapshot = _stat(_snapshot_path())
+    index = InvertedIndex()
+    if snapshot is not None:
+        try:
+            with open(_snapshot_path(), 'r', encoding='utf-8') as f:
+                index = InvertedIndex.from_json(json.load(f))
+        except json.JSONDecodeError:
+            index = InvertedIndex()
+    _state.update(index=index, snapshot=snapshot, offset=0, log_entries=0, theses_generation=None)
+    _replay_log()
+
+def _replay_log():
+    try:
+        f = open(_log_path(), 'rb')
+    except FileNotFoundError:
+        _state['offset'] = 0
+        return
+    with f:
+        f.seek(_state['offset'])
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            _state['offset'] += len(line)
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry.get('terms') is None:
+                _state['index'].remove(entry['doc_id'])
+            else:
+                _state['index'].add(entry['doc_id'], entry['terms'])
+            _state['log_entries'] += 1
+
+def _append_log(entries):
+    payload = b''.join(
+        json.dumps(entry, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+        for entry in entries
+    )
+    with open(_log_path(), 'ab') as f:
+        f.write(payload)
+    _state['offset'] += len(payload)
+    _state['log_entries'] += len(entries)
+    if _state['log_entries'] >= LOG_COMPACT_THRESHOLD:
+        compact()
+
+def compact():
+    with _lock:
+        index = get_index()
+        tmp_path = f"{_snapshot_path()}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index.to_json(), f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, _snapshot_path())
+        open(_log_path(), 'wb').close()
+        _state.update(snapshot=_stat(_snapshot_path()), offset=0, log_entries=0)
+
+def get_index():
+    with _lock:
+        if _state['index'] is None or _stat(_snapshot_path()) != _state['snapshot']:
+            _load()
+        else:
+            log = _stat(_log_path())
+            log_size = 0 if log is None else log[1]
+            if log_size < _state['offset']:
+                _load()
+            elif log_size > _state['offset']:
+                _replay_log()
+        return _state['index']
+
+# --- Public API ---
+def index_theses(theses):
+    with _lock:
+        index = get_index()
+        entries = []
+        for thesis in theses:
+            terms = analyze(thesis)
+            index.add(thesis['thesis_id'], terms)
+            entries.append({'doc_id': thesis['thesis_id'], 'terms': terms})
+        if entries:
+            _append_log(entries)
+
+def index_thesis(thesis):
+    index_theses([thesis])
+
+SYNC_BATCH_SIZE = 1000
+
+def sync(load_theses):
+    # load_theses returns (or yields) the archive's defended theses. It is
+    # only called when theses.json was reloaded from disk since the last
+    # check, and is consumed as a stream: only ids and the current batch of
+    # unindexed theses are held in memory.
+    with _lock:
+        index = get_index()
+        generation = get_generation('theses.json')
+        if _state['theses_generation'] == generation:
+            return index
+        wanted = set()
+        missing = []
+        for thesis in load_theses():
+            wanted.add(thesis['thesis_id'])
+            if thesis['thesis_id'] not in index.doc_lengths:
+                missing.append(thesis)
+                if len(missing) >= SYNC_BATCH_SIZE:
+                    index_theses(missing)
+                    missing = []
+        if missing:
+            index_theses(missing)
+        stale = [doc_id for doc_id in index.doc_lengths if doc_id not in wanted]
+        if stale:
+            for doc_id in stale:
+                index.remove(doc_id)
+            _append_log([{'doc_id': doc_id, 'terms': None} for doc_id in stale])
+        _state['theses_generation'] = generation
+        return index
+
+def query(load_theses, text, fields=FIELDS, limit=None):
+    # sync() and the search run under one lock so that concurrent threads
+    # never see the index half-way through an update.
+    with _lock:
+        return sync(load_theses).search(text, fields, limit)
+
+def document_frequency(load_theses, text):
+    # Theses holding the rarest word of text in any field: an upper bound
+    # on document_ids() for the query planner.
+    with _lock:
+        postings = sync(load_theses).postings
+        return min((len(postings.get(token, ())) for token in tokenize(text)), default=0)
+
+def document_ids(load_theses, text, field):
+    # Ids of the theses whose field holds every word of text (whole words,
+    # no prefixes), for the query engine's contains clauses.
+    position = FIELDS.index(field)
+    with _lock:
+        postings = sync(load_theses).postings
+        found = None
+        for token in sorted(tokenize(text), key=lambda t: len(postings.get(t, ()))):
+            bucket = postings.get(token, {})
+            if found is None:
+                found = {doc_id for doc_id, counts in bucket.items() if counts[position]}
+            else:
+                found = {doc_id for doc_id in found if doc_id in bucket and bucket[doc_id][position]}
+            if not found:
+                break
+        return found or set()
+
+def rebuild(theses):
+    with _lock:
+        index = InvertedIndex()
+        for thesis in theses:
+            index.add(thesis['thesis_id'], analyze(thesis))
+        _state.update(index=index, offset=0, log_entries=0)
+        compact()
+        return index
@@ -0,0 +1,430 @@
+import asyncio
+import json
+import os
+import secrets
+import signal
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+from src import attachments, auth, notifications, services
+from src.pagination import PAGE_SIZE, InvalidToken
+from src.models import encode
+
+SESSION_TTL = int(os.environ.get('TMS_SESSION_TTL', 8 * 3600))
+MAX_BODY_BYTES = 1024 * 1024
+LATENCY_SAMPLES = 10_000
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+REASONS = {200: 'OK', 400: 'Bad Request', 401: 'Unauthorized', 403: 'Forbidden',
+           404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+           500: 'Internal Server Error'}
+
+class FileResponse:
+    # Returned by a handler to send a stored attachment as the response body.
+    def __init__(self, digest):
+        self.digest = digest
+        self.size = attachments.blob_size(digest)
+        self.content_type = attachments.content_type(digest)
+
+# --- Sessions ---
+# A token stands in for the cli.py globals: each request carries
+# "Authorization: Bearer <token>" and gets the user it was issued to.
+class SessionStore:
+    def __init__(self, ttl=SESSION_TTL):
+        self.ttl = ttl
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def create(self, user_type, user):
+        token = secrets.token_urlsafe(24)
+        with self._lock:
+            self._sessions[token] = {'user_type': user_type, 'user_id': user['user_id'],
+                                     'name': user['name'], 'expires': time.time() + self.ttl}
+        return token
+
+    def get(self, token):
+        with self._lock:
+            session = self._sessions.get(token)
+            if session is None:
+                return None
+            if session['expires'] < time.time():
+                del self._sessions[token]
+                return None
+            return session
+
+    def delete(self, token):
+        with self._lock:
+            self._sessions.pop(token, None)
+
+# --- Latency Statistics ---
+class LatencyStats:
+    def __init__(self, samples=LATENCY_SAMPLES):
+        self._samples = {}
+        self._counts = {}
+        self._size = samples
+        self._lock = threading.Lock()
+
+    def record(self, route, seconds):
+        with self._lock:
+            self._samples.setdefault(route, deque(maxlen=self._size)).append(seconds * 1000)
+            self._counts[route] = self._counts.get(route, 0) + 1
+
+    def report(self):
+        with self._lock:
+            snapshot = {route: sorted(samples) for route, samples in self._samples.items()}
+            counts = dict(self._counts)
+        return {route: {'count': counts[route], **percentiles(samples)} for route, samples in snapshot.items()}
+
+def percentiles(sorted_ms, points=(50, 90, 99)):
+    if not sorted_ms:
+        return {}
+    result = {f'p{p}_ms': round(sorted_ms[min(len(sorted_ms) - 1, len(sorted_ms) * p // 100)], 3) for p in points}
+    result['max_ms'] = round(sorted_ms[-1], 3)
+    return result
+
+# --- Handlers ---
+# Each handler gets (session, params) and runs in the thread pool, since the
+# services block on file or database I/O. params merges the query string and
+# the JSON body.
+def _require(params, *names):
+    missing = [name for name in names if params.get(name) in (None, '')]
+    if missing:
+        raise HttpError(400, f"Missing field(s): {', '.join(missing)}")
+    return [params[name] for name in names]
+
+def _page(name, params, fetch):
+    # List routes take sort, limit and cursor (the next_cursor of the
+    # previous page) and return one page at a time.
+    try:
+        cursor = fetch(params['sort']) if params.get('sort') else fetch()
+    except ValueError as e:
+        raise HttpError(400, str(e))
+    try:
+        page = cursor.page(params.get('limit') or PAGE_SIZE, params.get('cursor') or None)
+    except InvalidToken as e:
+        raise HttpError(400, str(e))
+    except (TypeError, ValueError):
+        raise HttpError(400, "limit must be an integer")
+    return {name: page.items, 'next_cursor': page.next_token}
+
+def _result(outcome):
+    success, message = outcome
+    return {'success': success, 'message': message}
+
+def _batch_result(outcome):
+    success, results = outcome
+    if not success:
+        return {'success': False, 'message': results}
+    return {'success': True, 'results': [{'id': item_id, 'success': ok, 'message': message}
+                                         for item_id, ok, message in results]}
+
+def handle_courses(session, params):
+    return {'courses': services.get_available_courses()}
+
+def handle_submit_course_request(session, params):
+    course_id, = _require(params, 'course_id')
+    return _result(services.submit_thesis_request(session['user_id'], course_id))
+
+def handle_student_requests(session, params):
+    return _page('requests', params, lambda *sort: services.get_student_request_status(session['user_id'], *sort))
+
+def handle_submit_defense_request(session, params):
+    # pdf_path and image_path name files in the server's upload directory;
+    # any other path is recorded but not stored.
+    fields = _require(params, 'title', 'abstract', 'keywords')
+    return _result(services.submit_defense_request(
+        session['user_id'], *fields, str(params.get('pdf_path') or ''), str(params.get('image_path') or '')))
+
+def handle_supervision_requests(session, params):
+    return _page('requests', params, lambda *sort: services.get_supervision_requests(session['user_id'], *sort))
+
+def handle_process_supervision(session, params):
+    action, = _require(params, 'action')
+    if action not in ('approve', 'reject'):
+        raise HttpError(400, "action must be 'approve' or 'reject'")
+    if isinstance(params.get('request_ids'), list):
+        return _batch_result(services.process_supervision_requests(session['user_id'], params['request_ids'], action))
+    request_id, = _require(params, 'request_id')
+    return _result(services.process_supervision_request(session['user_id'], request_id, action))
+
+def handle_defense_requests(session, params):
+    return _page('requests', params, lambda *sort: services.get_defense_requests(session['user_id'], *sort))
+
+def handle_process_defense(session, params):
+    fields = _require(params, 'request_id', 'defense_date', 'internal_examiner_id', 'external_examiner_id')
+    return _result(services.process_defense_request(session['user_id'], *fields,
+                                                    params.get('defense_time'), params.get('room_id')))
+
+def handle_assigned_defenses(session, params):
+    return _page('theses', params, lambda *sort: services.get_assigned_defenses(session['user_id'], *sort))
+
+def handle_submit_grade(session, params):
+    if isinstance(params.get('grades'), list):
+        try:
+            grades = [(g['thesis_id'], g['score']) for g in params['grades']]
+        except (KeyError, TypeError):
+            raise HttpError(400, "grades must be a list of {thesis_id, score}")
+        return _batch_result(services.submit_grades(session['user_id'], grades))
+    thesis_id, score = _require(params, 'thesis_id', 'score')
+    if not isinstance(score, int) or not 0 <= score <= 100:
+        raise HttpError(400, "score must be an integer between 0 and 100")
+    return _result(services.submit_grade(thesis_id, session['user_id'], score))
+
+def handle_search(session, params):
+    query, by = _require(params, 'q', 'by')
+    if by not in ('title', 'author', 'supervisor', 'keywords', 'abstract', 'all'):
+        raise HttpError(400, f"Unknown search field: {by}")
+    return _page('results', params, lambda *sort: services.search_theses(query, by, *sort))
+
+def handle_query(session, params):
+    text, = _require(params, 'q')
+    if params.get('explain'):
+        try:
+            return {'plan': services.explain_query(text).to_dict()}
+        except ValueError as e:
+            raise HttpError(400, str(e))
+    return _page('results', params, lambda *sort: services.query_theses(text, *sort))
+
+def handle_attachment(session, params):
+    digest, = _require(params, 'sha256')
+    if not attachments.is_digest(digest):
+        raise HttpError(400, "sha256 must be a hex SHA-256 digest")
+    try:
+        return FileResponse(digest)
+    except (attachments.AttachmentError, OSError):
+        raise HttpError(404, f"No attachment {digest}")
+
+NOTIFICATION_FIELDS = ('notification_id', 'event', 'subject_id', 'message', 'created_at', 'read')
+
+def handle_notifications(session, params):
+    # Delivery state (sinks, errors) is for operators, not the recipient.
+    page = _page('notifications', params, lambda *sort: services.get_notifications(session['user_id'], *sort))
+    page['notifications'] = [{field: n.get(field) for field in NOTIFICATION_FIELDS} for n in page['notifications']]
+    return {**page, 'unread': services.get_unread_count(session['user_id'])}
+
+def handle_read_notifications(session, params):
+    ids = params.get('notification_ids')
+    if ids is not None and not isinstance(ids, list):
+        raise HttpError(400, "notification_ids must be a list")
+    success, marked = services.mark_notifications_read(session['user_id'], None if ids is None else set(ids))
+    return {'success': success, 'marked': marked}
+
+def handle_change_password(session, params):
+    new_password, = _require(params, 'new_password')
+    return {'success': bool(auth.change_password_in_db(session['user_type'], session['user_id'], new_password))}
+
+# (method, path) -> (handler, required user type: None = public, '' = any user)
+ROUTES = {
+    ('GET', '/courses'): (handle_courses, None),
+    ('GET', '/search'): (handle_search, None),
+    ('GET', '/query'): (handle_query, None),
+    ('GET', '/attachments'): (handle_attachment, ''),
+    ('POST', '/password'): (handle_change_password, ''),
+    ('GET', '/notifications'): (handle_notifications, ''),
+    ('POST', '/notifications/read'): (handle_read_notifications, ''),
+    ('POST', '/course-requests'): (handle_submit_course_request, 'student'),
+    ('GET', '/requests'): (handle_student_requests, 'student'),
+    ('POST', '/defense-requests'): (handle_submit_defense_request, 'student'),
+    ('GET', '/supervision-requests'): (handle_supervision_requests, 'professor'),
+    ('POST', '/supervision-requests/process'): (handle_process_supervision, 'professor'),
+    ('GET', '/defense-requests'): (handle_defense_requests, 'professor'),
+    ('POST', '/defense-requests/process'): (handle_process_defense, 'professor'),
+    ('GET', '/assigned-defenses'): (handle_assigned_defenses, 'professor'),
+    ('POST', '/grades'): (handle_submit_grade, 'professor'),
+}
+
+# Handled by the server itself because they touch sessions or statistics.
+SERVER_ROUTES = {('POST', '/login'), ('POST', '/logout'), ('GET', '/stats')}
+
+# --- Server ---
+class ThesisServer:
+    def __init__(self, host='127.0.0.1', port=8080, threads=None):
+        self.host = host
+        self.port = port
+        self.executor = ThreadPoolExecutor(max_workers=threads or min(32, (os.cpu_count() or 1) + 4))
+        self.sessions = SessionStore()
+        self.stats = LatencyStats()
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+        self.executor.shutdown(wait=False)
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body = request
+                start = time.perf_counter()
+                path = urlsplit(target).path
+                try:
+                    status, payload = 200, await self._dispatch(method, target, headers, body)
+                except HttpError as e:
+                    status, payload = e.status, {'error': e.message}
+                except Exception:
+                    # The details go to the server's stderr only: they can
+                    # name files and internal state.
+                    print(f"{method} {path} failed:", file=sys.stderr)
+                    traceback.print_exc()
+                    status, payload = 500, {'error': "Internal server error"}
+                route = f"{method} {path}" if (method, path) in ROUTES or (method, path) in SERVER_ROUTES else 'other'
+                self.stats.record(route, time.perf_counter() - start)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                if isinstance(payload, FileResponse):
+                    await self._send_file(writer, payload, keep_alive)
+                else:
+                    self._write_response(writer, status, payload, keep_alive)
+                    await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except HttpError as e:
+            self._write_response(writer, e.status, {'error': e.message}, False)
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except asyncio.IncompleteReadError:
+            return None
+        except asyncio.LimitOverrunError:
+            raise HttpError(413, "Request headers too large")
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, _ = lines[0].split(' ', 2)
+        except ValueError:
+            raise HttpError(400, "Malformed request line")
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+        # Digits only: int() would also take signs, spaces and underscores.
+        length = headers.get('content-length') or '0'
+        if not (length.isascii() and length.isdigit()):
+            raise HttpError(400, "Invalid Content-Length")
+        length = int(length)
+        if length > MAX_BODY_BYTES:
+            raise HttpError(413, "Request body too large")
+        body = await reader.readexactly(length) if length else b''
+        return method.upper(), target, headers, body
+
+    def _write_response(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload, ensure_ascii=False, default=encode).encode('utf-8')
+        head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                f"Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode('latin-1') + body)
+
+    async def _send_file(self, writer, response, keep_alive):
+        # loop.sendfile hands the file to os.sendfile, so the body goes from
+        # the page cache to the socket without being read into Python.
+        head = (f"HTTP/1.1 200 OK\r\n"
+                f"Content-Type: {response.content_type}\r\n"
+                f"Content-Length: {response.size}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode('latin-1'))
+        await writer.drain()
+        with attachments.open_blob(response.digest) as f:
+            await asyncio.get_running_loop().sendfile(writer.transport, f, 0, response.size)
+
+    async def _dispatch(self, method, target, headers, body):
+        parts = urlsplit(target)
+        params = {name: values[-1] for name, values in parse_qs(parts.query).items()}
+        if body:
+            try:
+                data = json.loads(body)
+            except ValueError:
+                raise HttpError(400, "Body must be JSON")
+            if not isinstance(data, dict):
+                raise HttpError(400, "Body must be a JSON object")
+            params.update(data)
+        loop = asyncio.get_running_loop()
+        authorization = headers.get('authorization', '')
+        token = authorization[len('Bearer '):] if authorization.startswith('Bearer ') else None
+
+        if parts.path == '/login' and method == 'POST':
+            user_type, user_id, password = _require(params, 'user_type', 'user_id', 'password')
+            if user_type not in ('student', 'professor'):
+                raise HttpError(400, "user_type must be 'student' or 'professor'")
+            user = await loop.run_in_executor(self.executor, auth.login, user_type, user_id, password)
+            if not user:
+                raise HttpError(401, "Invalid credentials.")
+            return {'token': self.sessions.create(user_type, user), 'user_type': user_type,
+                    'user_id': user['user_id'], 'name': user['name']}
+        if parts.path == '/logout' and method == 'POST':
+            if token:
+                self.sessions.delete(token)
+            return {'success': True}
+        if parts.path == '/stats' and method == 'GET':
+            return {'latency': self.stats.report()}
+
+        route = ROUTES.get((method, parts.path))
+        if route is None:
+            if any(path == parts.path for _, path in set(ROUTES) | SERVER_ROUTES):
+                raise HttpError(405, f"{method} is not allowed on {parts.path}")
+            raise HttpError(404, f"No such endpoint: {parts.path}")
+        handler, user_type = route
+        session = self.sessions.get(token) if token else None
+        if user_type is not None:
+            if session is None:
+                raise HttpError(401, "Login required.")
+            if user_type and session['user_type'] != user_type:
+                raise HttpError(403, f"Only a {user_type} can do this.")
+        return await loop.run_in_executor(self.executor, handler, session, params)
+
+def print_stats(stats):
+    report = stats.report()
+    if not report:
+        return
+    print(f"{'route':<40}{'count':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for route, row in sorted(report.items()):
+        print(f"{route:<40}{row['count']:>8}{row['p50_ms']:>10.2f}{row['p90_ms']:>10.2f}"
+              f"{row['p99_ms']:>10.2f}{row['max_ms']:>10.2f}")
+
+def run(host='127.0.0.1', port=8080, threads=None):
+    server = ThesisServer(host, port, threads)
+
+    async def main():
+        # SIGTERM (and SIGINT where a terminal delivers it) stop the server
+        # cleanly so the latency summary is printed.
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except (NotImplementedError, RuntimeError):
+                pass
+        await server.start()
+        print(f"Serving on http://{server.host}:{server.port} (Ctrl+C to stop)", flush=True)
+        await stop.wait()
+
+    notifications.start_worker()
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        notifications.stop_worker(timeout=5)
+        print_stats(server.stats)
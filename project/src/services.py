@@ -1,14 +1,20 @@
 import uuid
 from datetime import datetime, timedelta
-from src.database import load_data, save_data
+from itertools import chain
+from src import analytics, attachments, duplicates, notifications, query, schedule, search
+from src.database import find_record, find_records, find_records_by_ids, is_archived, iter_records, map_partitions
+from src.pagination import Cursor
+from src.models import MISSING, PackedMapping, Request, RequestStatus, RequestType, Thesis, ThesisStatus
+from src.partitions import ArchivedRecordError
+from src.transactions import TransactionConflict, run_transaction
 
 # --- Status Constants ---
-STATUS_PENDING = "Pending Professor Approval"
-STATUS_APPROVED = "Approved"
-STATUS_REJECTED = "Rejected"
-STATUS_DEFENSE_PENDING = "Pending Defense Approval"
-STATUS_DEFENSE_APPROVED = "Approved for Defense"
-STATUS_DEFENDED = "Defended"
+STATUS_PENDING = RequestStatus.PENDING
+STATUS_APPROVED = RequestStatus.APPROVED
+STATUS_REJECTED = RequestStatus.REJECTED
+STATUS_DEFENSE_PENDING = RequestStatus.DEFENSE_PENDING
+STATUS_DEFENSE_APPROVED = ThesisStatus.DEFENSE_APPROVED
+STATUS_DEFENDED = ThesisStatus.DEFENDED
 
 # --- Helper Functions ---
 def find_item_by_id(item_list, item_id, id_key='id'):
@@ -17,219 +23,504 @@ def find_item_by_id(item_list, item_id, id_key='id'):
             return item
     return None
 
+def _notified(outcome):
+    # After a commit that may have queued notifications.
+    if outcome[0]:
+        notifications.wake_worker()
+    return outcome
+
+def _transact(func):
+    try:
+        return run_transaction(func)
+    except TransactionConflict:
+        return False, "The system is busy, please try again."
+    except ArchivedRecordError:
+        return False, "This record belongs to a closed term and can no longer be changed."
+
+# --- Sort Keys ---
+# name -> (key, descending) for the cursors returned by the list services.
+def _thesis_date(thesis):
+    return thesis.defense_time or thesis.defense_date or ''
+
+def _thesis_score(thesis):
+    return sum(thesis.scores.values()) / len(thesis.scores) if thesis.scores else -1.0
+
+REQUEST_SORTS = {'date': (lambda r: r.request_date or r.submission_date or '', False)}
+THESIS_SORTS = {
+    'date': (_thesis_date, True),
+    'grade': (_thesis_score, True),
+    'title': (lambda t: (t.title or '').casefold(), False),
+}
+# Examiners see their next defense first.
+ASSIGNED_SORTS = {**THESIS_SORTS, 'date': (_thesis_date, False)}
+NOTIFICATION_SORTS = {'date': (lambda n: n.created_at, True)}
+
 # --- Student Services ---
 def get_available_courses():
-    courses = load_data('courses.json')
-    return [c for c in courses if c.get('capacity', 0) > 0]
+    return [c for c in iter_records('courses.json') if (c.capacity or 0) > 0]
 
 def submit_thesis_request(student_id, course_id):
-    requests = load_data('requests.json')
-    courses = load_data('courses.json')
+    return _transact(lambda tx: _submit_thesis_request(tx, student_id, course_id))
 
-    if any(r['student_id'] == student_id and r['status'] != STATUS_REJECTED for r in requests):
+def _submit_thesis_request(tx, student_id, course_id):
+    if any(r.status != STATUS_REJECTED for r in tx.find('requests.json', student_id=student_id)):
         return False, "You already have an active or approved request."
 
-    course = find_item_by_id(courses, course_id, 'course_id')
-    if not course or course['capacity'] <= 0:
+    course = tx.get('courses.json', course_id)
+    if not course or course.capacity <= 0:
         return False, "Course not found or its capacity is full."
 
-    new_request = {
-        "request_id": str(uuid.uuid4()),
-        "type": "course_request",
-        "student_id": student_id,
-        "course_id": course_id,
-        "professor_id": course['professor_id'],
-        "request_date": datetime.now().isoformat(),
-        "status": STATUS_PENDING
-    }
-    requests.append(new_request)
-    save_data('requests.json', requests)
+    new_request = Request(
+        request_id=str(uuid.uuid4()),
+        type=RequestType.COURSE,
+        student_id=student_id,
+        course_id=course_id,
+        professor_id=course.professor_id,
+        request_date=datetime.now().isoformat(),
+        status=STATUS_PENDING,
+    )
+    tx.put('requests.json', new_request)
     return True, "Your request has been successfully submitted."
 
-def get_student_request_status(student_id):
-    requests = load_data('requests.json')
-    return [r for r in requests if r.get('student_id') == student_id and r.get('type') == 'course_request']
+def get_student_request_status(student_id, sort='date'):
+    return Cursor(lambda: find_records('requests.json', student_id=student_id, type=RequestType.COURSE),
+                  REQUEST_SORTS, sort, 'request_id', ('student_requests', student_id))
+
+def get_notifications(user_id, sort='date'):
+    return Cursor(lambda: find_records('notifications.json', user_id=user_id),
+                  NOTIFICATION_SORTS, sort, 'notification_id', ('notifications', user_id))
+
+def get_unread_count(user_id):
+    # Served by the (user_id, read) index of the outbox: no request is read.
+    return len(find_records('notifications.json', user_id=user_id, read=False))
+
+def mark_notifications_read(user_id, notification_ids=None):
+    return _transact(lambda tx: _mark_notifications_read(tx, user_id, notification_ids))
+
+def _mark_notifications_read(tx, user_id, notification_ids):
+    marked = 0
+    for notification in tx.find('notifications.json', user_id=user_id, read=False):
+        if notification_ids is None or notification.notification_id in notification_ids:
+            notification.read = True
+            tx.put('notifications.json', notification)
+            marked += 1
+    return True, marked
 
 def submit_defense_request(student_id, title, abstract, keywords, pdf_path, image_path):
-    requests = load_data('requests.json')
-    
-    approved_request = next((r for r in requests if r['student_id'] == student_id and r['status'] == STATUS_APPROVED), None)
+    # The files are stored before the transaction, so a retry does not read
+    # them again; an unused blob is harmless. Only files in the upload
+    # directory are stored; for others the request keeps just the path, as
+    # it did before the store existed.
+    pdf_sha256, image_sha256 = attachments.ingest_uploads([pdf_path, image_path])
+    similar = duplicates.find_similar(title, abstract)
+    success, message = _transact(lambda tx: _submit_defense_request(
+        tx, student_id, title, abstract, keywords, pdf_path, image_path, pdf_sha256, image_sha256, similar))
+    if success:
+        duplicates.index_requests(find_records('requests.json', student_id=student_id, type=RequestType.DEFENSE,
+                                               status=STATUS_DEFENSE_PENDING))
+        if similar:
+            message += (f" Note: it closely resembles {len(similar)} existing thesis or request(s) "
+                        f"(best match {similar[0][2]:.0%}); your supervisor will see them.")
+        if (pdf_path and not pdf_sha256) or (image_path and not image_sha256):
+            message += " Files not found in the upload directory were not stored; only their paths were recorded."
+    return success, message
+
+def _submit_defense_request(tx, student_id, title, abstract, keywords, pdf_path, image_path,
+                            pdf_sha256=None, image_sha256=None, similar=()):
+    approved_request = next(iter(tx.find('requests.json', student_id=student_id, status=STATUS_APPROVED)), None)
     
     if not approved_request:
         return False, "You do not have an approved thesis course."
 
-    approval_date = datetime.fromisoformat(approved_request['approval_date'])
+    approval_date = datetime.fromisoformat(approved_request.approval_date)
     if datetime.now() < approval_date + timedelta(days=90):
         return False, "At least 3 months must have passed since your course approval date."
 
-    new_defense_req = {
-        "request_id": str(uuid.uuid4()),
-        "type": "defense_request",
-        "student_id": student_id,
-        "course_request_id": approved_request['request_id'],
-        "professor_id": approved_request['professor_id'],
-        "submission_date": datetime.now().isoformat(),
-        "status": STATUS_DEFENSE_PENDING,
-        "details": {
+    new_defense_req = Request(
+        request_id=str(uuid.uuid4()),
+        type=RequestType.DEFENSE,
+        student_id=student_id,
+        course_request_id=approved_request.request_id,
+        professor_id=approved_request.professor_id,
+        submission_date=datetime.now().isoformat(),
+        status=STATUS_DEFENSE_PENDING,
+        details={
             "title": title,
             "abstract": abstract,
             "keywords": keywords,
             "pdf_path": pdf_path,
-            "image_path": image_path
-        }
-    }
-    requests.append(new_defense_req)
-    save_data('requests.json', requests)
+            "image_path": image_path,
+            "pdf_sha256": pdf_sha256,
+            "image_sha256": image_sha256,
+            "similar": [{"kind": kind, "id": doc_id, "similarity": score} for kind, doc_id, score in similar]
+        },
+    )
+    tx.put('requests.json', new_defense_req)
     return True, "Your defense request has been successfully submitted."
 
 # --- Professor Services ---
-def get_supervision_requests(professor_id):
+def get_supervision_requests(professor_id, sort='date'):
      
-    requests = load_data('requests.json')
-    return [r for r in requests if r['professor_id'] == professor_id and r['type'] == 'course_request' and r['status'] == STATUS_PENDING]
+    return Cursor(lambda: find_records('requests.json', professor_id=professor_id, type=RequestType.COURSE,
+                                       status=STATUS_PENDING),
+                  REQUEST_SORTS, sort, 'request_id', ('supervision_requests', professor_id))
 
 def process_supervision_request(professor_id, request_id, action):
      
-    requests = load_data('requests.json')
-    professors = load_data('professors.json')
-    courses = load_data('courses.json')
+    return _notified(_transact(lambda tx: _process_supervision_request(tx, professor_id, request_id, action)))
 
-    request = find_item_by_id(requests, request_id, 'request_id')
-    professor = find_item_by_id(professors, professor_id, 'user_id')
+def _process_supervision_request(tx, professor_id, request_id, action):
+    request = tx.get('requests.json', request_id)
+    professor = tx.get('professors.json', professor_id)
 
-    if not request or request['professor_id'] != professor_id:
+    if not request or request.professor_id != professor_id or request.type != RequestType.COURSE:
         return False, "Request not found."
+    if request.status != STATUS_PENDING:
+        return False, "Request has already been processed."
 
     if action == 'approve':
-        if professor['supervision_capacity'] <= 0:
+        if professor.supervision_capacity <= 0:
             return False, "Your supervision capacity is full."
         
-        request['status'] = STATUS_APPROVED
-        request['approval_date'] = datetime.now().isoformat()
-        professor['supervision_capacity'] -= 1
+        request.status = STATUS_APPROVED
+        request.approval_date = datetime.now().isoformat()
+        professor.supervision_capacity -= 1
+        tx.put('professors.json', professor)
         
-        course = find_item_by_id(courses, request['course_id'], 'course_id')
+        course = tx.get('courses.json', request.course_id)
         if course:
-            course['capacity'] -= 1
+            course.capacity -= 1
+            tx.put('courses.json', course)
 
     elif action == 'reject':
-        request['status'] = STATUS_REJECTED
+        request.status = STATUS_REJECTED
     else:
         return False, "Invalid action."
 
-    save_data('requests.json', requests)
-    save_data('professors.json', professors)
-    save_data('courses.json', courses)
-    return True, f"Request has been successfully {'approved' if action == 'approve' else 'rejected'}."
+    tx.put('requests.json', request)
+    outcome = 'approved' if action == 'approve' else 'rejected'
+    notifications.enqueue(tx, request.student_id, f"course_request_{outcome}",
+                          f"Your thesis course request for {request.course_id} was {outcome} by {professor.name}.",
+                          request_id)
+    return True, f"Request has been successfully {outcome}."
 
-def get_defense_requests(professor_id):
+def get_defense_requests(professor_id, sort='date'):
      
-    requests = load_data('requests.json')
-    return [r for r in requests if r['professor_id'] == professor_id and r['type'] == 'defense_request' and r['status'] == STATUS_DEFENSE_PENDING]
+    return Cursor(lambda: find_records('requests.json', professor_id=professor_id, type=RequestType.DEFENSE,
+                                       status=STATUS_DEFENSE_PENDING),
+                  REQUEST_SORTS, sort, 'request_id', ('defense_requests', professor_id))
 
-def process_defense_request(professor_id, request_id, defense_date, internal_examiner_id, external_examiner_id):
+def process_defense_request(professor_id, request_id, defense_date, internal_examiner_id, external_examiner_id,
+                            defense_time=None, room_id=None):
      
-    requests = load_data('requests.json')
-    theses = load_data('theses.json')
-    professors = load_data('professors.json')
-
-    request = find_item_by_id(requests, request_id, 'request_id')
-    if not request or request['professor_id'] != professor_id:
+    success, message = _transact(lambda tx: _process_defense_request(
+        tx, professor_id, request_id, defense_date, internal_examiner_id, external_examiner_id,
+        defense_time, room_id))
+    if success:
+        request = find_record('requests.json', request_id)
+        theses = find_records('theses.json', student_id=request.student_id, status=STATUS_DEFENSE_APPROVED)
+        schedule.index_defenses(theses)
+        duplicates.index_finalized([request], theses)
+        for thesis in theses:
+            analytics.record_defense_scheduled(thesis)
+        notifications.wake_worker()
+    return success, message
+
+def _booking_conflicts(tx, start, professor_ids, room_id, exclude=(), days=None):
+    # The in-memory schedule index only learns of other processes' bookings
+    # when theses.json is reloaded. The day's defenses are read through the
+    # transaction as well, so a defense booked that day by anyone else
+    # before this commit fails validation and the check runs again. days
+    # keeps each day's query for the rest of the transaction.
+    days = {} if days is None else days
+    day = start.date().isoformat()
+    if day not in days:
+        days[day] = tx.find('theses.json', status=STATUS_DEFENSE_APPROVED, defense_date=day)
+    return schedule.find_conflicts(start, professor_ids, room_id, exclude, days[day])
+
+def _process_defense_request(tx, professor_id, request_id, defense_date, internal_examiner_id, external_examiner_id,
+                             defense_time=None, room_id=None):
+    request = tx.get('requests.json', request_id)
+    if not request or request.professor_id != professor_id or request.type != RequestType.DEFENSE:
         return False, "Defense request not found."
-
-    internal_examiner = find_item_by_id(professors, internal_examiner_id, 'user_id')
-    external_examiner = find_item_by_id(professors, external_examiner_id, 'user_id')
-
-    if not internal_examiner or internal_examiner['examiner_capacity'] <= 0:
+    if request.status != STATUS_DEFENSE_PENDING:
+        return False, "Defense request has already been processed."
+    if professor_id in (internal_examiner_id, external_examiner_id):
+        return False, "The supervisor cannot examine their own student."
+    if internal_examiner_id == external_examiner_id:
+        return False, "The internal and external examiners must be different professors."
+
+    if defense_time is not None:
+        start = schedule.parse_time(f"{defense_date}T{defense_time}")
+        if start is None:
+            return False, "Enter the defense date as YYYY-MM-DD and the time as HH:MM."
+        if room_id and not tx.get('rooms.json', room_id):
+            return False, "Room not found."
+        conflicts = _booking_conflicts(tx, start, [professor_id, internal_examiner_id, external_examiner_id], room_id)
+        if conflicts:
+            return False, " ".join(conflicts)
+        defense_time = start.isoformat(timespec='minutes')
+
+    internal_examiner = tx.get('professors.json', internal_examiner_id)
+    external_examiner = tx.get('professors.json', external_examiner_id)
+
+    if not internal_examiner or internal_examiner.examiner_capacity <= 0:
         return False, "Internal examiner not found or their capacity is full."
-    if not external_examiner or external_examiner['examiner_capacity'] <= 0:
+    if not external_examiner or external_examiner.examiner_capacity <= 0:
         return False, "External examiner not found or their capacity is full."
 
-    new_thesis = {
-        "thesis_id": str(uuid.uuid4()),
-        "student_id": request['student_id'],
-        "supervisor_id": professor_id,
-        "title": request['details']['title'],
-        "abstract": request['details']['abstract'],
-        "keywords": request['details']['keywords'],
-        "pdf_path": request['details']['pdf_path'],
-        "image_path": request['details']['image_path'],
-        "defense_date": defense_date,
-        "examiners": [internal_examiner_id, external_examiner_id],
-        "status": STATUS_DEFENSE_APPROVED,
-        "grade": None,
-        "scores": {}
-    }
-    theses.append(new_thesis)
+    details = request.details
+    new_thesis = Thesis(
+        thesis_id=str(uuid.uuid4()),
+        student_id=request.student_id,
+        supervisor_id=professor_id,
+        title=details['title'],
+        abstract=details['abstract'],
+        keywords=details['keywords'],
+        pdf_path=details['pdf_path'],
+        image_path=details['image_path'],
+        pdf_sha256=details.get('pdf_sha256') or MISSING,
+        image_sha256=details.get('image_sha256') or MISSING,
+        defense_date=defense_date,
+        examiners=[internal_examiner_id, external_examiner_id],
+        status=STATUS_DEFENSE_APPROVED,
+        grade=None,
+        scores={},
+    )
+    if defense_time is not None:
+        new_thesis.defense_time = defense_time
+        new_thesis.room_id = room_id or MISSING
+    tx.put('theses.json', new_thesis)
     
-    request['status'] = 'Finalized'
-    internal_examiner['examiner_capacity'] -= 1
-    external_examiner['examiner_capacity'] -= 1
-
-    save_data('requests.json', requests)
-    save_data('theses.json', theses)
-    save_data('professors.json', professors)
+    request.status = RequestStatus.FINALIZED
+    internal_examiner.examiner_capacity -= 1
+    external_examiner.examiner_capacity -= 1
+
+    tx.put('requests.json', request)
+    tx.put('professors.json', internal_examiner)
+    tx.put('professors.json', external_examiner)
+    when = (new_thesis.get('defense_time') or defense_date).replace('T', ' ')
+    where = f" in room {room_id}" if defense_time is not None and room_id else ""
+    notifications.enqueue(tx, request.student_id, 'defense_scheduled',
+                          f"Your defense of \"{new_thesis.title}\" is scheduled for {when}{where}.", new_thesis.thesis_id)
     
     return True, "Defense session has been successfully scheduled."
 
-def get_assigned_defenses(professor_id):
+def get_assigned_defenses(professor_id, sort='date'):
      
-    theses = load_data('theses.json')
-    return [t for t in theses if professor_id in t['examiners'] and t['grade'] is None]
+    # Ungraded theses are always awaiting their defense, so the status lets
+    # frozen terms be skipped.
+    return Cursor(lambda: (t for t in iter_records('theses.json', examiners=professor_id, status=STATUS_DEFENSE_APPROVED)
+                           if t.grade is None),
+                  ASSIGNED_SORTS, sort, 'thesis_id', ('assigned_defenses', professor_id))
 
 def submit_grade(thesis_id, examiner_id, score):
      
-    theses = load_data('theses.json')
-    professors = load_data('professors.json')
-
-    thesis = find_item_by_id(theses, thesis_id, 'thesis_id')
-    if not thesis:
-        return False, "Thesis not found."
-
-    thesis['scores'][examiner_id] = score
+    success, message = _transact(lambda tx: _submit_grade(tx, thesis_id, examiner_id, score))
+    if success:
+        thesis = find_record('theses.json', thesis_id)
+        if thesis and thesis.status == STATUS_DEFENDED:
+            search.index_thesis(thesis)
+            analytics.record_defense_graded(thesis)
+            query.index_thesis(thesis)
+            notifications.wake_worker()
+    return success, message
+
+def _submit_grade(tx, thesis_id, examiner_id, score):
+    thesis = tx.get('theses.json', thesis_id)
+    if not thesis or examiner_id not in thesis.examiners:
+        return False, "Thesis not found among your assigned defenses."
+    if thesis.grade is not None or examiner_id in thesis.scores:
+        return False, "You have already graded this thesis."
+    if not isinstance(score, int) or not 0 <= score <= 100:
+        return False, "Score must be an integer between 0 and 100."
+
+    thesis.scores[examiner_id] = score
     
-    if len(thesis['scores']) == 2:
-        final_score = sum(thesis['scores'].values()) / 2
+    if len(thesis.scores) == 2:
+        final_score = sum(thesis.scores.values()) / 2
         grade_map = {range(90, 101): 'A', range(80, 90): 'B', range(70, 80): 'C'}
-        thesis['grade'] = next((g for r, g in grade_map.items() if final_score in r), 'D')
-        thesis['status'] = STATUS_DEFENDED
+        thesis.grade = next((g for r, g in grade_map.items() if final_score in r), 'D')
+        thesis.status = STATUS_DEFENDED
+        notifications.enqueue(tx, thesis.student_id, 'thesis_graded',
+                              f"Your thesis \"{thesis.title}\" has been graded {thesis.grade} "
+                              f"(final score {final_score:g}).", thesis_id)
 
-        supervisor = find_item_by_id(professors, thesis['supervisor_id'], 'user_id')
+        supervisor = tx.get('professors.json', thesis.supervisor_id)
         if supervisor:
-            supervisor['supervision_capacity'] += 1
+            supervisor.supervision_capacity += 1
+            tx.put('professors.json', supervisor)
         
-        for ex_id in thesis['examiners']:
-            examiner = find_item_by_id(professors, ex_id, 'user_id')
+        for ex_id in thesis.examiners:
+            examiner = tx.get('professors.json', ex_id)
             if examiner:
-                examiner['examiner_capacity'] += 1
-        
-        save_data('professors.json', professors)
+                examiner.examiner_capacity += 1
+                tx.put('professors.json', examiner)
 
-    save_data('theses.json', theses)
+    tx.put('theses.json', thesis)
     return True, "Grade submitted successfully."
 
-# --- Search Service ---
-def search_theses(query, search_by):
-     
-    theses = load_data('theses.json')
+# --- Batch Services ---
+# A batch runs in a single transaction: every item is read, checked and
+# applied against the same snapshot, so capacities are shared across the batch
+# and all changes reach disk in one commit. Items that fail leave nothing
+# behind and are reported next to the ones that succeeded.
+def process_supervision_requests(professor_id, request_ids, action):
+
+    return _notified(_transact(lambda tx: _process_supervision_requests(tx, professor_id, request_ids, action)))
+
+def _process_supervision_requests(tx, professor_id, request_ids, action):
     results = []
-    query = query.lower()
-    
-    for thesis in theses:
-        if thesis['status'] != STATUS_DEFENDED:
+    for request_id in request_ids:
+        success, message = _process_supervision_request(tx, professor_id, request_id, action)
+        results.append((request_id, success, message))
+    return True, results
+
+def submit_grades(examiner_id, grades):
+
+    success, results = _transact(lambda tx: _submit_grades(tx, examiner_id, grades))
+    if success:
+        for thesis_id, graded, _ in results:
+            thesis = find_record('theses.json', thesis_id) if graded else None
+            if thesis and thesis.status == STATUS_DEFENDED:
+                search.index_thesis(thesis)
+                analytics.record_defense_graded(thesis)
+                query.index_thesis(thesis)
+        notifications.wake_worker()
+    return success, results
+
+def _submit_grades(tx, examiner_id, grades):
+    results = []
+    for thesis_id, score in grades:
+        success, message = _submit_grade(tx, thesis_id, examiner_id, score)
+        results.append((thesis_id, success, message))
+    return True, results
+
+def assign_defense_examiners(assignments):
+
+    success, results = _transact(lambda tx: _assign_defense_examiners(tx, assignments))
+    if success:
+        approved = find_records_by_ids('requests.json', [request_id for request_id, ok, _ in results if ok])
+        students = {r.student_id for r in approved}
+        theses = [t for t in find_records('theses.json', status=STATUS_DEFENSE_APPROVED) if t.student_id in students]
+        schedule.index_defenses(theses)
+        duplicates.index_finalized(approved, theses)
+        for thesis in theses:
+            analytics.record_defense_scheduled(thesis)
+        notifications.wake_worker()
+    return success, results
+
+def _assign_defense_examiners(tx, assignments):
+    # assignments: (request_id, defense_date, internal_examiner_id, external_examiner_id),
+    # each approved on behalf of the request's supervisor.
+    results = []
+    for request_id, defense_date, internal_examiner_id, external_examiner_id in assignments:
+        request = tx.get('requests.json', request_id)
+        success, message = _process_defense_request(
+            tx, request.professor_id if request else None, request_id, defense_date,
+            internal_examiner_id, external_examiner_id)
+        results.append((request_id, success, message))
+    return True, results
+
+def schedule_defenses(sessions):
+
+    success, results = _transact(lambda tx: _schedule_defenses(tx, sessions))
+    if success:
+        scheduled = [thesis_id for thesis_id, placed, _ in results if placed]
+        schedule.index_defenses(find_records_by_ids('theses.json', scheduled))
+    return success, results
+
+def _schedule_defenses(tx, sessions):
+    # sessions: (thesis_id, start datetime, room_id) from schedule.plan_schedule.
+    # The plan is free of clashes within itself; the check only looks for
+    # defenses booked since it was made.
+    results = []
+    planned = {thesis_id for thesis_id, _, _ in sessions}
+    days = {}
+    for thesis_id, start, room_id in sessions:
+        thesis = tx.get('theses.json', thesis_id)
+        if not thesis or thesis.status != STATUS_DEFENSE_APPROVED:
+            results.append((thesis_id, False, "Thesis is no longer waiting for its defense."))
             continue
+        conflicts = _booking_conflicts(tx, start, schedule.panel(thesis), room_id, planned, days)
+        if conflicts:
+            results.append((thesis_id, False, " ".join(conflicts)))
+            continue
+        thesis.defense_date = start.date().isoformat()
+        thesis.defense_time = start.isoformat(timespec='minutes')
+        thesis.room_id = room_id
+        tx.put('theses.json', thesis)
+        results.append((thesis_id, True, f"Scheduled for {thesis.defense_time} in room {room_id}."))
+    return True, results
+
+def record_attachments(updates):
+
+    return _transact(lambda tx: _record_attachments(tx, updates))
+
+def _record_attachments(tx, updates):
+    # updates: (filename, record_id, {'pdf_sha256': ..., 'image_sha256': ...})
+    # for theses and defense requests whose files were stored afterwards.
+    recorded = 0
+    for filename, record_id, hashes in updates:
+        record = tx.get(filename, record_id)
+        if not record or is_archived(filename, record_id):
+            continue
+        if filename == 'requests.json':
+            record.details = PackedMapping({**record.details, **hashes})
+        else:
+            record.update(hashes)
+        tx.put(filename, record)
+        recorded += 1
+    return True, recorded
 
-        match = False
-        if search_by == 'title' and query in thesis['title'].lower():
-            match = True
-        elif search_by == 'author' and query in thesis['student_id'].lower():
-            match = True
-        elif search_by == 'supervisor' and query in thesis['supervisor_id'].lower():
-            match = True
-        elif search_by == 'keywords' and query in thesis['keywords'].lower():
-            match = True
-        
-        if match:
-            results.append(thesis)
-            
-    return results
\ No newline at end of file
+# --- Search Service ---
+TEXT_SEARCH_FIELDS = {'title': ('title',), 'keywords': ('keywords',), 'abstract': ('abstract',), 'all': search.FIELDS}
+
+def search_theses(query, search_by, sort=None):
+     
+    if search_by in TEXT_SEARCH_FIELDS:
+        scores = {}
+
+        def ranked_theses():
+            # Scored when a page is asked for; the relevance key below reads
+            # the scores filled in here.
+            scores.clear()
+            scores.update(search.query(lambda: iter_records('theses.json', status=STATUS_DEFENDED),
+                                       query, TEXT_SEARCH_FIELDS[search_by]))
+            theses = find_records_by_ids('theses.json', list(scores))
+            return (t for t in theses if t.status == STATUS_DEFENDED)
+
+        sorts = {'relevance': (lambda t: scores[t.thesis_id], True), **THESIS_SORTS}
+        return Cursor(ranked_theses, sorts, sort or 'relevance', 'thesis_id', ('search', search_by, query))
+
+    def matching_theses():
+        needle = query.lower()
+
+        def scan(theses):
+            matches = []
+            for thesis in theses:
+
+                match = False
+                if search_by == 'author' and needle in thesis.student_id.lower():
+                    match = True
+                elif search_by == 'supervisor' and needle in thesis.supervisor_id.lower():
+                    match = True
+
+                if match:
+                    matches.append(thesis)
+            return matches
+
+        # Every term partition is scanned at once and the matches merged.
+        return chain.from_iterable(map_partitions('theses.json', scan, status=STATUS_DEFENDED))
+
+    return Cursor(matching_theses, THESIS_SORTS, sort or 'date', 'thesis_id', ('search', search_by, query))
+
+def query_theses(text, sort=None):
+    # Compound archive queries (src/query.py); raises query.QueryError for a
+    # malformed query before any cursor is made.
+    query.parse(text)
+    return Cursor(lambda: find_records_by_ids('theses.json', query.run(text)[0]),
+                  THESIS_SORTS, sort or 'date', 'thesis_id', ('query', text))
+
+def explain_query(text):
+    return query.run(text)[1]
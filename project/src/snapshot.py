@@ -0,0 +1,317 @@
+import bisect
+import json
+import mmap
+import operator
+import os
+import struct
+import sys
+import threading
+import zlib
+from array import array
+from collections import deque
+from itertools import accumulate, repeat
+from src.models import MISSING, RECORD_TYPES, PackedMapping, Record, decode, encode
+
+# --- Binary Snapshots ---
+# A compact, column-oriented alternative to the pretty-printed JSON files,
+# read through mmap. Layout (little-endian):
+#     'TMSSNAP\0' | version u32 | header length u32 | header crc32 u32 | pad
+#     header: JSON {"collection", "count", "columns": [...]}
+#     sections, 8-byte aligned, each with its own crc32 in the header
+# Every field is stored as one column of one of three kinds:
+#     dict    strings that repeat (ids, statuses): a JSON array of the
+#             distinct values and one u8/u16/u32 code per record, the code
+#             len(values) meaning the record lacks the field
+#     json    anything else: a JSON array with one element per record, the
+#             u64 offset of every element, and the records lacking the field
+#     packed  PackedMapping values: a json column that also records where
+#             each element starts in the decoded text, so the mappings are
+#             cut out of it without being parsed
+# A column or a range of records is decoded with one json.loads, and type
+# converters (enums, interning) run once per distinct value of dict columns.
+# Sections are checksummed and verified the first time they are read.
+MAGIC = b'TMSSNAP\x00'
+VERSION = 1
+SUFFIX = '.tms'
+CHUNK_RECORDS = 4096
+_PREAMBLE = struct.Struct('<8sIII4x')
+_EXTRA = '_extra'
+
+class SnapshotError(Exception):
+    pass
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+def _to_bytes(values, typecode):
+    packed = array(typecode, values)
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return packed.tobytes()
+
+def _code_type(size):
+    return 'B' if size < 1 << 8 else 'H' if size < 1 << 16 else 'I'
+
+# --- Writing ---
+_dumps = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=encode).encode
+
+def _encode_column(values):
+    # -> (kind, {section: bytes}, code type or None)
+    present = [v for v in values if v is not MISSING]
+    if present and all(type(v) is PackedMapping for v in present):
+        texts = ['null' if v is MISSING else v.dumps() for v in values]
+        sections = _encode_elements(values, PackedMapping.dumps)
+        sections['chars'] = _to_bytes(accumulate((len(text) + 1 for text in texts), initial=1), 'Q')
+        return 'packed', sections, None
+    if present and all(isinstance(v, str) for v in present):
+        distinct = list(dict.fromkeys(present))
+        if len(distinct) <= len(values) // 2:
+            codes = {value: code for code, value in enumerate(distinct)}
+            codes[MISSING] = len(distinct)
+            code_type = _code_type(len(distinct) + 1)
+            return 'dict', {'values': _dumps(distinct).encode('utf-8'),
+                            'codes': _to_bytes(map(codes.__getitem__, values), code_type)}, code_type
+    return 'json', _encode_elements(values, _dumps), None
+
+def _encode_elements(values, dumps):
+    parts = [b'null' if v is MISSING else dumps(v).encode('utf-8') for v in values]
+    offsets = accumulate((len(part) + 1 for part in parts), initial=1)
+    sections = {'data': b'[' + b','.join(parts) + b']', 'offsets': _to_bytes(offsets, 'Q')}
+    missing = [i for i, v in enumerate(values) if v is MISSING]
+    if missing:
+        sections['missing'] = _to_bytes(missing, 'I')
+    return sections
+
+def _columns(filename, records):
+    record_type = RECORD_TYPES.get(filename)
+    if record_type is not None:
+        for field in record_type._fields:
+            yield field, [getattr(r, field) for r in records]
+        if any(r._extra for r in records):
+            yield _EXTRA, [r._extra or MISSING for r in records]
+        return
+    fields = dict.fromkeys(key for record in records for key in record)
+    for field in fields:
+        yield field, [r.get(field, MISSING) for r in records]
+
+def write_snapshot(path, filename, data):
+    records = [decode(filename, record) for record in data]
+    columns, body, position = [], [], 0
+    for name, values in _columns(filename, records):
+        kind, sections, code_type = _encode_column(values)
+        column = {'name': name, 'kind': kind, 'sections': {}}
+        if code_type:
+            column['code_type'] = code_type
+        for section, payload in sections.items():
+            column['sections'][section] = [position, len(payload), zlib.crc32(payload)]
+            padding = _align(len(payload)) - len(payload)
+            body.append(payload + bytes(padding))
+            position += len(payload) + padding
+        columns.append(column)
+    header = json.dumps({'collection': filename, 'count': len(records), 'columns': columns},
+                        ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    preamble = _PREAMBLE.pack(MAGIC, VERSION, len(header), zlib.crc32(header))
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(preamble)
+        f.write(header)
+        f.write(bytes(_align(len(preamble) + len(header)) - len(preamble) - len(header)))
+        for payload in body:
+            f.write(payload)
+    os.replace(tmp_path, path)
+
+# --- Reading ---
+class SnapshotReader:
+    # Maps the file and decodes on demand: column() for one field, records()
+    # for a range of records, iter_records() in chunks of CHUNK_RECORDS.
+    def __init__(self, path, filename=None):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, header_length, header_crc = _PREAMBLE.unpack_from(self._map, 0)
+            if magic != MAGIC:
+                raise SnapshotError(f"{path} is not a binary snapshot")
+            if version != VERSION:
+                raise SnapshotError(f"{path} has snapshot version {version}, expected {VERSION}")
+            header = self._map[_PREAMBLE.size:_PREAMBLE.size + header_length]
+            if zlib.crc32(header) != header_crc:
+                raise SnapshotError(f"{path}: header checksum mismatch")
+            header = json.loads(header)
+        except (ValueError, struct.error) as e:
+            self.close()
+            raise SnapshotError(f"{path}: {e}")
+        except BaseException:
+            self.close()
+            raise
+        self.collection = filename or header['collection']
+        self.count = header['count']
+        self.columns = {column['name']: column for column in header['columns']}
+        self.fields = [name for name in self.columns if name != _EXTRA]
+        self.record_type = RECORD_TYPES.get(self.collection)
+        self._converters = self.record_type._converters if self.record_type else {}
+        self._body = _align(_PREAMBLE.size + header_length)
+        self._verified = set()
+        self._arrays = {}
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def close(self):
+        if getattr(self, '_map', None) is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _section(self, column, name):
+        # (start, end) of a section in the file, checksum verified once.
+        offset, length, crc = column['sections'][name]
+        start = self._body + offset
+        if (column['name'], name) not in self._verified:
+            with memoryview(self._map) as whole, whole[start:start + length] as part:
+                actual = zlib.crc32(part)
+            if actual != crc:
+                raise SnapshotError(f"{self.path}: checksum mismatch in {column['name']}.{name}")
+            self._verified.add((column['name'], name))
+        return start, start + length
+
+    def _array(self, column, name, typecode):
+        key = (column['name'], name)
+        if key not in self._arrays:
+            values = array(typecode)
+            if name in column['sections']:
+                start, end = self._section(column, name)
+                values.frombytes(self._map[start:end])
+                if sys.byteorder == 'big':
+                    values.byteswap()
+            self._arrays[key] = values
+        return self._arrays[key]
+
+    def _dictionary(self, column):
+        key = (column['name'], 'values')
+        if key not in self._arrays:
+            start, end = self._section(column, 'values')
+            values = json.loads(self._map[start:end])
+            convert = self._converters.get(column['name'])
+            if convert is not None:
+                values = [convert(v) for v in values]
+            self._arrays[key] = values + [MISSING]
+        return self._arrays[key]
+
+    def column(self, name, start=0, stop=None):
+        # Decoded values of one field for records [start, stop); MISSING
+        # where a record lacks it.
+        stop = self.count if stop is None else min(stop, self.count)
+        if name not in self.columns:
+            return [MISSING] * max(0, stop - start)
+        if start >= stop:
+            return []
+        column = self.columns[name]
+        if column['kind'] == 'dict':
+            codes = self._array(column, 'codes', column['code_type'])
+            return list(map(self._dictionary(column).__getitem__, codes[start:stop]))
+
+        offsets = self._array(column, 'offsets', 'Q')
+        data_start, data_end = self._section(column, 'data')
+        missing = self._array(column, 'missing', 'I')
+        missing = missing[bisect.bisect_left(missing, start):bisect.bisect_left(missing, stop)]
+        if column['kind'] == 'packed':
+            values = self._packed(column, data_start, offsets, start, stop)
+            for i in missing:
+                values[i - start] = MISSING
+            return values
+        if start == 0 and stop == self.count:
+            values = json.loads(self._map[data_start:data_end])
+        else:
+            text = self._map[data_start + offsets[start]:data_start + offsets[stop] - 1]
+            values = json.loads(b'[' + text + b']')
+        convert = self._converters.get(name)
+        if convert is not None:
+            if missing:
+                values = [convert(v) if v is not None else v for v in values]
+            else:
+                values = list(map(convert, values))
+        for i in missing:
+            values[i - start] = MISSING
+        return values
+
+    def _packed(self, column, data_start, offsets, start, stop):
+        chars = self._array(column, 'chars', 'Q')
+        text = self._map[data_start + offsets[start]:data_start + offsets[stop] - 1].decode('utf-8')
+        base = chars[start]
+        starts = map(operator.sub, chars[start:stop], repeat(base))
+        ends = map(operator.sub, chars[start + 1:stop + 1], repeat(base + 1))
+        mappings = list(map(PackedMapping.__new__, repeat(PackedMapping, stop - start)))
+        deque(map(PackedMapping._packed.__set__, mappings, map(text.__getitem__, map(slice, starts, ends))),
+              maxlen=0)
+        return mappings
+
+    def records(self, start=0, stop=None):
+        stop = self.count if stop is None else min(stop, self.count)
+        size = max(0, stop - start)
+        record_type = self.record_type
+        if record_type is None:
+            rows = [{} for _ in range(size)]
+            for name in self.fields:
+                for row, value in zip(rows, self.column(name, start, stop)):
+                    if value is not MISSING:
+                        row[name] = value
+            return rows
+        # Records are filled one field at a time through the slot
+        # descriptors, so the per-record work stays in C.
+        records = list(map(record_type.__new__, repeat(record_type, size)))
+        for field in record_type._fields:
+            values = self.column(field, start, stop) if field in self.columns else repeat(MISSING, size)
+            deque(map(getattr(record_type, field).__set__, records, values), maxlen=0)
+        extras = [None] * size
+        unknown = [name for name in self.fields if name not in record_type._field_set]
+        if _EXTRA in self.columns or unknown:
+            stored = self.column(_EXTRA, start, stop)
+            for i, value in enumerate(stored):
+                if value is not MISSING:
+                    extras[i] = dict(value)
+            for name in unknown:
+                for i, value in enumerate(self.column(name, start, stop)):
+                    if value is not MISSING:
+                        extras[i] = {**(extras[i] or {}), name: value}
+        deque(map(Record._extra.__set__, records, extras), maxlen=0)
+        return records
+
+    def record(self, index):
+        return self.records(index, index + 1)[0]
+
+    def iter_records(self, chunk=CHUNK_RECORDS):
+        for start in range(0, self.count, chunk):
+            yield from self.records(start, start + chunk)
+
+    def select(self, positions, chunk=CHUNK_RECORDS):
+        # The records at the given positions, in ascending order. A chunk with
+        # many of them is decoded as a range, sparse ones record by record.
+        positions = sorted(positions)
+        i = 0
+        while i < len(positions):
+            start = positions[i] - positions[i] % chunk
+            end = bisect.bisect_left(positions, start + chunk, i)
+            if end - i > chunk // 64:
+                records = self.records(start, start + chunk)
+                for position in positions[i:end]:
+                    yield records[position - start]
+            else:
+                for position in positions[i:end]:
+                    yield self.record(position)
+            i = end
+
+    def verify(self):
+        for column in self.columns.values():
+            for name in column['sections']:
+                self._section(column, name)
+
+def read_snapshot(path, filename):
+    with SnapshotReader(path, filename) as reader:
+        return reader.records()
@@ -0,0 +1,243 @@
+import contextlib
+import json
+import sqlite3
+import threading
+from src.indexes import INDEX_SPECS, count_values, matches_criteria
+from src.models import decode, encode
+
+# --- Schema ---
+# Each collection becomes a table with its primary key, one column per field
+# used in an index group, and the full record as JSON in 'data'. List fields
+# (theses.examiners) get a side table so membership queries use an index.
+def _table_name(filename):
+    return filename[:-len('.json')] if filename.endswith('.json') else filename
+
+def _spec(filename):
+    return INDEX_SPECS.get(filename, {'key': 'id', 'groups': []})
+
+def _columns(filename):
+    spec = _spec(filename)
+    lists = set(spec.get('lists', ()))
+    columns = []
+    for group in spec['groups']:
+        for field in group:
+            if field not in lists and field != spec['key'] and field not in columns:
+                columns.append(field)
+    return columns
+
+class SqliteBackend:
+    name = 'sqlite'
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._ready = set()
+
+    # --- Connections ---
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS collection_generations (name TEXT PRIMARY KEY, generation INTEGER NOT NULL)')
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
+
+    def _ensure_table(self, filename):
+        if filename in self._ready:
+            return
+        conn = self.connection()
+        spec = _spec(filename)
+        table = _table_name(filename)
+        key = spec['key']
+        conn.execute(f'CREATE TABLE IF NOT EXISTS "{table}" ("{key}" TEXT PRIMARY KEY, data TEXT NOT NULL)')
+        existing = {row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')}
+        for column in _columns(filename):
+            if column not in existing:
+                conn.execute(f'ALTER TABLE "{table}" ADD COLUMN "{column}"')
+                conn.execute(f'UPDATE "{table}" SET "{column}" = json_extract(data, ?)', (f'$.{column}',))
+        for group in spec['groups']:
+            if any(field in spec.get('lists', ()) for field in group):
+                continue
+            name = f"{table}_{'_'.join(group)}"
+            fields = ', '.join(f'"{field}"' for field in group)
+            conn.execute(f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" ({fields})')
+        for field in spec.get('lists', ()):
+            side = f"{table}_{field}"
+            conn.execute(f'CREATE TABLE IF NOT EXISTS "{side}" ("{key}" TEXT NOT NULL, value TEXT NOT NULL)')
+            conn.execute(f'CREATE INDEX IF NOT EXISTS "{side}_value" ON "{side}" (value)')
+            conn.execute(f'CREATE INDEX IF NOT EXISTS "{side}_{key}" ON "{side}" ("{key}")')
+        self._ready.add(filename)
+
+    # --- Reads ---
+    def load_data(self, filename):
+        self._ensure_table(filename)
+        rows = self.connection().execute(f'SELECT data FROM "{_table_name(filename)}" ORDER BY rowid')
+        return [decode(filename, json.loads(row[0])) for row in rows]
+
+    def find_record(self, filename, record_id):
+        self._ensure_table(filename)
+        key = _spec(filename)['key']
+        row = self.connection().execute(
+            f'SELECT data FROM "{_table_name(filename)}" WHERE "{key}" = ?', (record_id,)).fetchone()
+        return decode(filename, json.loads(row[0])) if row else None
+
+    def find_records(self, filename, **criteria):
+        return list(self.iter_records(filename, **criteria))
+
+    # Cursors fetch rows lazily, so iterating needs no more memory than the
+    # current row; stopping early simply abandons the cursor.
+    def iter_data(self, filename):
+        return self.iter_records(filename)
+
+    def iter_records(self, filename, **criteria):
+        self._ensure_table(filename)
+        spec = _spec(filename)
+        table = _table_name(filename)
+        key = spec['key']
+        columns = set(_columns(filename))
+        clauses, params, residual = [], [], {}
+        for field, value in criteria.items():
+            if field in spec.get('lists', ()):
+                clauses.append(f'"{key}" IN (SELECT "{key}" FROM "{table}_{field}" WHERE value = ?)')
+            elif field in columns or field == key:
+                clauses.append(f'"{field}" = ?')
+            else:
+                residual[field] = value
+                continue
+            params.append(value)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ''
+        rows = self.connection().execute(f'SELECT data FROM "{table}"{where} ORDER BY rowid', params)
+        records = (decode(filename, json.loads(row[0])) for row in rows)
+        return (r for r in records if matches_criteria(r, residual))
+
+    def count_by(self, filename, fields):
+        self._ensure_table(filename)
+        if not all(f in _columns(filename) for f in fields):
+            return count_values(self.iter_records(filename), fields)
+        columns = ', '.join(f'"{f}"' for f in fields)
+        rows = self.connection().execute(
+            f'SELECT {columns}, COUNT(*) FROM "{_table_name(filename)}" GROUP BY {columns}')
+        if len(fields) == 1:
+            return {row[0]: row[1] for row in rows}
+        return {tuple(row[:-1]): row[-1] for row in rows}
+
+    def find_records_by_ids(self, filename, record_ids, batch_size=500):
+        self._ensure_table(filename)
+        key = _spec(filename)['key']
+        found = {}
+        for start in range(0, len(record_ids), batch_size):
+            batch = record_ids[start:start + batch_size]
+            placeholders = ', '.join('?' for _ in batch)
+            rows = self.connection().execute(
+                f'SELECT "{key}", data FROM "{_table_name(filename)}" WHERE "{key}" IN ({placeholders})', batch)
+            found.update((row[0], decode(filename, json.loads(row[1]))) for row in rows)
+        return [found[i] for i in record_ids if i in found]
+
+    # SQLite keeps each collection in one indexed table, so there is a
+    # single partition.
+    def map_partitions(self, filename, func, criteria):
+        return [func(self.iter_records(filename, **criteria))]
+
+    def is_archived(self, filename, record_id):
+        return False
+
+    def get_generation(self, filename):
+        row = self.connection().execute(
+            'SELECT generation FROM collection_generations WHERE name = ?', (filename,)).fetchone()
+        return row[0] if row else 0
+
+    # --- Writes ---
+    def save_data(self, filename, data):
+        self._ensure_table(filename)
+        table = _table_name(filename)
+        with self.locked([filename]):
+            conn = self.connection()
+            conn.execute(f'DELETE FROM "{table}"')
+            for field in _spec(filename).get('lists', ()):
+                conn.execute(f'DELETE FROM "{table}_{field}"')
+            self._write(conn, filename, data)
+
+    def put_records(self, filename, records):
+        self._ensure_table(filename)
+        with self.locked([filename]):
+            self._write(self.connection(), filename, records)
+
+    # --- Transactions ---
+    # SQLite already commits atomically; BEGIN IMMEDIATE takes the database
+    # write lock up front so validation and writes see the same state.
+    @contextlib.contextmanager
+    def locked(self, filenames):
+        for filename in filenames:
+            self._ensure_table(filename)
+        conn = self.connection()
+        if conn.in_transaction:
+            yield
+            return
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def apply_atomic(self, writes):
+        conn = self.connection()
+        for filename, records in writes.items():
+            self._write(conn, filename, records)
+
+    def recover(self):
+        pass
+
+    def _write(self, conn, filename, records):
+        spec = _spec(filename)
+        table = _table_name(filename)
+        key = spec['key']
+        columns = [key] + _columns(filename)
+        names = ', '.join(f'"{c}"' for c in columns)
+        placeholders = ', '.join('?' for _ in columns)
+        updates = ', '.join(f'"{c}" = excluded."{c}"' for c in columns[1:] + ['data'])
+        sql = (f'INSERT INTO "{table}" ({names}, data) VALUES ({placeholders}, ?) '
+               f'ON CONFLICT("{key}") DO UPDATE SET {updates}')
+        conn.executemany(sql, (
+            [record.get(c) for c in columns] + [json.dumps(record, ensure_ascii=False, default=encode)]
+            for record in records
+        ))
+        for field in spec.get('lists', ()):
+            side = f"{table}_{field}"
+            ids = [(record[key],) for record in records]
+            conn.executemany(f'DELETE FROM "{side}" WHERE "{key}" = ?', ids)
+            conn.executemany(f'INSERT INTO "{side}" ("{key}", value) VALUES (?, ?)', (
+                (record[key], value) for record in records for value in set(record.get(field) or ())
+            ))
+        # Bumped in the same transaction as the rows, so every write path
+        # (save_data, put_records, apply_atomic) invalidates the derived
+        # indexes of other processes that key on get_generation.
+        conn.execute(
+            'INSERT INTO collection_generations (name, generation) VALUES (?, 1) '
+            'ON CONFLICT(name) DO UPDATE SET generation = generation + 1', (filename,))
+
+    def compact(self, filename):
+        self.connection().execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+# --- Migration ---
+def migrate(source, target, filenames=None):
+    counts = {}
+    for filename in filenames or INDEX_SPECS:
+        records = source.load_data(filename)
+        target.save_data(filename, records)
+        counts[filename] = len(records)
+    return counts
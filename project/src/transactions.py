@@ -0,0 +1,94 @@
+import os
+import random
+import time
+from src import database
+from src.models import clone
+from src.partitions import ArchivedRecordError
+
+TRANSACTION_RETRIES = int(os.environ.get('TMS_TRANSACTION_RETRIES', 50))
+
+class TransactionConflict(Exception):
+    pass
+
+transaction_stats = {'commits': 0, 'conflicts': 0, 'failures': 0}
+
+# --- Optimistic Transactions ---
+# Reads return private copies and remember what they saw. Commit locks every
+# collection involved, checks that nothing read has changed since, and then
+# applies all writes atomically. A changed read raises TransactionConflict,
+# and run_transaction runs the whole function again.
+class Transaction:
+    def __init__(self, backend=None):
+        self.backend = backend or database.get_backend()
+        self.reads = {}
+        self.queries = []
+        self.writes = {}
+        self._records = {}
+
+    def get(self, filename, record_id):
+        cached = self._records.get((filename, record_id))
+        if cached is not None:
+            return cached
+        record = self.backend.find_record(filename, record_id)
+        self.reads.setdefault((filename, record_id), clone(record))
+        if record is None:
+            return None
+        copy = self._records[(filename, record_id)] = clone(record)
+        return copy
+
+    def find(self, filename, **criteria):
+        key = database.PRIMARY_KEYS[filename]
+        records = self.backend.find_records(filename, **criteria)
+        self.queries.append((filename, criteria, {r[key]: clone(r) for r in records}))
+        return [self._records.setdefault((filename, r[key]), clone(r)) for r in records]
+
+    def put(self, filename, record):
+        key = database.PRIMARY_KEYS[filename]
+        self.writes.setdefault(filename, {})[record[key]] = record
+        self._records[(filename, record[key])] = record
+
+    def commit(self):
+        if not self.writes:
+            return
+        filenames = set(self.writes)
+        filenames.update(filename for filename, _ in self.reads)
+        filenames.update(query[0] for query in self.queries)
+        with self.backend.locked(filenames):
+            self._validate()
+            self.backend.apply_atomic({f: list(records.values()) for f, records in self.writes.items()})
+
+    def _validate(self):
+        for (filename, record_id), seen in self.reads.items():
+            if self.backend.find_record(filename, record_id) != seen:
+                raise TransactionConflict(f"{filename}:{record_id} changed")
+        for filename, criteria, seen in self.queries:
+            key = database.PRIMARY_KEYS[filename]
+            current = {r[key]: r for r in self.backend.find_records(filename, **criteria)}
+            if current != seen:
+                raise TransactionConflict(f"{filename} query {criteria} changed")
+        # Records of frozen terms are read through tx.get like any other, but
+        # put_records refuses them; checked here, before the redo record is
+        # written, so the commit is refused whole instead of half applied.
+        for filename, records in self.writes.items():
+            archived = [record_id for record_id in records if self.backend.is_archived(filename, record_id)]
+            if archived:
+                raise ArchivedRecordError(f"{filename}: {', '.join(map(str, archived[:5]))} "
+                                          f"belong to frozen terms and cannot be changed.")
+
+def run_transaction(func, retries=None):
+    retries = TRANSACTION_RETRIES if retries is None else retries
+    delay = 0.002
+    for attempt in range(retries + 1):
+        tx = Transaction()
+        result = func(tx)
+        try:
+            tx.commit()
+            transaction_stats['commits'] += 1
+            return result
+        except TransactionConflict:
+            transaction_stats['conflicts'] += 1
+            if attempt == retries:
+                transaction_stats['failures'] += 1
+                raise
+            time.sleep(delay * random.uniform(0.5, 1.5))
+            delay = min(delay * 2, 0.25)